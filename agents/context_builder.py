@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Leo AI Assistant - Context Builder
+Assembles prompts from the system prompt, retrieved memories and recent turns within a token budget
+"""
+
+import os
+from typing import Dict, List, Optional
+
+# Tokens OpenAI adds around every chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, imported and loaded on first use (it can take a while to load)"""
+        if not self._loaded:
+            self._loaded = True
+            try:
+                import tiktoken
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except ImportError:
+                # Optional: fall back to a character-based estimate
+                pass
+            except Exception as e:
+                print(f"⚠️ tiktoken unavailable for {self.model}: {e}")
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        """Count tokens in a piece of text"""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        # Roughly four characters per token for English text
+        return max(1, len(text) // 4)
+
+    def count_message(self, message: Dict) -> int:
+        """Count tokens for a chat message including per-message overhead"""
+        return self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    def __init__(self, token_budget: Optional[int] = None, min_recent_messages: int = 4,
+                 memory_share: float = 0.3, summary_tail_messages: int = 8,
+                 model: str = "gpt-3.5-turbo"):
+        """Initialize the context builder
+        
+        ``token_budget`` caps the whole prompt. The system prompt and the
+        current message are always kept; a running summary (if any) and the
+        newest ``min_recent_messages`` turns come next, then retrieved
+        memories (up to ``memory_share`` of what is left), then older turns
+        while room remains. With a summary, only the last
+        ``summary_tail_messages`` turns are sent, or more when ``unsummarized``
+        (the number of newest turns the summary does not cover yet) is larger.
+        """
+        self.token_budget = token_budget or int(os.getenv("LEO_PROMPT_TOKEN_BUDGET", "2000"))
+        self.min_recent_messages = min_recent_messages
+        self.summary_tail_messages = summary_tail_messages
+        self.memory_share = memory_share
+        self.counter = TokenCounter(model)
+
+    def build(self, system_prompt: str, history, user_message: str,
+              memories: Optional[List[Dict]] = None, summary: str = "", unsummarized: int = 0) -> List[Dict]:
+        """Build the OpenAI message list for a turn"""
+        system_message = {"role": "system", "content": system_prompt}
+        current_message = {"role": "user", "content": user_message}
+        remaining = self.token_budget - self.counter.count_message(system_message) - self.counter.count_message(current_message)
+        
+        summary_message = None
+        if summary:
+            summary_message = {"role": "system", "content": f"Summary of the conversation so far: {summary}"}
+            cost = self.counter.count_message(summary_message)
+            if cost <= remaining:
+                remaining -= cost
+            else:
+                summary_message = None
+        
+        turns = [{"role": msg["role"], "content": msg["content"]} for msg in history]
+        if summary_message:
+            # The summary covers older turns; keep only a short tail verbatim,
+            # but never drop a turn the summary does not include yet
+            turns = turns[-max(self.summary_tail_messages, unsummarized):]
+        turn_costs = [self.counter.count_message(turn) for turn in turns]
+        
+        # 1. Newest turns first, so the immediate thread is never lost
+        kept_from = len(turns)
+        while kept_from > 0 and len(turns) - kept_from < self.min_recent_messages:
+            cost = turn_costs[kept_from - 1]
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept_from -= 1
+        
+        # 2. Retrieved memories, skipping ones already present in the kept turns
+        memory_message = None
+        if memories and remaining > 0:
+            seen = {turn["content"] for turn in turns[kept_from:]}
+            seen.add(user_message)
+            memory_budget = int(remaining * self.memory_share)
+            header = "Relevant memories from earlier conversations:"
+            lines = []
+            used = self.counter.count(header) + MESSAGE_OVERHEAD_TOKENS
+            for memory in memories:
+                content = memory.get("content", "")
+                if not content or content in seen:
+                    continue
+                line = f"- {memory.get('role', 'unknown')}: {content}"
+                cost = self.counter.count(line) + 1
+                if used + cost > memory_budget:
+                    continue
+                lines.append(line)
+                seen.add(content)
+                used += cost
+            if lines:
+                memory_message = {"role": "system", "content": "\n".join([header] + lines)}
+                remaining -= used
+        
+        # 3. Older turns with whatever budget is left
+        while kept_from > 0 and turn_costs[kept_from - 1] <= remaining:
+            remaining -= turn_costs[kept_from - 1]
+            kept_from -= 1
+        
+        messages = [system_message]
+        if summary_message:
+            messages.append(summary_message)
+        if memory_message:
+            messages.append(memory_message)
+        messages.extend(turns[kept_from:])
+        messages.append(current_message)
+        return messages
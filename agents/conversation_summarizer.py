@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Leo AI Assistant - Conversation Summarizer
+Keeps a rolling per-user summary up to date in the background
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from utils.executor import run_blocking
+
+
+class ConversationSummarizer:
+    def __init__(self, assistant, memory_manager, every_turns: Optional[int] = None,
+                 retry_seconds: Optional[float] = None, max_retry_seconds: float = 600):
+        """Initialize the summarizer
+        
+        After every ``every_turns`` user/assistant exchanges the session's new
+        messages are folded into its summary by a background task; the
+        request path never waits on it. After a failed refresh the next one
+        waits ``retry_seconds``, doubling per consecutive failure up to
+        ``max_retry_seconds``.
+        """
+        self.assistant = assistant
+        self.memory_manager = memory_manager
+        self.every_turns = every_turns or int(os.getenv("LEO_SUMMARY_EVERY_TURNS", "4"))
+        self.retry_seconds = retry_seconds or float(os.getenv("LEO_SUMMARY_RETRY_SECONDS", "30"))
+        self.max_retry_seconds = max_retry_seconds
+        self._tasks = set()
+        self.metrics = {"refreshes": 0, "failures": 0}
+
+    def record_turn(self, session):
+        """Schedule a summary refresh if enough new turns have accumulated"""
+        if session.summarizing or len(session.unsummarized) < self.every_turns * 2:
+            return
+        if not self.assistant.can_summarize or time.monotonic() < session.summary_retry_at:
+            # Keep what the history still holds; it is folded in once the API is available again
+            self._trim(session)
+            return
+        
+        session.summarizing = True
+        messages, session.unsummarized = session.unsummarized, []
+        session.folding = len(messages)
+        task = asyncio.ensure_future(self._refresh(session, messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, session, messages):
+        """Fold messages into the session summary and persist it"""
+        try:
+            summary = await self.assistant.summarize_async(session.summary, messages)
+            # The session may have been cleared or evicted in the meantime
+            if session.closed:
+                return
+            if not summary:
+                raise RuntimeError("no summary produced")
+            session.summary = summary
+            await run_blocking(self.memory_manager.set_summary, session.user_id, summary)
+            session.summary_failures = 0
+            self.metrics["refreshes"] += 1
+        except Exception as e:
+            self.metrics["failures"] += 1
+            # Put the messages back so the next refresh covers them, and back off
+            if not session.closed:
+                session.unsummarized = messages + session.unsummarized
+                self._trim(session)
+                delay = min(self.retry_seconds * 2 ** session.summary_failures, self.max_retry_seconds)
+                session.summary_failures += 1
+                session.summary_retry_at = time.monotonic() + delay
+            print(f"Error refreshing conversation summary: {e}")
+        finally:
+            session.summarizing = False
+            session.folding = 0
+
+    @staticmethod
+    def _trim(session):
+        """Drop pending messages the history no longer holds"""
+        del session.unsummarized[:-session.history.maxlen]
+
+    async def stop(self):
+        """Cancel in-flight refreshes (called on shutdown)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        """Get summarizer counters"""
+        return {
+            **self.metrics,
+            "every_turns": self.every_turns,
+            "in_flight": len(self._tasks)
+        }
@@ -5,30 +5,83 @@ Simplified and optimized for production use
 """
 
 import os
-from typing import Dict, List
+import threading
+from typing import AsyncIterator, Dict, List, Optional
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
+from agents.context_builder import ContextBuilder
+from utils.executor import run_blocking
 
 load_dotenv()
 
+SYSTEM_PROMPT = "You are Leo, a helpful AI assistant focused on productivity and goal planning. Be conversational, supportive, and concise."
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Leo, their AI assistant. "
+    "Update the existing summary with the new messages. Keep the user's goals, preferences, plans, "
+    "decisions and open questions; drop small talk. Reply with the updated summary only, under 150 words."
+)
+
 class SmartAssistant:
+    # Blocking responses stay short; streamed ones can be longer since
+    # tokens reach the user as soon as they are generated
+    max_tokens = 200
+    stream_max_tokens = int(os.getenv("LEO_STREAM_MAX_TOKENS", "800"))
+
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = None
-        self.api_available = False
+        self._client = None
+        self._async_client = None
+        self._warm_up_lock = threading.Lock()
+        self.api_available = bool(self.api_key and len(self.api_key) > 20)
         self.chat_history = []
+        self.context_builder = ContextBuilder()
         
-        # Initialize OpenAI client
-        if self.api_key and len(self.api_key) > 20:
+        if self.api_available:
+            print("✅ OpenAI API key configured")
+        else:
+            print("⚠️ OpenAI API key not configured")
+
+    def warm_up(self):
+        """Import openai, create the clients and load the tokenizer (blocking; runs in the background warm-up)
+        
+        openai takes most of backend_main's import time, so it is not
+        imported until here or the first request that needs a client.
+        Concurrent callers wait for the one doing the work. The tiktoken
+        encoding (possibly a download) loads here rather than on the event
+        loop when the first chat builds its prompt.
+        """
+        self.context_builder.counter.encoding
+        if not self.api_available or self._async_client is not None:
+            return
+        with self._warm_up_lock:
+            if not self.api_available or self._async_client is not None:
+                return
             try:
-                self.client = OpenAI(api_key=self.api_key)
-                self.api_available = True
+                from openai import OpenAI, AsyncOpenAI
+                
+                self._client = OpenAI(api_key=self.api_key)
+                self._async_client = AsyncOpenAI(api_key=self.api_key)
                 print("✅ OpenAI API client initialized")
             except Exception as e:
+                self.api_available = False
                 print(f"⚠️ OpenAI API initialization failed: {e}")
-        else:
-            print("⚠️ OpenAI API key not configured")
+
+    async def _ready_async_client(self):
+        """The async client, waiting off-loop for a warm-up still in progress"""
+        if self.api_available and self._async_client is None:
+            await run_blocking(self.warm_up)
+        return self._async_client if self.api_available else None
+
+    @property
+    def client(self):
+        self.warm_up()
+        return self._client
+
+    @property
+    def async_client(self):
+        self.warm_up()
+        return self._async_client
 
     def handle_message(self, user_message: str) -> str:
         """Handle user message and return AI response"""
@@ -51,30 +104,78 @@ class SmartAssistant:
         
         return response
 
+    async def handle_message_async(self, user_message: str, history: Optional[List[Dict]] = None,
+                                   memories: Optional[List[Dict]] = None, summary: str = "",
+                                   unsummarized: int = 0) -> str:
+        """Handle user message without blocking the event loop
+        
+        When ``history`` is given the turn is generated against it and the
+        shared ``chat_history`` is left untouched, so concurrent callers
+        cannot overwrite each other's context.
+        """
+        if history is not None:
+            return await self._generate_response_async(user_message, history, memories, summary, unsummarized)
+        
+        # Snapshot history before this turn so concurrent edits don't leak in
+        history = list(self.chat_history)
+        self.chat_history.append({
+            "role": "user",
+            "content": user_message,
+            "timestamp": datetime.now()
+        })
+        
+        response = await self._generate_response_async(user_message, history, memories, summary, unsummarized)
+        
+        self.chat_history.append({
+            "role": "assistant",
+            "content": response,
+            "timestamp": datetime.now()
+        })
+        
+        return response
+
+    def _build_messages(self, user_message: str, history, memories: Optional[List[Dict]] = None,
+                        summary: str = "", unsummarized: int = 0) -> List[Dict]:
+        """Build the OpenAI message list within the prompt token budget"""
+        return self.context_builder.build(SYSTEM_PROMPT, history, user_message, memories, summary, unsummarized)
+
     def _generate_response(self, user_message: str) -> str:
         """Generate AI response using OpenAI or fallback"""
         if not self.api_available or not self.client:
             return self._fallback_response(user_message)
         
         try:
-            # Prepare conversation context
-            messages = [
-                {"role": "system", "content": "You are Leo, a helpful AI assistant focused on productivity and goal planning. Be conversational, supportive, and concise."}
-            ]
-            
-            # Add recent conversation history (last 10 messages)
-            recent_history = self.chat_history[-10:] if len(self.chat_history) > 10 else self.chat_history
-            for msg in recent_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-            
-            # Add current message
-            messages.append({"role": "user", "content": user_message})
+            messages = self._build_messages(user_message, self.chat_history)
             
             # Get OpenAI response
             response = self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=messages,
-                max_tokens=200,
+                max_tokens=self.max_tokens,
+                temperature=0.7
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return self._fallback_response(user_message)
+
+    async def _generate_response_async(self, user_message: str, history: List[Dict],
+                                       memories: Optional[List[Dict]] = None, summary: str = "",
+                                       unsummarized: int = 0) -> str:
+        """Generate AI response with the async OpenAI client"""
+        async_client = await self._ready_async_client()
+        if not async_client:
+            return self._fallback_response(user_message)
+        
+        try:
+            messages = self._build_messages(user_message, history, memories, summary, unsummarized)
+            
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=self.max_tokens,
                 temperature=0.7
             )
             
@@ -84,6 +185,75 @@ class SmartAssistant:
             print(f"OpenAI API error: {e}")
             return self._fallback_response(user_message)
 
+    async def stream_response(self, user_message: str, history: List[Dict],
+                              memories: Optional[List[Dict]] = None, summary: str = "",
+                              unsummarized: int = 0) -> AsyncIterator[str]:
+        """Yield response tokens from the OpenAI stream as they arrive"""
+        async_client = await self._ready_async_client()
+        if not async_client:
+            yield self._fallback_response(user_message)
+            return
+        
+        produced = False
+        try:
+            messages = self._build_messages(user_message, history, memories, summary, unsummarized)
+            
+            stream = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=self.stream_max_tokens,
+                temperature=0.7,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    produced = True
+                    yield token
+                    
+        except Exception as e:
+            print(f"OpenAI streaming error: {e}")
+            # Only fall back if the user has not seen any tokens yet
+            if not produced:
+                yield self._fallback_response(user_message)
+
+    @property
+    def can_summarize(self) -> bool:
+        """Whether summaries can be generated now (False until warm-up has created the client)"""
+        return bool(self.api_available and self._async_client)
+
+    async def summarize_async(self, previous_summary: str, messages: List[Dict]) -> Optional[str]:
+        """Fold new messages into a running conversation summary
+        
+        Returns None when no summary could be produced, so the caller keeps
+        the messages for the next attempt.
+        """
+        if not messages:
+            return previous_summary
+        async_client = await self._ready_async_client()
+        if not async_client:
+            return None
+        
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+                ],
+                max_tokens=250,
+                temperature=0.3
+            )
+            return response.choices[0].message.content.strip()
+            
+        except Exception as e:
+            print(f"OpenAI summarization error: {e}")
+            return None
+
     def _fallback_response(self, user_message: str) -> str:
         """Fallback responses when API is unavailable"""
         user_lower = user_message.lower()
@@ -99,6 +269,10 @@ class SmartAssistant:
         
         return "I understand! I'm here to help with productivity, goal planning, and general assistance. What would you like to work on?"
 
+    def is_fallback_response(self, user_message: str, response: str) -> bool:
+        """Check whether a response is the canned fallback rather than a model answer"""
+        return response == self._fallback_response(user_message)
+
     def get_chat_history(self) -> List[Dict]:
         """Get conversation history"""
         return self.chat_history.copy()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Agent Mode Publisher for Leo AI Assistant
+One server-wide refresh loop whose result is fanned out to every subscribed WebSocket
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class AgentPublisher:
+    def __init__(self, build_update: Callable[[], Awaitable[Dict]],
+                 broadcast: Callable[[Dict], Awaitable[None]],
+                 is_active: Callable[[], bool], interval: Optional[float] = None):
+        """Initialize the publisher
+        
+        ``build_update`` produces the payload, ``broadcast`` delivers it to
+        all clients and ``is_active`` decides whether a tick publishes
+        (e.g. only in agent mode). The loop runs only while there is at
+        least one subscriber, so API calls scale with time, not sockets.
+        """
+        self.build_update = build_update
+        self.broadcast = broadcast
+        self.is_active = is_active
+        self.interval = interval or float(os.getenv("LEO_AGENT_UPDATE_SECONDS", "30"))
+        
+        self.subscribers = 0
+        self.last_message: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"ticks": 0, "published": 0, "errors": 0, "last_published": None}
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def subscribe(self):
+        """Register a client; starts the loop for the first one"""
+        self.subscribers += 1
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            print("📡 Agent publisher started")
+    
+    def unsubscribe(self):
+        """Unregister a client; stops the loop when the last one leaves"""
+        self.subscribers = max(self.subscribers - 1, 0)
+        if self.subscribers == 0 and self.running:
+            self._task.cancel()
+            self._task = None
+            print("📴 Agent publisher stopped (no subscribers)")
+    
+    async def stop(self):
+        """Stop the loop regardless of subscribers (called on shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.metrics["ticks"] += 1
+            
+            if not self.is_active():
+                continue
+            
+            try:
+                message = await self.build_update()
+                self.last_message = message
+                await self.broadcast(message)
+                self.metrics["published"] += 1
+                self.metrics["last_published"] = datetime.now().isoformat()
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"Error publishing agent update: {e}")
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "running": self.running,
+            "subscribers": self.subscribers,
+            "interval_seconds": self.interval
+        }
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Async Google Services for Leo AI Assistant
+Runs Calendar, Gmail and Tasks calls concurrently off the event loop with timeouts and proactive token renewal
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.executor import run_in_pool
+
+
+class AsyncGoogleServices:
+    def __init__(self, google_services, timeout: Optional[float] = None,
+                 refresh_margin: Optional[float] = None):
+        """Initialize the async wrapper
+        
+        ``timeout`` bounds each source call; ``refresh_margin`` is how many
+        seconds before expiry the OAuth token is renewed in the background.
+        """
+        self.google_services = google_services
+        self.timeout = timeout or float(os.getenv("LEO_GOOGLE_TIMEOUT", "10"))
+        self.refresh_margin = refresh_margin or float(os.getenv("LEO_GOOGLE_REFRESH_MARGIN", "300"))
+        
+        # googleapiclient service objects are not thread-safe; one call per service at a time
+        self._locks = {name: asyncio.Lock() for name in ("calendar", "gmail", "tasks")}
+        self._refresher: Optional[asyncio.Task] = None
+        self.metrics = {"calls": 0, "timeouts": 0, "token_refreshes": 0}
+    
+    @property
+    def calendar_service(self):
+        return self.google_services.calendar_service
+    
+    @property
+    def gmail_service(self):
+        return self.google_services.gmail_service
+    
+    @property
+    def tasks_service(self):
+        return self.google_services.tasks_service
+    
+    async def start(self):
+        """Initialize credentials and services off-loop and start token renewal"""
+        if not self.google_services.initialized:
+            await run_in_pool("google", self.google_services._initialize_services)
+        if self._refresher is None and self.google_services.credentials:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+    
+    async def stop(self):
+        """Stop background token renewal"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+    
+    async def _refresh_loop(self):
+        """Renew the OAuth token shortly before it expires"""
+        while True:
+            creds = self.google_services.credentials
+            expiry = getattr(creds, "expiry", None)
+            if expiry is None:
+                delay = self.refresh_margin
+            else:
+                # google-auth stores expiry as a naive UTC datetime
+                delay = (expiry - datetime.utcnow()).total_seconds() - self.refresh_margin
+            
+            if delay > 0:
+                await asyncio.sleep(min(delay, 3600))
+                continue
+            
+            if await run_in_pool("google", self.google_services.refresh_credentials):
+                self.metrics["token_refreshes"] += 1
+            else:
+                # Retry later instead of spinning on a failing refresh
+                await asyncio.sleep(60)
+    
+    async def _call(self, service: str, func: Callable, *args) -> Any:
+        """Run a blocking reader with a timeout
+        
+        The timeout covers waiting for the service lock as well as the call
+        itself; the transport's socket timeout (GoogleServices.request_timeout)
+        makes the worker thread give up as well. Errors and timeouts are raised rather than answered with mock
+        data, so the Google data cache keeps serving its last good entry.
+        """
+        self.metrics["calls"] += 1
+        lock = self._locks[service]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        
+        try:
+            await asyncio.wait_for(lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out(service, "waiting for an earlier request")
+            raise
+        
+        # Google calls have their own pool, so one still running after its
+        # timeout never holds a thread chat requests need. Release the lock
+        # only when the worker thread is really done
+        future = asyncio.ensure_future(run_in_pool("google", func, *args))
+        future.add_done_callback(lambda _: lock.release())
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._timed_out(service, "in flight")
+            raise
+    
+    def _timed_out(self, service: str, stage: str):
+        self.metrics["timeouts"] += 1
+        print(f"Google {service} request timed out after {self.timeout}s ({stage})")
+    
+    async def get_calendar_events(self, max_results: int = 10) -> List[Dict]:
+        return await self._call("calendar", self.google_services.get_calendar_events, max_results)
+    
+    def hydrate_calendar_index(self, events: List[Dict]):
+        """Index cached events if the calendar has not been synced since startup"""
+        self.google_services.calendar_sync.hydrate(events)
+    
+    def get_calendar_range(self, start: datetime, end: datetime) -> List[Dict]:
+        """Local index lookup; cheap enough to run on the event loop"""
+        return self.google_services.get_calendar_range(start, end)
+    
+    def get_next_free_slot(self, duration_minutes: int = 30, horizon_days: int = 7) -> Optional[Dict]:
+        """Local index lookup; cheap enough to run on the event loop"""
+        return self.google_services.get_next_free_slot(duration_minutes, horizon_days)
+    
+    async def get_gmail_data(self) -> Dict:
+        return await self._call("gmail", self.google_services.get_gmail_data)
+    
+    async def get_tasks(self) -> List[Dict]:
+        return await self._call("tasks", self.google_services.get_tasks)
+    
+    async def get_all_data(self) -> Dict:
+        """Get all Google services data; latency is that of the slowest source"""
+        events, gmail, tasks = await asyncio.gather(
+            self.get_calendar_events(), self.get_gmail_data(), self.get_tasks()
+        )
+        return {
+            'calendar': {
+                'status': 'healthy' if self.calendar_service else 'disconnected',
+                'events': events,
+                'total_count': len(events)
+            },
+            'gmail': gmail,
+            'tasks': {
+                'status': 'healthy' if self.tasks_service else 'disconnected',
+                'tasks': tasks,
+                'total_count': len(tasks)
+            },
+            'last_updated': datetime.now().isoformat()
+        }
+    
+    def health_check(self) -> Dict:
+        return self.google_services.health_check()
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "timeout_seconds": self.timeout,
+            "gmail_sync": self.google_services.gmail_sync.metrics,
+            "calendar_sync": self.google_services.calendar_sync.metrics
+        }
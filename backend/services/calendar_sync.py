@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Calendar Incremental Sync for Leo AI Assistant
+Keeps a local event store current with syncToken fetches and answers time-range queries from an interval index
+"""
+
+import os
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from utils.state_backend import PersistedState
+
+
+def _parse_time(value: Dict) -> datetime:
+    """Parse a Calendar start/end object (dateTime or all-day date)"""
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    # All-day events are anchored at local midnight
+    return datetime.fromisoformat(value['date'])
+
+
+def _with_timestamps(event: Dict) -> Dict:
+    """Add index fields to a public (cached) event from its start/end strings"""
+    key = 'date' if event.get('all_day') else 'dateTime'
+    start = _parse_time({key: event['start']})
+    end = _parse_time({key: event.get('end') or event['start']})
+    return {**event, 'start_ts': start.timestamp(), 'end_ts': end.timestamp()}
+
+
+class EventIndex:
+    """Immutable interval index over events, sorted by start time
+    
+    A query for [start, end) bisects on start times and scans back at most
+    the longest event duration, so lookups stay logarithmic in store size.
+    """
+
+    def __init__(self, events: List[Dict]):
+        self.events = sorted(events, key=lambda event: event['start_ts'])
+        self.starts = [event['start_ts'] for event in self.events]
+        self.max_duration = max((event['end_ts'] - event['start_ts'] for event in self.events), default=0)
+
+    def overlapping(self, start_ts: float, end_ts: float) -> List[Dict]:
+        """Events that overlap [start_ts, end_ts), ordered by start"""
+        lo = bisect_left(self.starts, start_ts - self.max_duration)
+        hi = bisect_left(self.starts, end_ts)
+        return [event for event in self.events[lo:hi] if event['end_ts'] > start_ts]
+
+
+class CalendarSync:
+    def __init__(self, google_services, calendar_id: str = 'primary', lookback_days: Optional[int] = None,
+                 state_file: Optional[str] = "calendar_sync_state.json", state_backend=None):
+        """Initialize the sync engine
+        
+        The first sync lists events from ``lookback_days`` ago onwards and
+        stores the returned nextSyncToken; later syncs only fetch changes.
+        The event store and token are saved to ``state_file`` (or a shared
+        ``state_backend``, re-read before every sync so workers continue
+        from each other's token) and loaded on first use, so a restarted
+        backend can answer range queries before its first sync.
+        """
+        self.google_services = google_services
+        self.calendar_id = calendar_id
+        self.lookback_days = lookback_days or int(os.getenv("LEO_CALENDAR_LOOKBACK_DAYS", "30"))
+        self.store = PersistedState("calendar_sync", state_file or None, state_backend)
+        
+        self.sync_token: Optional[str] = None
+        self._events: Dict[str, Dict] = {}
+        # Replaced wholesale after each sync so readers never see a partial update
+        self.index = EventIndex([])
+        self.metrics = {"full_syncs": 0, "incremental_syncs": 0, "events": 0, "pruned": 0}
+        self._loaded = False
+    
+    def _load_state(self, refresh: bool = False):
+        if self._loaded and not refresh:
+            return
+        self._loaded = True
+        try:
+            state = self.store.load({})
+            self._set_events(state.get('events', {}))
+            self.sync_token = state.get('sync_token')
+        except Exception as e:
+            print(f"⚠️ Error loading calendar sync state: {e}")
+    
+    def _save_state(self):
+        try:
+            self.store.save({'sync_token': self.sync_token, 'events': self._events})
+        except Exception as e:
+            print(f"⚠️ Error saving calendar sync state: {e}")
+    
+    def _set_events(self, events: Dict[str, Dict]):
+        self._events = events
+        self.index = EventIndex(list(events.values()))
+        self.metrics["events"] = len(events)
+    
+    def hydrate(self, events: List[Dict]):
+        """Build the index on first use: from the saved sync state, else from cached public events
+        
+        Covers a restart where the Google data cache serves its disk
+        snapshot without calling the fetcher, which would otherwise leave
+        the index empty and every slot free.
+        """
+        self._load_state()
+        if self._events or not events:
+            return
+        try:
+            self._set_events({event['id']: _with_timestamps(event) for event in events if event.get('start')})
+        except Exception as e:
+            print(f"⚠️ Error indexing cached calendar events: {e}")
+
+    def sync(self):
+        """Fetch changes since the last sync token (blocking)"""
+        from googleapiclient.errors import HttpError
+        
+        service = self.google_services.calendar_service
+        self._load_state(refresh=self.store.shared)
+        if self.sync_token:
+            try:
+                self._fetch(service, self._events, syncToken=self.sync_token)
+                self.metrics["incremental_syncs"] += 1
+                self._save_state()
+                return
+            except HttpError as error:
+                # 410 Gone: the token expired, start over with a full sync
+                if getattr(error, 'resp', None) is None or error.resp.status != 410:
+                    raise
+                print("Calendar sync token expired - running full sync")
+        
+        time_min = (datetime.utcnow() - timedelta(days=self.lookback_days)).isoformat() + 'Z'
+        self._fetch(service, {}, timeMin=time_min)
+        self.metrics["full_syncs"] += 1
+        self._save_state()
+
+    def _fetch(self, service, base: Dict[str, Dict], **params):
+        """Page through events().list and apply the results on top of ``base``"""
+        events = dict(base)
+        page_token = None
+        while True:
+            page = service.events().list(
+                calendarId=self.calendar_id, singleEvents=True, maxResults=2500,
+                pageToken=page_token, **params
+            ).execute()
+            
+            for event in page.get('items', []):
+                if event.get('status') == 'cancelled' or 'start' not in event:
+                    events.pop(event['id'], None)
+                else:
+                    events[event['id']] = self._format_event(event)
+            
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                self.sync_token = page.get('nextSyncToken', self.sync_token)
+                break
+        
+        # Incremental syncs only ever add to the store: forget events that
+        # ended before the sync window (a later change brings one back)
+        window_start = (datetime.now() - timedelta(days=self.lookback_days)).timestamp()
+        expired = [event_id for event_id, event in events.items() if event['end_ts'] < window_start]
+        for event_id in expired:
+            del events[event_id]
+        self.metrics["pruned"] += len(expired)
+        
+        self._set_events(events)
+
+    @staticmethod
+    def _format_event(event: Dict) -> Dict:
+        start = _parse_time(event['start'])
+        end = _parse_time(event.get('end', event['start']))
+        return {
+            'id': event.get('id'),
+            'title': event.get('summary', 'No Title'),
+            'start': event['start'].get('dateTime', event['start'].get('date')),
+            'end': event.get('end', {}).get('dateTime', event.get('end', {}).get('date')),
+            'description': event.get('description', ''),
+            'location': event.get('location', ''),
+            'attendees': len(event.get('attendees', [])),
+            'all_day': 'date' in event['start'],
+            'start_ts': start.timestamp(),
+            'end_ts': end.timestamp()
+        }
+
+    def events_between(self, start: datetime, end: datetime) -> List[Dict]:
+        """Events overlapping [start, end)"""
+        return self.index.overlapping(start.timestamp(), end.timestamp())
+
+    def upcoming(self, limit: int = 10, now: Optional[datetime] = None) -> List[Dict]:
+        """Events that have not ended yet, soonest first"""
+        index = self.index
+        now_ts = (now or datetime.now()).timestamp()
+        lo = bisect_left(index.starts, now_ts - index.max_duration)
+        upcoming = []
+        for event in index.events[lo:]:
+            if event['end_ts'] > now_ts:
+                upcoming.append(event)
+                if len(upcoming) >= limit:
+                    break
+        return upcoming
+
+    def today(self) -> List[Dict]:
+        """Events overlapping the current local day"""
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.events_between(start, start + timedelta(days=1))
+
+    def next_free_slot(self, duration: timedelta, after: Optional[datetime] = None,
+                       horizon: timedelta = timedelta(days=7)) -> Optional[Dict]:
+        """First gap of at least ``duration`` between timed events, searching up to ``horizon`` ahead"""
+        return find_free_slot(self.index, duration, after or datetime.now(), horizon)
+
+
+def find_free_slot(index: EventIndex, duration: timedelta, after: datetime,
+                   horizon: timedelta) -> Optional[Dict]:
+    """Scan busy intervals from ``after`` and return the first free gap long enough"""
+    cursor = after.timestamp()
+    limit = (after + horizon).timestamp()
+    needed = duration.total_seconds()
+    
+    for event in index.overlapping(cursor, limit):
+        # All-day events (e.g. birthdays, OOO markers) don't block time slots
+        if event.get('all_day'):
+            continue
+        if event['start_ts'] - cursor >= needed:
+            break
+        cursor = max(cursor, event['end_ts'])
+    
+    if cursor + needed > limit:
+        return None
+    return {
+        'start': datetime.fromtimestamp(cursor).isoformat(),
+        'end': datetime.fromtimestamp(cursor + needed).isoformat()
+    }
@@ -4,40 +4,178 @@ ChromaDB Service for Leo AI Assistant
 Handles long-term memory storage and retrieval
 """
 
+import asyncio
+import hashlib
 import os
 import json
+import threading
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from backend.services.embedding_backends import load_embedding_backend
+from backend.services.embedding_cache import EmbeddingCache
+from backend.services.embedding_service import EmbeddingService
+from backend.services.memory_index import MemoryIndex
+from utils.process_lock import ProcessLock
+
+# chromadb and the embedding backend (which may pull in torch) are imported
+# in warm_up() so importing this module stays cheap
+
+# Shared pre-partitioning collection, still read until it has been migrated
+LEGACY_COLLECTION = "leo_memory"
+PARTITION_PREFIX = "leo_u_"
+DOC_TYPES = ("chat_message", "goal_plan")
+
+# Metadata scanned per page when rebuilding a user's side-table rows
+SCAN_PAGE_SIZE = 1000
+
+# Documents removed per step of a background user deletion
+DELETE_CHUNK_SIZE = int(os.getenv("LEO_DELETE_CHUNK_SIZE", "500"))
+
+
+def to_epoch(timestamp) -> float:
+    """Epoch seconds for an ISO timestamp (0 when it cannot be parsed)"""
+    try:
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
 
 class ChromaService:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        """Initialize ChromaDB service"""
+    def __init__(self, persist_directory: str = "./chroma_db", lazy: bool = False):
+        """Initialize ChromaDB service
+        
+        With ``lazy=True`` nothing heavy is loaded until warm_up() is called
+        (usually on a background thread at startup). Until then the service
+        reports not ready and reads degrade to empty results.
+        
+        With LEO_CHROMA_HOST set the collections live on a Chroma server that
+        several workers share; otherwise in a persistent client that only one
+        process may open.
+        """
         self.persist_directory = persist_directory
-        self.embedding_model = None
+        self.chroma_host = os.getenv("LEO_CHROMA_HOST")
+        self.chroma_port = int(os.getenv("LEO_CHROMA_PORT", "8000"))
+        # Every encode goes through the micro-batching service
+        self.embeddings = EmbeddingService()
         self.client = None
         self.collection = None
         
-        try:
-            self._initialize_chroma()
-            self._initialize_embedding_model()
-            print("✅ ChromaDB service initialized successfully")
-        except Exception as e:
-            print(f"⚠️ ChromaDB initialization failed: {e}")
-            print("📝 Long-term memory features will be limited")
+        # LEO_CHROMA_PARTITION: "user" (one collection per user), "user_type"
+        # (per user and document type) or "none" (everything in leo_memory)
+        self.partition_mode = os.getenv("LEO_CHROMA_PARTITION", "user").lower()
+        self._partitions: Dict = {}
+        self._partitions_lock = threading.Lock()
+        self.legacy_pending = False
+        self.migration: Dict = {"running": False}
+        # One migration at a time: per process under the thread lock, across
+        # the workers of a host under the file lock
+        self._migration_lock = threading.Lock()
+        self._migration_owner = ProcessLock(os.getenv("LEO_MIGRATION_LOCK_FILE", "leo_migration.lock"))
+        
+        # Side tables (per-user counts and timeline) opened next to the collections
+        self.index: Optional[MemoryIndex] = None
+        # Writes and side-table updates lock per user, so users never wait on each other
+        self._user_locks: Dict[str, threading.RLock] = {}
+        self._user_locks_guard = threading.Lock()
+        # Side-table rebuilds run in the background; writes made meanwhile
+        # (here or in another worker) are recorded directly and kept by the swap
+        self._rebuild_executor: Optional[ThreadPoolExecutor] = None
+        self._rebuilds: Dict[str, Future] = {}
+        
+        # Background deletions (jobs live in the side tables, so every worker
+        # sees them): documents written before a user's cutoff are hidden
+        # from reads until the job has removed them
+        self._deleting: set = set()
+        self._deleting_lock = threading.Lock()
+        self._closing = threading.Event()
+        self.ready = threading.Event()
+        self.warm_up_seconds: Optional[float] = None
+        self.warm_up_error: Optional[str] = None
+        self._warm_up_lock = threading.Lock()
+        
+        if not lazy:
+            self.warm_up()
+    
+    def warm_up(self, load_model: bool = True):
+        """Load the embedding model and open the collection (blocking, runs once)
+        
+        Maintenance tools that never embed can skip the model with ``load_model=False``.
+        """
+        with self._warm_up_lock:
+            if self.ready.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                # Model first: once the collection is visible, callers assume
+                # embeddings come from the model rather than Chroma's default
+                if load_model:
+                    self._initialize_embedding_model()
+                self._initialize_chroma()
+                legacy_count = self.collection.count()
+                self.legacy_pending = self.partition_mode != "none" and legacy_count > 0
+                if self.legacy_pending:
+                    print(f"📝 {legacy_count} memories still in the shared collection - run migrate_chroma.py or POST /api/memory/migrate")
+                print("✅ ChromaDB service initialized successfully")
+            except Exception as e:
+                self.warm_up_error = str(e)
+                print(f"⚠️ ChromaDB initialization failed: {e}")
+                print("📝 Long-term memory features will be limited")
+            finally:
+                self.warm_up_seconds = round(time.perf_counter() - started, 2)
+                self.ready.set()
+    
+    @property
+    def shared_store(self) -> bool:
+        """True when other processes can safely use the same collections"""
+        return bool(self.chroma_host)
+    
+    @property
+    def embedding_model(self):
+        return self.embeddings.model
+    
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until warm-up has finished (successfully or not)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+    
+    def get_readiness(self) -> Dict:
+        return {
+            "ready": self.ready.is_set(),
+            "collection": self.collection is not None,
+            "embedding_model": self.embedding_model is not None,
+            "warm_up_seconds": self.warm_up_seconds,
+            "error": self.warm_up_error
+        }
     
     def _initialize_chroma(self):
         """Initialize ChromaDB client and collection"""
+        import chromadb
+        
         try:
-            # Create ChromaDB client with persistence
-            self.client = chromadb.PersistentClient(path=self.persist_directory)
+            if self.chroma_host:
+                # Shared server: every worker reads and writes the same collections
+                self.client = chromadb.HttpClient(host=self.chroma_host, port=self.chroma_port)
+            else:
+                # Create ChromaDB client with persistence
+                self.client = chromadb.PersistentClient(path=self.persist_directory)
+            # The side tables are a SQLite file shared by the workers on this host
+            os.makedirs(self.persist_directory, exist_ok=True)
+            self.index = MemoryIndex(os.getenv(
+                "LEO_MEMORY_INDEX_PATH", os.path.join(self.persist_directory, "memory_index.db")
+            ))
             
             # Get or create collection for Leo's memory
             self.collection = self.client.get_or_create_collection(
-                name="leo_memory",
+                name=LEGACY_COLLECTION,
                 metadata={"description": "Long-term memory for Leo AI Assistant"}
             )
             
@@ -46,8 +184,9 @@ class ChromaService:
             # Fallback to in-memory client
             try:
                 self.client = chromadb.Client()
+                self.index = MemoryIndex()
                 self.collection = self.client.get_or_create_collection(
-                    name="leo_memory",
+                    name=LEGACY_COLLECTION,
                     metadata={"description": "Long-term memory for Leo AI Assistant (in-memory)"}
                 )
                 print("⚠️ Using in-memory ChromaDB (data will not persist)")
@@ -56,14 +195,32 @@ class ChromaService:
                 raise
     
     def _initialize_embedding_model(self):
-        """Initialize sentence transformer for embeddings"""
+        """Initialize the embedding model (PyTorch or quantized ONNX, see LEO_EMBED_BACKEND)"""
         try:
-            # Use a lightweight model for embeddings
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            # Use a lightweight model for embeddings; the first encode is slow, so do it now
+            model = load_embedding_backend()
+            model.encode(["warm up"])
+            if os.getenv("LEO_EMBED_CACHE", "true").lower() != "false":
+                # Keyed by backend too: quantized vectors differ slightly from the reference ones
+                self.embeddings.cache = EmbeddingCache(model.name)
+            self.embeddings.model = model
         except Exception as e:
             print(f"Error loading embedding model: {e}")
             print("⚠️ Using basic ChromaDB embeddings")
     
+    def close(self):
+        """Stop the embedding batcher and flush the side tables (called on shutdown)
+        
+        Running deletions stop after their current chunk and resume at the
+        next warm-up.
+        """
+        self._closing.set()
+        self.embeddings.close()
+        if self._rebuild_executor is not None:
+            self._rebuild_executor.shutdown(wait=False, cancel_futures=True)
+        if self.index is not None:
+            self.index.close()
+    
     def health_check(self) -> bool:
         """Check if ChromaDB service is healthy"""
         try:
@@ -75,87 +232,215 @@ class ChromaService:
         except Exception:
             return False
     
+    # Partitioning: each user (optionally each user and document type) gets
+    # its own collection, so queries never filter a shared HNSW index
+    def _partition_name(self, user_id: str, doc_type: str) -> str:
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+        if self.partition_mode == "user_type":
+            return f"{PARTITION_PREFIX}{digest}_{doc_type}"
+        return f"{PARTITION_PREFIX}{digest}"
+    
+    def _partition(self, user_id: str, doc_type: str, create: bool = True):
+        """Collection holding a user's documents of a type (None if it does not exist yet)"""
+        if self.partition_mode == "none":
+            return self.collection
+        
+        name = self._partition_name(user_id, doc_type)
+        with self._partitions_lock:
+            collection = self._partitions.get(name)
+            if collection is not None:
+                return collection
+            try:
+                if create:
+                    collection = self.client.get_or_create_collection(
+                        name=name,
+                        metadata={"user_id": user_id, "description": "Long-term memory partition for Leo AI Assistant"}
+                    )
+                else:
+                    collection = self.client.get_collection(name=name)
+            except Exception:
+                return None
+            self._partitions[name] = collection
+            return collection
+    
+    def _user_partitions(self, user_id: str) -> List:
+        """Existing partitions of a user"""
+        doc_types = DOC_TYPES if self.partition_mode == "user_type" else DOC_TYPES[:1]
+        collections = [self._partition(user_id, doc_type, create=False) for doc_type in doc_types]
+        return [collection for collection in collections if collection is not None]
+    
+    def _read_collections(self, user_id: str, doc_type: str) -> List:
+        """Collections to read a user's documents from: the partition, plus the
+        shared legacy collection until it has been migrated"""
+        if self.partition_mode == "none":
+            return [self.collection]
+        collections = []
+        partition = self._partition(user_id, doc_type, create=False)
+        if partition is not None:
+            collections.append(partition)
+        if self.legacy_pending:
+            collections.append(self.collection)
+        return collections
+    
+    def _filter_for(self, collection, user_id: str, doc_type: Optional[str],
+                    since: Optional[float] = None, until: Optional[float] = None) -> Optional[Dict]:
+        """Where filter for a collection: the shared ones hold every user and type
+        
+        ``since``/``until`` (epoch seconds) restrict the numeric ``ts``
+        metadata, which Chroma applies before the vector search.
+        """
+        clauses = []
+        if collection is self.collection:
+            clauses.append({"user_id": user_id})
+        if doc_type is not None and (collection is self.collection or self.partition_mode != "user_type"):
+            clauses.append({"type": doc_type})
+        if since is not None:
+            clauses.append({"ts": {"$gte": since}})
+        if until is not None:
+            clauses.append({"ts": {"$lt": until}})
+        
+        if not clauses:
+            return None
+        # Several conditions need $and
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    def _query(self, user_id: str, partition_type: str, doc_type: Optional[str], query: str, limit: int,
+               since: Optional[float] = None, until: Optional[float] = None) -> List[tuple]:
+        """Vector search across a user's collections, merged by distance
+        
+        ``partition_type`` picks the partition; ``doc_type`` (if given) also
+        filters by document type inside it.
+        """
+        collections = self._read_collections(user_id, partition_type)
+        if not collections:
+            return []
+        
+        # Generate query embedding if model is available
+        query_embeddings = self.embeddings.encode([query]) if self.embedding_model else None
+        
+        hits = {}
+        for collection in collections:
+            where = self._filter_for(collection, user_id, doc_type, since, until)
+            if query_embeddings is not None:
+                results = collection.query(query_embeddings=query_embeddings, where=where, n_results=limit)
+            else:
+                # Use ChromaDB's default query
+                results = collection.query(query_texts=[query], where=where, n_results=limit)
+            
+            if results and results['documents']:
+                for i, document in enumerate(results['documents'][0]):
+                    doc_id = results['ids'][0][i]
+                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
+                    distance = results['distances'][0][i] if results['distances'] else 0
+                    # A document mid-migration can be in both; keep one copy
+                    if doc_id not in hits or distance < hits[doc_id][0]:
+                        hits[doc_id] = (distance, document, metadata or {})
+        
+        return [hits[doc_id] for doc_id in sorted(hits, key=lambda doc_id: hits[doc_id][0])[:limit]]
+    
     def add_message(self, user_id: str, role: str, content: str, metadata: Optional[Dict] = None) -> str:
         """Add a message to long-term memory"""
+        ids = self.add_messages([{
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "metadata": metadata
+        }])
+        return ids[0] if ids else "error"
+    
+    def add_messages(self, messages: List[Dict]) -> List[str]:
+        """Add several messages with one batched encode and one write per partition
+        
+        Each entry needs ``user_id``, ``role`` and ``content`` and may carry
+        ``id``, ``timestamp`` and extra ``metadata``. The timestamp is also
+        stored as epoch seconds (``ts``) for time-window filters.
+        """
         try:
             if not self.collection:
-                return "chroma_not_available"
-            
-            # Create unique ID for the message
-            message_id = str(uuid.uuid4())
-            
-            # Prepare metadata
-            message_metadata = {
-                "user_id": user_id,
-                "role": role,
-                "timestamp": datetime.now().isoformat(),
-                "type": "chat_message"
-            }
-            
-            if metadata:
-                message_metadata.update(metadata)
+                return ["chroma_not_available"] * len(messages)
+            if not messages:
+                return []
             
-            # Generate embedding if model is available
-            if self.embedding_model:
-                embedding = self.embedding_model.encode([content])[0].tolist()
+            ids = []
+            documents = []
+            metadatas = []
+            for message in messages:
+                timestamp = message.get("timestamp") or datetime.now().isoformat()
+                message_metadata = {
+                    "user_id": message["user_id"],
+                    "role": message["role"],
+                    "timestamp": timestamp,
+                    "ts": to_epoch(timestamp),
+                    "type": "chat_message"
+                }
+                if message.get("metadata"):
+                    message_metadata.update(message["metadata"])
                 
-                self.collection.add(
-                    ids=[message_id],
-                    embeddings=[embedding],
-                    documents=[content],
-                    metadatas=[message_metadata]
-                )
-            else:
-                # Use ChromaDB's default embedding
-                self.collection.add(
-                    ids=[message_id],
-                    documents=[content],
-                    metadatas=[message_metadata]
-                )
-            
-            return message_id
+                ids.append(message.get("id") or str(uuid.uuid4()))
+                documents.append(message["content"])
+                metadatas.append(message_metadata)
+            
+            # Generate embeddings if model is available (otherwise ChromaDB's default)
+            embeddings = self.embeddings.encode(documents) if self.embedding_model else None
+            
+            # One write per partition touched by the batch
+            groups: Dict[str, List[int]] = {}
+            for index, metadata in enumerate(metadatas):
+                groups.setdefault(metadata["user_id"], []).append(index)
+            for user_id, indexes in groups.items():
+                cutoff = self._deletion_cutoff(user_id, running_only=False)
+                if cutoff is not None:
+                    # Stamped before the user asked for deletion (e.g. still queued
+                    # in another worker): never store it after the fact
+                    indexes = [i for i in indexes if metadatas[i]["ts"] >= cutoff]
+                    if not indexes:
+                        continue
+                with self._indexing(user_id, [(ids[i], metadatas[i]["type"], metadatas[i]["ts"]) for i in indexes]):
+                    self._add(self._partition(user_id, "chat_message"), ids, documents, metadatas, embeddings, indexes)
+            
+            return ids
             
         except Exception as e:
-            print(f"Error adding message to ChromaDB: {e}")
-            return "error"
+            print(f"Error adding messages to ChromaDB: {e}")
+            return ["error"] * len(messages)
+    
+    @staticmethod
+    def _add(collection, ids, documents, metadatas, embeddings, indexes: List[int]):
+        """Add the selected rows of a batch to one collection"""
+        kwargs = {
+            "ids": [ids[i] for i in indexes],
+            "documents": [documents[i] for i in indexes],
+            "metadatas": [metadatas[i] for i in indexes]
+        }
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings[indexes]
+        collection.add(**kwargs)
     
-    def search_similar(self, user_id: str, query: str, limit: int = 10) -> List[Dict]:
-        """Search for similar messages in long-term memory"""
+    def search_similar(self, user_id: str, query: str, limit: int = 10,
+                       since: Optional[float] = None, until: Optional[float] = None) -> List[Dict]:
+        """Search for similar messages in long-term memory
+        
+        ``since``/``until`` (epoch seconds) limit the search to a time window
+        before ranking, so a window always gets its own top ``limit``.
+        """
         try:
             if not self.collection:
                 return []
-            
-            # Generate query embedding if model is available
-            if self.embedding_model:
-                query_embedding = self.embedding_model.encode([query])[0].tolist()
-                
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    where={"user_id": user_id},
-                    n_results=limit
-                )
-            else:
-                # Use ChromaDB's default query
-                results = self.collection.query(
-                    query_texts=[query],
-                    where={"user_id": user_id},
-                    n_results=limit
-                )
+            since = self._visible_since(user_id, since)
+            if since is not None or until is not None:
+                # Older documents get their ts metadata when the user is indexed
+                self._ensure_indexed(user_id)
             
             # Format results
             formatted_results = []
-            if results and results['documents']:
-                for i, document in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    distance = results['distances'][0][i] if results['distances'] else 0
-                    
-                    formatted_results.append({
-                        'content': document,
-                        'metadata': metadata,
-                        'similarity': 1 - distance if distance else 1,  # Convert distance to similarity
-                        'timestamp': metadata.get('timestamp', ''),
-                        'role': metadata.get('role', 'unknown')
-                    })
+            for distance, document, metadata in self._query(user_id, "chat_message", None, query, limit, since, until):
+                formatted_results.append({
+                    'content': document,
+                    'metadata': metadata,
+                    'similarity': 1 - distance if distance else 1,  # Convert distance to similarity
+                    'timestamp': metadata.get('timestamp', ''),
+                    'role': metadata.get('role', 'unknown')
+                })
             
             return formatted_results
             
@@ -163,37 +448,62 @@ class ChromaService:
             print(f"Error searching ChromaDB: {e}")
             return []
     
-    def get_recent_memories(self, user_id: str, limit: int = 20) -> List[Dict]:
-        """Get recent memories for a user"""
+    def get_recent_memories(self, user_id: str, limit: int = 20,
+                            before: Optional[tuple] = None) -> List[Dict]:
+        """Get a user's most recent memories, newest first (see get_recent_page for paging)"""
+        return self.get_recent_page(user_id, limit, before)["memories"]
+    
+    def get_recent_page(self, user_id: str, limit: int = 20, before: Optional[tuple] = None) -> Dict:
+        """One page of a user's memories, newest first, plus the cursor of the next page
+        
+        The (user, time) side index picks the IDs, so only ``limit``
+        documents are fetched. Pass ``next_cursor`` back as ``before``; it is
+        the (ts, id) of the page's last timeline row, so an ID whose document
+        is gone shortens the page without ending pagination. It is None once
+        the timeline is exhausted.
+        """
+        page = {"memories": [], "next_cursor": None}
         try:
             if not self.collection:
-                return []
-            
-            # Get all messages for user (ChromaDB doesn't have direct ordering)
-            results = self.collection.get(
-                where={"user_id": user_id},
-                limit=limit * 2  # Get more to sort and limit properly
-            )
-            
-            formatted_results = []
-            if results and results['documents']:
-                for i, document in enumerate(results['documents']):
-                    metadata = results['metadatas'][i] if results['metadatas'] else {}
-                    
-                    formatted_results.append({
-                        'content': document,
-                        'metadata': metadata,
-                        'timestamp': metadata.get('timestamp', ''),
-                        'role': metadata.get('role', 'unknown')
-                    })
-            
-            # Sort by timestamp and limit
-            formatted_results.sort(key=lambda x: x['timestamp'], reverse=True)
-            return formatted_results[:limit]
+                return page
+            
+            self._ensure_indexed(user_id)
+            timeline = self.index.recent(user_id, limit, before, since=self._deletion_cutoff(user_id))
+            if not timeline:
+                return page
+            if len(timeline) == limit:
+                page["next_cursor"] = (timeline[-1][1], timeline[-1][0])
+            
+            ids = [doc_id for doc_id, _ in timeline]
+            found = {}
+            collections = self._user_partitions(user_id)
+            if self.legacy_pending or self.partition_mode == "none":
+                collections.append(self.collection)
+            for collection in {id(collection): collection for collection in collections}.values():
+                missing = [doc_id for doc_id in ids if doc_id not in found]
+                if not missing:
+                    break
+                results = collection.get(ids=missing)
+                for doc_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+                    found[doc_id] = (document, metadata or {})
+            
+            for doc_id, ts in timeline:
+                if doc_id not in found:
+                    continue
+                document, metadata = found[doc_id]
+                page["memories"].append({
+                    'id': doc_id,
+                    'content': document,
+                    'metadata': metadata,
+                    'timestamp': metadata.get('timestamp', ''),
+                    'ts': ts,
+                    'role': metadata.get('role', 'unknown')
+                })
+            return page
             
         except Exception as e:
             print(f"Error getting recent memories: {e}")
-            return []
+            return page
     
     def add_goal_plan(self, user_id: str, goal_data: Dict) -> str:
         """Add a goal and plan to long-term memory"""
@@ -206,28 +516,19 @@ class ChromaService:
             # Create searchable content from goal data
             content = f"Goal: {goal_data.get('goal', '')} Plan: {json.dumps(goal_data.get('plan', {}))}"
             
+            timestamp = datetime.now().isoformat()
             metadata = {
                 "user_id": user_id,
                 "type": "goal_plan",
                 "goal": goal_data.get('goal', ''),
                 "timeline": goal_data.get('timeline', ''),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": timestamp,
+                "ts": to_epoch(timestamp)
             }
             
-            if self.embedding_model:
-                embedding = self.embedding_model.encode([content])[0].tolist()
-                self.collection.add(
-                    ids=[plan_id],
-                    embeddings=[embedding],
-                    documents=[content],
-                    metadatas=[metadata]
-                )
-            else:
-                self.collection.add(
-                    ids=[plan_id],
-                    documents=[content],
-                    metadatas=[metadata]
-                )
+            embeddings = self.embeddings.encode([content]) if self.embedding_model else None
+            with self._indexing(user_id, [(plan_id, "goal_plan", metadata["ts"])]):
+                self._add(self._partition(user_id, "goal_plan"), [plan_id], [content], [metadata], embeddings, [0])
             
             return plan_id
             
@@ -240,33 +541,19 @@ class ChromaService:
         try:
             if not self.collection:
                 return []
-            
-            if self.embedding_model:
-                query_embedding = self.embedding_model.encode([query])[0].tolist()
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    where={"user_id": user_id, "type": "goal_plan"},
-                    n_results=limit
-                )
-            else:
-                results = self.collection.query(
-                    query_texts=[query],
-                    where={"user_id": user_id, "type": "goal_plan"},
-                    n_results=limit
-                )
+            since = self._visible_since(user_id, None)
+            if since is not None:
+                self._ensure_indexed(user_id)
             
             formatted_results = []
-            if results and results['documents']:
-                for i, document in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    
-                    formatted_results.append({
-                        'content': document,
-                        'metadata': metadata,
-                        'goal': metadata.get('goal', ''),
-                        'timeline': metadata.get('timeline', ''),
-                        'timestamp': metadata.get('timestamp', '')
-                    })
+            for _, document, metadata in self._query(user_id, "goal_plan", "goal_plan", query, limit, since):
+                formatted_results.append({
+                    'content': document,
+                    'metadata': metadata,
+                    'goal': metadata.get('goal', ''),
+                    'timeline': metadata.get('timeline', ''),
+                    'timestamp': metadata.get('timestamp', '')
+                })
             
             return formatted_results
             
@@ -274,51 +561,319 @@ class ChromaService:
             print(f"Error searching goals: {e}")
             return []
     
+    def _deletion_cutoff(self, user_id: str, running_only: bool = True) -> Optional[float]:
+        """Cutoff of the user's deletion job (only a running one unless ``running_only`` is False)"""
+        job = self.index.get_deletion(user_id)
+        if job is None or (running_only and job["status"] != "running"):
+            return None
+        return job["cutoff"]
+    
+    def _visible_since(self, user_id: str, since: Optional[float]) -> Optional[float]:
+        """Lower time bound for reads: documents older than a running deletion's cutoff are hidden"""
+        cutoff = self._deletion_cutoff(user_id)
+        if cutoff is None:
+            return since
+        return max(since or cutoff, cutoff)
+    
+    def _user_lock(self, user_id: str) -> threading.RLock:
+        with self._user_locks_guard:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.RLock()
+            return lock
+    
+    @contextmanager
+    def _indexing(self, user_id: str, entries: List[tuple]):
+        """Record (id, type, ts) of documents written inside the block in the side tables
+        
+        Only the user's own lock is held, and nothing is scanned here: a user
+        whose rows are not trusted yet (documents from before the side
+        tables) gets a background rebuild, which keeps rows recorded while it
+        scanned, whichever worker recorded them.
+        """
+        with self._user_lock(user_id):
+            yield
+            self.index.record_added(user_id, entries)
+        if not self.index.is_indexed(user_id):
+            self._schedule_rebuild(user_id)
+    
+    def _ensure_indexed(self, user_id: str):
+        """Wait until the user's side-table rows can be trusted (never call holding the user lock)"""
+        if not self.index.is_indexed(user_id):
+            self._schedule_rebuild(user_id).result()
+    
+    def _schedule_rebuild(self, user_id: str) -> Future:
+        """Background rebuild of a user's side-table rows (joins one already in flight)"""
+        with self._user_locks_guard:
+            future = self._rebuilds.get(user_id)
+            if future is None:
+                if self._rebuild_executor is None:
+                    self._rebuild_executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv("LEO_INDEX_REBUILD_WORKERS", "2")),
+                        thread_name_prefix="leo-index-rebuild"
+                    )
+                future = self._rebuild_executor.submit(self._rebuild, user_id)
+                self._rebuilds[user_id] = future
+                future.add_done_callback(lambda done: self._forget_rebuild(user_id, done))
+            return future
+    
+    def _forget_rebuild(self, user_id: str, future: Future):
+        with self._user_locks_guard:
+            if self._rebuilds.get(user_id) is future:
+                del self._rebuilds[user_id]
+    
+    def _rebuild(self, user_id: str) -> Dict[str, int]:
+        """Scan a user's collections without holding their lock, then swap in the result
+        
+        The swap is one side-table transaction that keeps rows recorded
+        after the scan started (in this or another worker), so a document
+        the scan missed (or saw) is counted exactly once.
+        """
+        scanned_at = time.time()
+        entries = self._scan_user(user_id)
+        self.index.replace_user(user_id, entries, scanned_at)
+        return self.index.get_counts(user_id)
+    
+    def _scan_user(self, user_id: str) -> List[tuple]:
+        """(id, type, ts) of every document of a user, by paging through their collections
+        
+        Documents written before ``ts`` existed get it added to their metadata
+        so time-window searches include them.
+        """
+        entries = {}
+        collections = self._read_collections(user_id, "chat_message") + self._user_partitions(user_id)
+        for collection in {id(collection): collection for collection in collections}.values():
+            where = self._filter_for(collection, user_id, None)
+            offset = 0
+            while True:
+                results = collection.get(where=where, include=["metadatas"], limit=SCAN_PAGE_SIZE, offset=offset)
+                page_ids = results.get('ids') or []
+                if not page_ids:
+                    break
+                offset += len(page_ids)
+                
+                backfill_ids, backfill_metadatas = [], []
+                for doc_id, metadata in zip(page_ids, results.get('metadatas') or []):
+                    metadata = metadata or {}
+                    if "ts" not in metadata:
+                        metadata = {**metadata, "ts": to_epoch(metadata.get('timestamp', ''))}
+                        backfill_ids.append(doc_id)
+                        backfill_metadatas.append(metadata)
+                    # Mid-migration a document can be in two collections; keep one entry
+                    entries[doc_id] = (doc_id, metadata.get('type', 'unknown'), metadata["ts"])
+                if backfill_ids:
+                    collection.update(ids=backfill_ids, metadatas=backfill_metadatas)
+        return list(entries.values())
+    
+    def rebuild_memory_index(self, user_id: str) -> Dict[str, int]:
+        """Rebuild a user's counts and timeline from Chroma and wait for it; returns the counts by type"""
+        return self._schedule_rebuild(user_id).result()
+    
     def get_memory_stats(self, user_id: str) -> Dict:
-        """Get memory statistics for a user"""
+        """Get memory statistics for a user (from the side table, no collection scan)"""
         try:
             if not self.collection:
                 return {"total_memories": 0, "status": "unavailable"}
             
-            # Get all user data
-            results = self.collection.get(where={"user_id": user_id})
-            
-            total_memories = len(results['documents']) if results and results['documents'] else 0
+            self._ensure_indexed(user_id)
+            type_counts = self.index.get_counts(user_id)
             
-            # Count by type
-            type_counts = {}
-            if results and results['metadatas']:
-                for metadata in results['metadatas']:
-                    msg_type = metadata.get('type', 'unknown')
-                    type_counts[msg_type] = type_counts.get(msg_type, 0) + 1
-            
-            return {
-                "total_memories": total_memories,
+            stats = {
+                "total_memories": sum(type_counts.values()),
                 "type_breakdown": type_counts,
                 "status": "healthy" if self.health_check() else "error",
                 "last_updated": datetime.now().isoformat()
             }
+            deletion = self.index.get_deletion(user_id)
+            if deletion and deletion["status"] == "running":
+                # Counts still include documents the job has not reached yet
+                stats["deletion"] = deletion
+            return stats
             
         except Exception as e:
             print(f"Error getting memory stats: {e}")
             return {"total_memories": 0, "status": "error", "error": str(e)}
     
     def clear_user_memory(self, user_id: str) -> bool:
-        """Clear all memories for a specific user"""
+        """Clear all memories for a specific user (blocking; the API runs it as a background job)"""
+        job = self.start_user_deletion(user_id)
+        if job.get("status") != "running":
+            return False
+        return self.run_user_deletion(user_id).get("status") == "completed"
+    
+    def start_user_deletion(self, user_id: str) -> Dict:
+        """Record a deletion of everything the user has stored so far
+        
+        Returns at once; run_user_deletion() does the work. Documents written
+        before the job's cutoff disappear from searches immediately, anything
+        written afterwards is kept. A job that is already running is returned
+        as is.
+        """
+        if not self.collection:
+            return {"user_id": user_id, "status": "unavailable"}
+        
+        with self._user_lock(user_id):
+            job = self.index.get_deletion(user_id)
+            if job and job["status"] == "running":
+                return job
+            cutoff = time.time()
+            # The total is filled in by the job once the user is indexed
+            total = self.index.count_before(user_id, cutoff) if self.index.is_indexed(user_id) else 0
+            job = self.index.start_deletion(user_id, cutoff, total)
+        print(f"🛑 Deleting long-term memory for {user_id}")
+        return job
+    
+    def run_user_deletion(self, user_id: str, chunk_size: Optional[int] = None) -> Dict:
+        """Delete a user's documents older than the job cutoff, oldest first, one chunk at a time
+        
+        IDs come from the side-table timeline, so no documents are loaded.
+        Each chunk is deleted from Chroma before it is removed from the side
+        tables, so after a crash the job (still ``running``) resumes where it
+        stopped and re-deleting a few IDs is harmless.
+        """
+        chunk_size = chunk_size or DELETE_CHUNK_SIZE
+        job = self.index.get_deletion(user_id) if self.index else None
+        if not job or job["status"] != "running":
+            return job or {"user_id": user_id, "status": "not_found"}
+        
+        with self._deleting_lock:
+            if user_id in self._deleting:
+                return job
+            self._deleting.add(user_id)
+        
         try:
-            if not self.collection:
-                return False
-            
-            # Get all user documents
-            results = self.collection.get(where={"user_id": user_id})
-            
-            if results and results['ids']:
-                # Delete all user documents
-                self.collection.delete(ids=results['ids'])
-                return True
-            
-            return True  # No documents to delete is also success
-            
+            if not self.index.is_indexed(user_id):
+                self._ensure_indexed(user_id)
+                self.index.update_deletion(user_id, total=self.index.count_before(user_id, job["cutoff"]))
+            
+            while not self._closing.is_set():
+                # The lock is released between chunks so new writes are not held up
+                with self._user_lock(user_id):
+                    entries = self.index.oldest(user_id, chunk_size, job["cutoff"])
+                    if not entries:
+                        self._sweep_user(user_id, job["cutoff"])
+                        self.index.update_deletion(user_id, status="completed")
+                        print(f"✅ Long-term memory deleted for {user_id}")
+                        break
+                    ids = [doc_id for doc_id, _, _ in entries]
+                    for collection in self._deletion_collections(user_id):
+                        collection.delete(ids=ids)
+                    self.index.update_deletion(user_id, self.index.remove(user_id, entries))
+        except Exception as e:
+            print(f"Error deleting user memory: {e}")
+            if not self._closing.is_set():
+                self.index.update_deletion(user_id, status="failed", error=str(e))
+        finally:
+            with self._deleting_lock:
+                self._deleting.discard(user_id)
+        
+        return self.get_deletion_job(user_id)
+    
+    def get_deletion_job(self, user_id: str) -> Dict:
+        """Progress of the user's latest deletion job"""
+        job = self.index.get_deletion(user_id) if self.index else None
+        return job or {"user_id": user_id, "status": "not_found"}
+    
+    def pending_deletions(self) -> List[str]:
+        """Users whose deletion was interrupted (resumed after warm-up by the primary worker)"""
+        if self.index is None:
+            return []
+        return [job["user_id"] for job in self.index.running_deletions()]
+    
+    def _deletion_collections(self, user_id: str) -> List:
+        collections = self._user_partitions(user_id) if self.partition_mode != "none" else []
+        if self.partition_mode == "none" or self.legacy_pending:
+            collections.append(self.collection)
+        return collections
+    
+    def _sweep_user(self, user_id: str, cutoff: float):
+        """Finish a deletion (called under the user lock)
+        
+        Deletes by predicate whatever older than the cutoff the timeline did
+        not list (e.g. a crash between a Chroma write and its side-table
+        record). Emptied partitions are kept: other workers hold handles to
+        them and may be writing to them right now.
+        """
+        for collection in self._deletion_collections(user_id):
+            collection.delete(where=self._filter_for(collection, user_id, None, until=cutoff))
+    
+    def begin_migration(self) -> Optional[Dict]:
+        """Claim the legacy migration; None when one is already running here or in another worker
+        
+        Pass the returned progress to migrate_legacy_collection().
+        """
+        with self._migration_lock:
+            if self.migration.get("running") or not self._migration_owner.try_acquire():
+                return None
+            self.migration = {"running": True, "migrated": 0, "batches": 0, "remaining": None,
+                              "started": datetime.now().isoformat()}
+            return self.migration
+    
+    def migrate_legacy_collection(self, batch_size: int = 256, delete_source: bool = True,
+                                  progress: Optional[Dict] = None) -> Dict:
+        """Move documents from the shared ``leo_memory`` collection into per-user partitions
+        
+        Safe to run while serving: reads consult both the partition and the
+        legacy collection (de-duplicated by ID) until the legacy collection is
+        empty, and copies use upsert with the original IDs and embeddings, so
+        an interrupted run can simply be started again. ``progress`` is a
+        claim from begin_migration(); without one the migration claims itself.
+        """
+        if progress is None:
+            if not self.collection or self.partition_mode == "none":
+                return {"running": False, "migrated": 0, "batches": 0, "remaining": None}
+            progress = self.begin_migration()
+            if progress is None:
+                return {**self.migration, "running": True}
+        
+        try:
+            self._migrate_pages(progress, batch_size, delete_source)
         except Exception as e:
-            print(f"Error clearing user memory: {e}")
-            return False
\ No newline at end of file
+            progress["error"] = str(e)
+            print(f"Error migrating legacy memories: {e}")
+        finally:
+            progress["remaining"] = self.collection.count()
+            self.legacy_pending = progress["remaining"] > 0
+            progress["finished"] = datetime.now().isoformat()
+            with self._migration_lock:
+                progress["running"] = False
+                self._migration_owner.release()
+        
+        print(f"✅ Migrated {progress['migrated']} memories into per-user collections")
+        return progress
+    
+    def _migrate_pages(self, progress: Dict, batch_size: int, delete_source: bool):
+        offset = 0
+        while True:
+            page = self.collection.get(
+                limit=batch_size, offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            page_ids = page.get("ids") or []
+            if not page_ids:
+                break
+            
+            groups: Dict[tuple, List[int]] = {}
+            for index, metadata in enumerate(page["metadatas"]):
+                metadata = metadata or {}
+                key = (metadata.get("user_id", "unknown"), metadata.get("type", "chat_message"))
+                groups.setdefault(key, []).append(index)
+            for (user_id, doc_type), indexes in groups.items():
+                metadatas = [page["metadatas"][i] or {} for i in indexes]
+                self._partition(user_id, doc_type).upsert(
+                    ids=[page_ids[i] for i in indexes],
+                    documents=[page["documents"][i] for i in indexes],
+                    metadatas=[
+                        metadata if "ts" in metadata else {**metadata, "ts": to_epoch(metadata.get("timestamp", ""))}
+                        for metadata in metadatas
+                    ],
+                    embeddings=[page["embeddings"][i] for i in indexes]
+                )
+            
+            if delete_source:
+                # Copied rows leave the legacy collection, so the next page starts at 0 again
+                self.collection.delete(ids=page_ids)
+            else:
+                offset += len(page_ids)
+            progress["migrated"] += len(page_ids)
+            progress["batches"] += 1
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+WebSocket Connection Manager for Leo AI Assistant
+Per-connection bounded send queues with overflow policies and idle reaping
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+# Overflow policies for a full send queue
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+
+# Topics a client can subscribe to on /ws
+TOPICS = {"chat", "calendar", "gmail", "tasks", "insights", "mode", "agent"}
+
+# Topics a connection gets before it sends a subscribe message; chat is
+# per-user and private, so it always needs an explicit subscription
+DEFAULT_TOPICS = {"calendar", "gmail", "tasks", "insights", "mode", "agent"}
+
+# Snapshot-style messages where only the newest one matters
+COALESCIBLE_TYPES = {"api_data_updated", "agent_status", "mode_changed", "ping"}
+
+# State backend channel that fans publish/broadcast out to every worker
+BUS_CHANNEL = "ws"
+
+
+class ClientConnection:
+    """One socket with its outbound queue, drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue = deque()
+        self.max_queue = max_queue
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        # Per-client protocol state (e.g. acknowledged snapshot version)
+        self.state: Dict = {}
+        self.user_id: Optional[str] = None
+        self.topics: Set[str] = set()
+
+
+class ConnectionManager:
+    def __init__(self, max_queue: Optional[int] = None, overflow_policy: Optional[str] = None,
+                 send_timeout: Optional[float] = None, ping_interval: Optional[float] = None,
+                 idle_timeout: Optional[float] = None, state_backend=None):
+        """Initialize connection manager
+        
+        With a shared ``state_backend`` publish/broadcast go through its
+        pub/sub channel, so sockets held by other workers receive them too.
+        """
+        self.max_queue = max_queue or int(os.getenv("LEO_WS_QUEUE_SIZE", "100"))
+        self.overflow_policy = overflow_policy or os.getenv("LEO_WS_OVERFLOW_POLICY", COALESCE)
+        self.send_timeout = send_timeout or float(os.getenv("LEO_WS_SEND_TIMEOUT", "10"))
+        self.ping_interval = ping_interval or float(os.getenv("LEO_WS_PING_SECONDS", "30"))
+        self.idle_timeout = idle_timeout or float(os.getenv("LEO_WS_IDLE_TIMEOUT", "90"))
+        
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        # Routing indexes: topic -> sockets and user -> sockets
+        self.topic_index: Dict[str, Set[WebSocket]] = {topic: set() for topic in TOPICS}
+        self.user_index: Dict[str, Set[WebSocket]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.state_backend = state_backend if state_backend is not None and state_backend.shared else None
+        self._bus_attached = False
+        self.metrics = {"broadcasts": 0, "published": 0, "bus_messages": 0, "sent": 0, "dropped": 0, "coalesced": 0, "overflow_disconnects": 0, "reaped": 0}
+    
+    async def connect(self, websocket: WebSocket, user_id: Optional[str] = None):
+        """Accept a connection; its user is bound here and never changes afterwards"""
+        await websocket.accept()
+        connection = ClientConnection(websocket, self.max_queue)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.active_connections[websocket] = connection
+        self.subscribe(websocket, DEFAULT_TOPICS)
+        if user_id is not None:
+            self._index_user(websocket, connection, user_id)
+        
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+        print(f"WebSocket connected. Total: {len(self.active_connections)}")
+    
+    def disconnect(self, websocket: WebSocket):
+        connection = self.active_connections.pop(websocket, None)
+        if connection is not None:
+            for topic in connection.topics:
+                self.topic_index[topic].discard(websocket)
+            self._index_user(websocket, connection, None)
+            if connection.writer is not None and connection.writer is not asyncio.current_task():
+                connection.writer.cancel()
+            print(f"WebSocket disconnected. Total: {len(self.active_connections)}")
+    
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str], replace: bool = False) -> Set[str]:
+        """Subscribe a connection to topics (unknown ones are ignored)"""
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return set()
+        
+        wanted = {topic for topic in topics if topic in TOPICS}
+        if replace:
+            self.unsubscribe(websocket, connection.topics - wanted)
+        for topic in wanted:
+            self.topic_index[topic].add(websocket)
+        connection.topics |= wanted
+        return set(connection.topics)
+    
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return
+        for topic in list(topics):
+            self.topic_index.get(topic, set()).discard(websocket)
+            connection.topics.discard(topic)
+    
+    def _index_user(self, websocket: WebSocket, connection: ClientConnection, user_id: Optional[str]):
+        if connection.user_id is not None:
+            sockets = self.user_index.get(connection.user_id)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.user_index[connection.user_id]
+        connection.user_id = user_id
+        if user_id is not None:
+            self.user_index.setdefault(user_id, set()).add(websocket)
+    
+    def subscribers(self, topics: Iterable[str], user_id: Optional[str] = None) -> Set[WebSocket]:
+        """Connections subscribed to any of the topics (and belonging to user_id, if given)"""
+        topics = list(topics)
+        if user_id is not None:
+            # A user's own sockets are few; filter those rather than the whole topic
+            return {
+                websocket for websocket in self.user_index.get(user_id, ())
+                if self.active_connections[websocket].topics.intersection(topics)
+            }
+        result = set()
+        for topic in topics:
+            result |= self.topic_index.get(topic, set())
+        return result
+    
+    async def attach_bus(self):
+        """Start receiving publish/broadcast messages from other workers"""
+        if self.state_backend is None or self._bus_attached:
+            return
+        await self.state_backend.subscribe(BUS_CHANNEL, self._on_bus_message)
+        self._bus_attached = True
+        print("✅ WebSocket bus attached to shared state backend")
+    
+    async def _on_bus_message(self, envelope: Dict):
+        self.metrics["bus_messages"] += 1
+        if envelope.get("topic") is None:
+            await self._broadcast_local(envelope["message"])
+        else:
+            await self._publish_local(envelope["topic"], envelope["message"], envelope.get("user_id"))
+    
+    async def publish(self, topic: str, message: dict, user_id: Optional[str] = None):
+        """Send a message only to subscribers of a topic (optionally one user's connections)"""
+        if self._bus_attached:
+            await self.state_backend.publish(BUS_CHANNEL, {"topic": topic, "message": message, "user_id": user_id})
+        else:
+            await self._publish_local(topic, message, user_id)
+    
+    async def _publish_local(self, topic: str, message: dict, user_id: Optional[str]):
+        self.metrics["published"] += 1
+        # Messages addressed to one user are never dropped on overflow
+        await self.send_group(self.subscribers([topic], user_id), message, droppable=user_id is None)
+    
+    def touch(self, websocket: WebSocket):
+        """Record inbound activity (any message, including pong)"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+    
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single connection; it is never dropped on overflow"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, message.get("type"), json.dumps(message), droppable=False)
+    
+    async def send_group(self, websockets, message: dict, droppable: bool = True):
+        """Queue one message for a group of connections, serializing it only once"""
+        payload = json.dumps(message)
+        message_type = message.get("type")
+        for websocket in websockets:
+            connection = self.active_connections.get(websocket)
+            if connection is not None:
+                self._enqueue(connection, message_type, payload, droppable)
+    
+    async def broadcast(self, message: dict):
+        """Queue a message for every connection, serializing it only once"""
+        if self._bus_attached:
+            await self.state_backend.publish(BUS_CHANNEL, {"topic": None, "message": message})
+        else:
+            await self._broadcast_local(message)
+    
+    async def _broadcast_local(self, message: dict):
+        self.metrics["broadcasts"] += 1
+        payload = json.dumps(message)
+        message_type = message.get("type")
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, message_type, payload)
+    
+    def _enqueue(self, connection: ClientConnection, message_type: Optional[str], payload: str,
+                 droppable: bool = True):
+        """Append to a connection's queue, applying the overflow policy when full
+        
+        Only broadcast-style messages are dropped or coalesced. Personal ones
+        (e.g. chat_token stream events) are never lost: if the queue holds
+        nothing droppable to make room for them, the client is disconnected.
+        """
+        queue = connection.queue
+        if len(queue) >= connection.max_queue:
+            if self.overflow_policy == DISCONNECT:
+                self._overflow_disconnect(connection)
+                return
+            
+            if self.overflow_policy == COALESCE and message_type in COALESCIBLE_TYPES:
+                for i, (queued_type, _, queued_droppable) in enumerate(queue):
+                    if queued_type == message_type and queued_droppable:
+                        # Replace the stale snapshot; the newest goes to the back to keep ordering
+                        del queue[i]
+                        queue.append((message_type, payload, droppable))
+                        self.metrics["coalesced"] += 1
+                        return
+            
+            oldest = next((i for i, (_, _, queued_droppable) in enumerate(queue) if queued_droppable), None)
+            if oldest is None:
+                if not droppable:
+                    self._overflow_disconnect(connection)
+                    return
+                # Queue is all personal messages: drop the incoming broadcast instead
+                connection.dropped += 1
+                self.metrics["dropped"] += 1
+                return
+            del queue[oldest]
+            connection.dropped += 1
+            self.metrics["dropped"] += 1
+        
+        queue.append((message_type, payload, droppable))
+        connection.ready.set()
+    
+    def _overflow_disconnect(self, connection: ClientConnection):
+        self.metrics["overflow_disconnects"] += 1
+        self._close(connection, code=1013, reason="Send queue overflow")
+    
+    async def _writer(self, connection: ClientConnection):
+        """Drain one connection's queue; a slow client only delays itself"""
+        try:
+            while True:
+                await connection.ready.wait()
+                while connection.queue:
+                    _, payload, _ = connection.queue.popleft()
+                    await asyncio.wait_for(connection.websocket.send_text(payload), self.send_timeout)
+                    self.metrics["sent"] += 1
+                connection.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket send failed, dropping client: {e!r}")
+            self.disconnect(connection.websocket)
+    
+    def _close(self, connection: ClientConnection, code: int = 1000, reason: str = ""):
+        """Disconnect and close a socket without blocking the caller"""
+        self.disconnect(connection.websocket)
+        asyncio.ensure_future(self._safe_close(connection.websocket, code, reason))
+    
+    @staticmethod
+    async def _safe_close(websocket: WebSocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+    
+    async def _reap_idle(self):
+        """Ping clients periodically and close ones that stopped answering"""
+        while self.active_connections:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+            for connection in list(self.active_connections.values()):
+                if now - connection.last_seen > self.idle_timeout:
+                    self.metrics["reaped"] += 1
+                    self._close(connection, code=1001, reason="Idle timeout")
+                else:
+                    self._enqueue(connection, "ping", json.dumps({"type": "ping"}))
+    
+    async def close_all(self):
+        """Close every connection (called on shutdown)"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        for connection in list(self.active_connections.values()):
+            self.disconnect(connection.websocket)
+            await self._safe_close(connection.websocket, 1001, "Server shutting down")
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "connections": len(self.active_connections),
+            "identified_users": len(self.user_index),
+            "topic_subscribers": {topic: len(sockets) for topic, sockets in self.topic_index.items()},
+            "queued_messages": sum(len(c.queue) for c in self.active_connections.values()),
+            "overflow_policy": self.overflow_policy,
+            "max_queue": self.max_queue,
+            "shared_bus": self._bus_attached
+        }
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Embedding Backends for Leo AI Assistant
+Interchangeable embedding models: full-precision PyTorch or int8-quantized ONNX Runtime
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+
+# Both backends produce the same 384-dim, L2-normalized vectors
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+HF_REPO_PREFIX = "sentence-transformers/"
+
+# Dynamically quantized (int8 weights) export published with the model;
+# avx512_vnni/avx512/arm64 variants exist for other CPUs
+DEFAULT_ONNX_FILE = "onnx/model_qint8_avx2.onnx"
+
+
+class SentenceTransformerBackend:
+    """Reference backend: the sentence-transformers model on PyTorch"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.name = f"torch:{model_name}"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class OnnxEmbeddingBackend:
+    """Quantized ONNX Runtime backend; needs onnxruntime, tokenizers and huggingface_hub but not torch
+
+    Reproduces the sentence-transformers pipeline for the model: tokenize
+    (truncating at ``max_seq_length``), run the transformer, mean-pool over
+    the attention mask and L2-normalize.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, onnx_file: Optional[str] = None,
+                 max_seq_length: int = 256, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo_id = model_name if "/" in model_name else HF_REPO_PREFIX + model_name
+        onnx_file = onnx_file or os.getenv("LEO_ONNX_FILE", DEFAULT_ONNX_FILE)
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or int(os.getenv("LEO_ONNX_THREADS", "0"))
+        self.session = ort.InferenceSession(
+            hf_hub_download(repo_id, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.name = f"onnx:{model_name}:{os.path.basename(onnx_file)}"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = [self._encode_batch(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feed)[0]
+
+        # Mean pooling over real tokens, then unit length
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def load_embedding_backend(kind: Optional[str] = None, model_name: str = DEFAULT_MODEL):
+    """Load the backend selected by LEO_EMBED_BACKEND (torch or onnx), falling back to torch"""
+    kind = (kind or os.getenv("LEO_EMBED_BACKEND", "torch")).lower()
+    if kind == "onnx":
+        try:
+            backend = OnnxEmbeddingBackend(model_name)
+            print(f"✅ Quantized ONNX embedding backend loaded ({backend.name})")
+            return backend
+        except Exception as e:
+            print(f"⚠️ ONNX embedding backend unavailable ({e}) - using PyTorch")
+    return SentenceTransformerBackend(model_name)
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray, query_count: int, k: int = 5) -> float:
+    """Share of each query's top-k neighbours (by the reference vectors) the candidate vectors also rank top-k
+
+    The first ``query_count`` rows are queries, the rest the corpus. Vectors
+    are assumed to be L2-normalized, so dot products are cosine similarities.
+    """
+    queries_ref, corpus_ref = reference[:query_count], reference[query_count:]
+    queries_cand, corpus_cand = candidate[:query_count], candidate[query_count:]
+    k = min(k, len(corpus_ref))
+
+    top_ref = np.argsort(-queries_ref @ corpus_ref.T, axis=1)[:, :k]
+    top_cand = np.argsort(-queries_cand @ corpus_cand.T, axis=1)[:, :k]
+    overlap = [len(set(ref_row) & set(cand_row)) / k for ref_row, cand_row in zip(top_ref, top_cand)]
+    return float(np.mean(overlap)) if overlap else 0.0
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache for Leo AI Assistant
+Content-addressed embedding cache with an in-memory LRU tier and a memory-mapped float32 tier on disk
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.process_lock import ProcessLock
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, directory: Optional[str] = None,
+                 memory_size: Optional[int] = None, disk_entries: Optional[int] = None):
+        """Initialize the embedding cache
+
+        Entries are keyed by a hash of (model, normalized text). Recent
+        vectors stay in an LRU dict; every vector is also written to a
+        fixed-width float32 memmap (``vectors.f32``) with an append-only
+        key -> slot log (``index.log``) so a restart starts warm. The disk
+        tier is a ring: once ``disk_entries`` slots are used the oldest
+        slot is overwritten. Files are created on the first write, when the
+        embedding width is known, and reset if the model or width changes.
+        
+        The disk tier has a single writer: each worker process locks its own
+        directory under ``directory`` (the first worker uses ``directory``
+        itself), up to LEO_EMBED_CACHE_WORKERS of them; a worker beyond that
+        keeps only the memory tier.
+        """
+        self.model_name = model_name
+        self.base_directory = directory or os.getenv("LEO_EMBED_CACHE_DIR", "./embedding_cache")
+        self.directory: Optional[str] = None
+        self._owner: Optional[ProcessLock] = None
+        self.memory_size = memory_size or int(os.getenv("LEO_EMBED_CACHE_SIZE", "5000"))
+        self.disk_entries = disk_entries or int(os.getenv("LEO_EMBED_CACHE_DISK_ENTRIES", "100000"))
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Disk tier
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._slots: Dict[str, int] = {}
+        self._slot_keys: List[Optional[str]] = []
+        self._next_slot = 0
+        self._log = None
+        self._log_lines = 0
+
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "disk_errors": 0}
+
+        try:
+            self._claim_directory(int(os.getenv("LEO_EMBED_CACHE_WORKERS", "16")))
+            if self.directory is not None:
+                self._open_disk()
+        except Exception as e:
+            self.metrics["disk_errors"] += 1
+            print(f"⚠️ Embedding cache disk tier unavailable: {e}")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Cached vector for a text, or None"""
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return vector
+
+            slot = self._slots.get(key)
+            if slot is not None and self._vectors is not None:
+                # Copy out of the memmap so the slot can be recycled later
+                vector = np.array(self._vectors[slot])
+                self._remember(key, vector)
+                self.metrics["disk_hits"] += 1
+                return vector
+
+            self.metrics["misses"] += 1
+            return None
+
+    def put(self, text: str, vector: np.ndarray):
+        """Store a freshly computed vector in both tiers"""
+        key = self.key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            self.metrics["writes"] += 1
+            try:
+                self._write_disk(key, vector)
+            except Exception as e:
+                self.metrics["disk_errors"] += 1
+                print(f"Error writing embedding cache: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    # Disk tier
+    def _claim_directory(self, max_workers: int):
+        """Lock the first free per-worker directory; slots are stable, so a restarted worker finds its cache again"""
+        for slot in range(max_workers):
+            directory = self.base_directory if slot == 0 else os.path.join(self.base_directory, f"worker-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            lock = ProcessLock(os.path.join(directory, "owner.lock"))
+            if lock.try_acquire():
+                self.directory = directory
+                self._owner = lock
+                return
+        print("⚠️ Every embedding cache directory is in use - this worker keeps a memory-only cache")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_disk(self):
+        """Load an existing disk tier if it matches this model"""
+        meta_file = self._path("meta.json")
+        if not os.path.exists(meta_file):
+            return
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name or meta.get("capacity") != self.disk_entries:
+            print("📝 Embedding cache belongs to another model or size - starting fresh")
+            return
+
+        self.dim = meta["dim"]
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(self.disk_entries, self.dim))
+        self._slot_keys = [None] * self.disk_entries
+
+        # Replay the log; a later line for the same slot evicts the earlier key
+        log_file = self._path("index.log")
+        if os.path.exists(log_file):
+            with open(log_file, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue
+                    key, slot = parts[0], int(parts[1])
+                    if not 0 <= slot < self.disk_entries:
+                        continue
+                    self._claim(key, slot)
+                    self._next_slot = (slot + 1) % self.disk_entries
+                    self._log_lines += 1
+        self._log = open(log_file, "a")
+        print(f"📚 Embedding cache loaded: {len(self._slots)} vectors on disk")
+
+    def _create_disk(self, dim: int):
+        os.makedirs(self.directory, exist_ok=True)
+        self.dim = dim
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="w+",
+                                  shape=(self.disk_entries, dim))
+        self._slots = {}
+        self._slot_keys = [None] * self.disk_entries
+        self._next_slot = 0
+        self._log = open(self._path("index.log"), "w")
+        self._log_lines = 0
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"model": self.model_name, "dim": dim, "capacity": self.disk_entries}, f)
+
+    def _claim(self, key: str, slot: int):
+        previous = self._slot_keys[slot]
+        if previous is not None and self._slots.get(previous) == slot:
+            del self._slots[previous]
+        self._slot_keys[slot] = key
+        self._slots[key] = slot
+
+    def _write_disk(self, key: str, vector: np.ndarray):
+        if key in self._slots or self.directory is None:
+            return
+        if self._vectors is None or vector.shape[-1] != self.dim:
+            self._create_disk(vector.shape[-1])
+        elif self._log is None:
+            # Closed on shutdown
+            return
+
+        slot = self._next_slot
+        self._vectors[slot] = vector
+        # The vector is in place before the log line that points at it
+        self._claim(key, slot)
+        self._log.write(f"{key} {slot}\n")
+        self._log.flush()
+        self._log_lines += 1
+        self._next_slot = (slot + 1) % self.disk_entries
+
+        if self._log_lines > 2 * self.disk_entries:
+            self._compact_log()
+
+    def _compact_log(self):
+        """Rewrite the log with only live entries, oldest slot first"""
+        self._log.close()
+        order = sorted(self._slots.items(), key=lambda item: (item[1] - self._next_slot) % self.disk_entries)
+        temp_file = self._path("index.log.tmp")
+        with open(temp_file, "w") as f:
+            for key, slot in order:
+                f.write(f"{key} {slot}\n")
+        os.replace(temp_file, self._path("index.log"))
+        self._log = open(self._path("index.log"), "a")
+        self._log_lines = len(order)
+
+    def close(self):
+        """Flush the memmap and index log"""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._owner is not None:
+                # Another process may take the directory from here on
+                self._owner.release()
+                self._owner = None
+                self.directory = None
+
+    def get_stats(self) -> Dict:
+        lookups = self.metrics["memory_hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+        hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+        return {
+            **self.metrics,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._slots),
+            "disk_capacity": self.disk_entries,
+            "directory": self.directory,
+            "model": self.model_name
+        }
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Embedding Service for Leo AI Assistant
+Collects concurrent encode requests over a short window and runs them through the model as one batch
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _deliver(future: Future, result=None, error: Optional[BaseException] = None):
+    """Resolve ``future`` unless its waiter has already given up on it"""
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # Cancelled between the check and the set
+        pass
+
+
+class EmbeddingService:
+    def __init__(self, model=None, batch_window_ms: Optional[float] = None, max_batch: Optional[int] = None,
+                 cache=None):
+        """Initialize the embedding service
+
+        ``model`` is anything with a sentence-transformers style
+        ``encode(texts)``; it can be set later once it has loaded. Requests
+        arriving within ``batch_window_ms`` of each other share one model
+        call of up to ``max_batch`` texts. Results are float32 numpy arrays,
+        one row per input text. With an EmbeddingCache as ``cache`` only
+        texts it has not seen reach the model.
+        """
+        self.model = model
+        self.cache = cache
+        self.batch_window = (batch_window_ms or float(os.getenv("LEO_EMBED_BATCH_MS", "5"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("LEO_EMBED_MAX_BATCH", "64"))
+
+        self._requests: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        # Counters are updated by caller threads and the batcher thread
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "texts": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "errors": 0,
+            "queue_latency_ms_total": 0.0,
+            "max_queue_latency_ms": 0.0,
+            "encode_ms_total": 0.0
+        }
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    def encode(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts, blocking until their batch has run (None when no model is loaded)"""
+        future = self.submit(texts)
+        return None if future is None else future.result()
+
+    async def encode_async(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts without blocking the event loop"""
+        future = self.submit(texts)
+        return None if future is None else await asyncio.wrap_future(future)
+
+    def submit(self, texts: List[str]) -> Optional[Future]:
+        """Queue texts for the next batch and return a future for their embeddings"""
+        if self.model is None:
+            return None
+        future: Future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+
+        with self._metrics_lock:
+            self.metrics["requests"] += 1
+        if self.cache is None:
+            self._enqueue(texts, future)
+            return future
+
+        cached = [self.cache.get(text) for text in texts]
+        missing = [index for index, vector in enumerate(cached) if vector is None]
+        if not missing:
+            future.set_result(np.stack(cached))
+            return future
+
+        def merge(encoded: Future):
+            try:
+                vectors = encoded.result()
+                for row, index in enumerate(missing):
+                    cached[index] = vectors[row]
+                    self.cache.put(texts[index], vectors[row])
+                _deliver(future, np.stack(cached))
+            except Exception as e:
+                _deliver(future, error=e)
+
+        encoded: Future = Future()
+        encoded.add_done_callback(merge)
+        # A waiter that gives up takes its uncached texts out of the batch
+        future.add_done_callback(lambda done: done.cancelled() and encoded.cancel())
+        self._enqueue([texts[index] for index in missing], encoded)
+        return future
+
+    def _enqueue(self, texts: List[str], future: Future):
+        self._ensure_worker()
+        self._requests.put((texts, future, time.monotonic()))
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="leo-embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """Gather requests until the window closes or the batch is full, then encode them together"""
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+
+            batch = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.batch_window
+            stopping = False
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            self._encode_batch(batch)
+            if stopping:
+                return
+
+    def _encode_batch(self, batch: List):
+        # Skip requests whose waiters were cancelled; the rest can no longer be
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for item in batch for text in item[0]]
+        started = time.monotonic()
+        try:
+            vectors = np.asarray(self.model.encode(texts, batch_size=self.max_batch), dtype=np.float32)
+        except Exception as e:
+            with self._metrics_lock:
+                self.metrics["errors"] += 1
+            print(f"Error encoding embedding batch: {e}")
+            for _, future, _ in batch:
+                _deliver(future, error=e)
+            return
+
+        encode_ms = (time.monotonic() - started) * 1000
+        latencies_ms = [(started - enqueued_at) * 1000 for _, _, enqueued_at in batch]
+        with self._metrics_lock:
+            self.metrics["batches"] += 1
+            self.metrics["texts"] += len(texts)
+            self.metrics["max_batch_size"] = max(self.metrics["max_batch_size"], len(texts))
+            self.metrics["encode_ms_total"] += encode_ms
+            self.metrics["queue_latency_ms_total"] += sum(latencies_ms)
+            self.metrics["max_queue_latency_ms"] = max(self.metrics["max_queue_latency_ms"], *latencies_ms)
+
+        offset = 0
+        for item_texts, future, _ in batch:
+            # Row slices are views into the batch result, not copies
+            try:
+                _deliver(future, vectors[offset:offset + len(item_texts)])
+            except Exception as e:
+                print(f"Error delivering embedding result: {e}")
+            offset += len(item_texts)
+
+    def close(self):
+        """Stop the batching thread after it finishes queued requests"""
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                self._requests.put(None)
+                self._worker.join(timeout=5)
+            self._worker = None
+        if self.cache is not None:
+            self.cache.close()
+
+    def get_stats(self) -> Dict:
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        batches = max(metrics["batches"], 1)
+        requests = max(metrics["requests"], 1)
+        return {
+            "available": self.available,
+            "requests": metrics["requests"],
+            "texts": metrics["texts"],
+            "batches": metrics["batches"],
+            "avg_batch_size": round(metrics["texts"] / batches, 2),
+            "max_batch_size": metrics["max_batch_size"],
+            "avg_queue_latency_ms": round(metrics["queue_latency_ms_total"] / requests, 2),
+            "max_queue_latency_ms": round(metrics["max_queue_latency_ms"], 2),
+            "avg_encode_ms": round(metrics["encode_ms_total"] / batches, 2),
+            "errors": metrics["errors"],
+            "queued": self._requests.qsize(),
+            "batch_window_ms": self.batch_window * 1000,
+            "max_batch": self.max_batch,
+            "cache": self.cache.get_stats() if self.cache is not None else None
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Google Data Cache for Leo AI Assistant
+TTL cache with stale-while-revalidate and coalesced refreshes for Calendar, Gmail and Tasks
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.executor import run_blocking
+from utils.state_backend import PersistedState
+
+
+class GoogleDataCache:
+    # Seconds a source stays fresh before a background refresh is triggered
+    DEFAULT_TTLS = {
+        "calendar": 60,
+        "gmail": 30,
+        "tasks": 120
+    }
+
+    def __init__(self, google_services, snapshot_file: Optional[str] = "google_cache.json",
+                 max_stale_seconds: Optional[float] = None, state_backend=None):
+        """Initialize the cache around an AsyncGoogleServices client
+        
+        Fresh entries are served directly. Stale entries younger than
+        ``max_stale_seconds`` are served immediately while one background
+        refresh runs; anything older (or missing) waits for the refresh.
+        Concurrent refreshes of the same source share a single fetch.
+        
+        The snapshot goes to ``snapshot_file``, or to a shared
+        ``state_backend`` where a worker adopts an entry another worker
+        refreshed instead of calling Google again.
+        """
+        self.google_services = google_services
+        self.store = PersistedState("google_cache", snapshot_file or None, state_backend)
+        self.max_stale_seconds = max_stale_seconds or float(os.getenv("LEO_GOOGLE_MAX_STALE", "3600"))
+        self.ttls = {
+            source: float(os.getenv(f"LEO_GOOGLE_TTL_{source.upper()}", str(ttl)))
+            for source, ttl in self.DEFAULT_TTLS.items()
+        }
+        
+        # source -> {"value": ..., "fetched_at": epoch seconds}
+        self._entries: Dict[str, Dict] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Sources invalidated here must really be refetched, not adopted from another worker
+        self._invalidated: set = set()
+        self._loading: Optional[asyncio.Future] = None
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "shared_hits": 0, "refresh_errors": 0}
+    
+    def _fetchers(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        return {
+            "calendar": self.google_services.get_calendar_events,
+            "gmail": self.google_services.get_gmail_data,
+            "tasks": self.google_services.get_tasks
+        }
+    
+    def _stored_entries(self) -> Dict[str, Dict]:
+        data = self.store.load({})
+        return {source: entry for source, entry in data.get('entries', {}).items() if source in self.DEFAULT_TTLS}
+    
+    def _load_snapshot(self):
+        """Load the last snapshot (blocking, on first use) so a restarted backend can serve data immediately"""
+        try:
+            self._entries = {**self._stored_entries(), **self._entries}
+            if self._entries:
+                print(f"📚 Loaded Google data snapshot ({len(self._entries)} sources)")
+        except Exception as e:
+            print(f"⚠️ Error loading Google data snapshot: {e}")
+    
+    def _shared_entry(self, source: str) -> Optional[Dict]:
+        try:
+            return self._stored_entries().get(source)
+        except Exception as e:
+            print(f"⚠️ Error reading shared Google data: {e}")
+            return None
+    
+    def _save_snapshot(self, entries: Dict[str, Dict]):
+        """Write the entries, keeping any newer ones another worker stored meanwhile"""
+        try:
+            merged = self._stored_entries() if self.store.shared else {}
+            for source, entry in entries.items():
+                if source not in merged or entry["fetched_at"] >= merged[source]["fetched_at"]:
+                    merged[source] = entry
+            self.store.save({'entries': merged, 'last_saved': datetime.now().isoformat()})
+        except Exception as e:
+            print(f"⚠️ Error saving Google data snapshot: {e}")
+    
+    async def get(self, source: str) -> Any:
+        """Get data for a source, refreshing according to its TTL"""
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(run_blocking(self._load_snapshot))
+        await self._loading
+        entry = self._entries.get(source)
+        age = time.time() - entry["fetched_at"] if entry else None
+        
+        if entry and age < self.ttls[source]:
+            self.metrics["hits"] += 1
+            return entry["value"]
+        
+        if entry and age < self.ttls[source] + self.max_stale_seconds:
+            self.metrics["stale_hits"] += 1
+            self._refresh(source)
+            return entry["value"]
+        
+        self.metrics["misses"] += 1
+        return await asyncio.shield(self._refresh(source))
+    
+    def _refresh(self, source: str) -> asyncio.Task:
+        """Start a refresh for a source, or join the one already running"""
+        task = self._inflight.get(source)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(source))
+            self._inflight[source] = task
+            task.add_done_callback(lambda _: self._inflight.pop(source, None))
+        return task
+    
+    def _connected(self, source: str) -> bool:
+        """Whether a source is backed by a live Google service (False before initialization)"""
+        return getattr(self.google_services, f"{source}_service", None) is not None
+    
+    async def _fetch(self, source: str) -> Any:
+        if not self._connected(source):
+            # Readers answer with mock data until Google is connected: never cache or persist it
+            entry = self._entries.get(source)
+            return entry["value"] if entry else await self._fetchers()[source]()
+        if self.store.shared and source not in self._invalidated:
+            # Another worker may have refreshed this source already
+            shared = await run_blocking(self._shared_entry, source)
+            if shared and time.time() - shared["fetched_at"] < self.ttls[source]:
+                self._entries[source] = shared
+                self.metrics["shared_hits"] += 1
+                return shared["value"]
+        self._invalidated.discard(source)
+        try:
+            value = await self._fetchers()[source]()
+        except Exception as e:
+            self.metrics["refresh_errors"] += 1
+            print(f"Error refreshing Google {source} data: {e}")
+            entry = self._entries.get(source)
+            if entry:
+                return entry["value"]
+            raise
+        
+        self._entries[source] = {"value": value, "fetched_at": time.time()}
+        self.metrics["refreshes"] += 1
+        if self.store.shared or self.store.path:
+            await run_blocking(self._save_snapshot, dict(self._entries))
+        return value
+    
+    def invalidate(self, source: Optional[str] = None):
+        """Mark one source (or all) as expired so the next read refreshes"""
+        for name in ([source] if source else list(self._entries)):
+            if name in self._entries:
+                self._entries[name] = {**self._entries[name], "fetched_at": 0}
+                self._invalidated.add(name)
+    
+    async def get_calendar_events(self):
+        return await self.get("calendar")
+    
+    async def get_gmail_data(self):
+        return await self.get("gmail")
+    
+    async def get_tasks(self):
+        return await self.get("tasks")
+    
+    async def get_all_data(self) -> Dict:
+        """Get all Google services data, fetching sources concurrently"""
+        events, gmail, tasks = await asyncio.gather(
+            self.get_calendar_events(), self.get_gmail_data(), self.get_tasks()
+        )
+        return {
+            'calendar': {
+                'status': 'healthy' if self.google_services.calendar_service else 'disconnected',
+                'events': events,
+                'total_count': len(events)
+            },
+            'gmail': gmail,
+            'tasks': {
+                'status': 'healthy' if self.google_services.tasks_service else 'disconnected',
+                'tasks': tasks,
+                'total_count': len(tasks)
+            },
+            'last_updated': datetime.now().isoformat()
+        }
+    
+    def get_stats(self) -> Dict:
+        """Get cache counters and per-source ages"""
+        now = time.time()
+        return {
+            **self.metrics,
+            "ttls": self.ttls,
+            "ages_seconds": {source: round(now - entry["fetched_at"], 1) for source, entry in self._entries.items()},
+            "refreshing": sorted(self._inflight)
+        }
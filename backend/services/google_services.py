@@ -7,18 +7,25 @@ Handles Google Calendar, Gmail, and Tasks APIs
 import os
 import json
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from typing import List, Dict, Optional, TYPE_CHECKING
+from backend.services.gmail_sync import GmailSync
+from backend.services.calendar_sync import CalendarSync, EventIndex, find_free_slot
 from dotenv import load_dotenv
 
+# The auth/discovery/errors stack is imported where it is used (on the startup
+# thread) rather than when backend_main is imported
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+
 load_dotenv()
 
+# Google recommends at most 50 calls per batch request
+MAX_BATCH_SIZE = 50
+
 class GoogleServices:
-    def __init__(self):
+    def __init__(self, auto_initialize: bool = True, request_timeout: Optional[float] = None,
+                 max_tasks: Optional[int] = None, state_backend=None):
         self.credentials_file = "credentials.json"
         self.token_file = "token.json"
         self.scopes = [
@@ -27,21 +34,41 @@ class GoogleServices:
             'https://www.googleapis.com/auth/tasks.readonly'
         ]
         
+        self.request_timeout = request_timeout or float(os.getenv("LEO_GOOGLE_TIMEOUT", "10"))
+        self.max_tasks = max_tasks or int(os.getenv("LEO_GOOGLE_TASKS_LIMIT", "500"))
+        
+        self.credentials = None
         self.calendar_service = None
         self.gmail_service = None
         self.tasks_service = None
+        self.initialized = False
+        # Sync state goes to the shared state backend when several workers run
+        self.gmail_sync = GmailSync(self, state_backend=state_backend)
+        self.calendar_sync = CalendarSync(self, state_backend=state_backend)
         
-        # Initialize services
-        self._initialize_services()
+        # Initialize services (deferred when an async caller initializes off-loop)
+        if auto_initialize:
+            self._initialize_services()
+    
+    def _authorized_http(self, creds: "Credentials") -> "AuthorizedHttp":
+        """Build an HTTP transport with a socket timeout for API calls"""
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        
+        return AuthorizedHttp(creds, http=httplib2.Http(timeout=self.request_timeout))
     
     def _initialize_services(self):
         """Initialize Google API services"""
+        self.initialized = True
         try:
+            from googleapiclient.discovery import build
+            
             creds = self._get_credentials()
             if creds:
-                self.calendar_service = build('calendar', 'v3', credentials=creds)
-                self.gmail_service = build('gmail', 'v1', credentials=creds)
-                self.tasks_service = build('tasks', 'v1', credentials=creds)
+                self.credentials = creds
+                self.calendar_service = build('calendar', 'v3', http=self._authorized_http(creds))
+                self.gmail_service = build('gmail', 'v1', http=self._authorized_http(creds))
+                self.tasks_service = build('tasks', 'v1', http=self._authorized_http(creds))
                 print("✅ Google services initialized successfully")
             else:
                 print("⚠️ Google credentials not available - using mock data")
@@ -49,8 +76,12 @@ class GoogleServices:
             print(f"⚠️ Failed to initialize Google services: {e}")
             print("📝 Using mock data for demonstration")
     
-    def _get_credentials(self) -> Optional[Credentials]:
+    def _get_credentials(self) -> Optional["Credentials"]:
         """Get Google API credentials"""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import Flow
+        
         creds = None
         
         # Load existing token
@@ -94,6 +125,54 @@ class GoogleServices:
         
         return creds
     
+    def refresh_credentials(self) -> bool:
+        """Refresh the OAuth token and save it (blocking)"""
+        creds = self.credentials
+        if not creds or not creds.refresh_token:
+            return False
+        
+        try:
+            from google.auth.transport.requests import Request
+            
+            creds.refresh(Request())
+            # Every worker renews its own token; replace the file atomically
+            tmp_file = f"{self.token_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w') as token:
+                token.write(creds.to_json())
+            os.replace(tmp_file, self.token_file)
+            return True
+        except Exception as e:
+            print(f"Error refreshing credentials: {e}")
+            return False
+    
+    def _execute_batch(self, service, requests: Dict[str, object]) -> Dict[str, Dict]:
+        """Execute API requests as Google batch HTTP calls, keyed by request ID
+        
+        Sub-requests that fail inside a batch are retried one at a time; an
+        error on the retry is raised so callers never see a partial result.
+        """
+        responses = {}
+        failed = []
+        
+        def callback(request_id, response, exception):
+            if exception is not None:
+                print(f"Batch request {request_id} failed, retrying: {exception}")
+                failed.append(request_id)
+            else:
+                responses[request_id] = response
+        
+        items = list(requests.items())
+        for start in range(0, len(items), MAX_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id, request in items[start:start + MAX_BATCH_SIZE]:
+                batch.add(request, request_id=request_id)
+            batch.execute()
+        
+        for request_id in failed:
+            responses[request_id] = requests[request_id].execute(num_retries=2)
+        
+        return responses
+    
     def health_check(self) -> Dict:
         """Check if Google services are healthy"""
         services_status = {
@@ -116,125 +195,139 @@ class GoogleServices:
         if not self.calendar_service:
             return self._get_mock_calendar_events()
         
+        from googleapiclient.errors import HttpError
+        
         try:
-            # Get events from primary calendar
-            now = datetime.utcnow().isoformat() + 'Z'  # 'Z' indicates UTC time
-            events_result = self.calendar_service.events().list(
-                calendarId='primary',
-                timeMin=now,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            formatted_events = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                formatted_events.append({
-                    'id': event.get('id'),
-                    'title': event.get('summary', 'No Title'),
-                    'start': start,
-                    'description': event.get('description', ''),
-                    'location': event.get('location', ''),
-                    'attendees': len(event.get('attendees', []))
-                })
-            
-            return formatted_events
+            # Incremental syncToken fetch, then answer from the local index
+            self.calendar_sync.sync()
+            return [self._public_event(event) for event in self.calendar_sync.upcoming(max_results)]
             
         except HttpError as error:
             print(f"Calendar API error: {error}")
-            return self._get_mock_calendar_events()
+            raise
         except Exception as e:
             print(f"Error getting calendar events: {e}")
-            return self._get_mock_calendar_events()
+            raise
+    
+    @staticmethod
+    def _public_event(event: Dict) -> Dict:
+        """Strip index-only fields from an event"""
+        return {key: value for key, value in event.items() if key not in ('start_ts', 'end_ts')}
+    
+    def _calendar_index(self) -> EventIndex:
+        """Interval index for local range queries (mock events when Calendar is not connected)"""
+        if self.calendar_service:
+            return self.calendar_sync.index
+        
+        events = []
+        for event in self._get_mock_calendar_events():
+            start = datetime.fromisoformat(event['start'])
+            events.append({**event, 'start_ts': start.timestamp(), 'end_ts': (start + timedelta(hours=1)).timestamp()})
+        return EventIndex(events)
+    
+    def get_calendar_range(self, start: datetime, end: datetime) -> List[Dict]:
+        """Events overlapping [start, end), answered from the local index"""
+        return [self._public_event(event) for event in self._calendar_index().overlapping(start.timestamp(), end.timestamp())]
+    
+    def get_next_free_slot(self, duration_minutes: int = 30, horizon_days: int = 7,
+                           after: Optional[datetime] = None) -> Optional[Dict]:
+        """Next free slot of the given length, answered from the local index"""
+        return find_free_slot(
+            self._calendar_index(), timedelta(minutes=duration_minutes),
+            after or datetime.now(), timedelta(days=horizon_days)
+        )
     
     def get_gmail_data(self) -> Dict:
         """Get Gmail data summary"""
         if not self.gmail_service:
             return self._get_mock_gmail_data()
         
+        from googleapiclient.errors import HttpError
+        
         try:
-            # Get unread messages count
-            unread_query = 'is:unread'
-            unread_result = self.gmail_service.users().messages().list(
-                userId='me', q=unread_query
-            ).execute()
-            
-            unread_count = len(unread_result.get('messages', []))
-            
-            # Get today's messages count  
-            today = datetime.now().strftime('%Y/%m/%d')
-            today_query = f'after:{today}'
-            today_result = self.gmail_service.users().messages().list(
-                userId='me', q=today_query
-            ).execute()
-            
-            today_count = len(today_result.get('messages', []))
-            
-            return {
-                'status': 'healthy',
-                'unread_count': unread_count,
-                'today_count': today_count,
-                'last_updated': datetime.now().isoformat()
-            }
+            # Incremental historyId sync: one batched call per poll after the baseline
+            return self.gmail_sync.sync()
             
         except HttpError as error:
             print(f"Gmail API error: {error}")
-            return self._get_mock_gmail_data()
+            raise
         except Exception as e:
             print(f"Error getting Gmail data: {e}")
-            return self._get_mock_gmail_data()
+            raise
     
     def get_tasks(self) -> List[Dict]:
         """Get Google Tasks"""
         if not self.tasks_service:
             return self._get_mock_tasks()
         
+        from googleapiclient.errors import HttpError
+        
         try:
-            # Get task lists
-            tasklists = self.tasks_service.tasklists().list().execute()
+            # Get task lists (paginated)
+            tasklists = []
+            page_token = None
+            while True:
+                page = self.tasks_service.tasklists().list(
+                    maxResults=100, pageToken=page_token
+                ).execute()
+                tasklists.extend(page.get('items', []))
+                page_token = page.get('nextPageToken')
+                if not page_token:
+                    break
             
+            list_names = {tasklist['id']: tasklist.get('title') for tasklist in tasklists}
+            
+            # Fetch every list in batch round trips, following each list's pages
             all_tasks = []
-            for tasklist in tasklists.get('items', []):
-                # Get tasks from each list
-                tasks = self.tasks_service.tasks().list(
-                    tasklist=tasklist['id']
-                ).execute()
+            pending = {tasklist_id: None for tasklist_id in list_names}
+            while pending and len(all_tasks) < self.max_tasks:
+                results = self._execute_batch(self.tasks_service, {
+                    tasklist_id: self.tasks_service.tasks().list(
+                        tasklist=tasklist_id, maxResults=100, pageToken=token
+                    )
+                    for tasklist_id, token in pending.items()
+                })
                 
-                for task in tasks.get('items', []):
-                    all_tasks.append({
-                        'id': task.get('id'),
-                        'title': task.get('title'),
-                        'status': task.get('status'),
-                        'due': task.get('due'),
-                        'notes': task.get('notes', ''),
-                        'list_name': tasklist.get('title')
-                    })
+                next_pending = {}
+                for tasklist_id, tasks in results.items():
+                    for task in tasks.get('items', []):
+                        all_tasks.append({
+                            'id': task.get('id'),
+                            'title': task.get('title'),
+                            'status': task.get('status'),
+                            'due': task.get('due'),
+                            'notes': task.get('notes', ''),
+                            'list_name': list_names.get(tasklist_id)
+                        })
+                    if tasks.get('nextPageToken'):
+                        next_pending[tasklist_id] = tasks['nextPageToken']
+                pending = next_pending
             
+            all_tasks = all_tasks[:self.max_tasks]
             return all_tasks
             
         except HttpError as error:
             print(f"Tasks API error: {error}")
-            return self._get_mock_tasks()
+            raise
         except Exception as e:
             print(f"Error getting tasks: {e}")
-            return self._get_mock_tasks()
+            raise
     
     def get_all_data(self) -> Dict:
         """Get all Google services data"""
+        events = self.get_calendar_events()
+        tasks = self.get_tasks()
         return {
             'calendar': {
                 'status': 'healthy' if self.calendar_service else 'disconnected',
-                'events': self.get_calendar_events(),
-                'total_count': len(self.get_calendar_events())
+                'events': events,
+                'total_count': len(events)
             },
             'gmail': self.get_gmail_data(),
             'tasks': {
                 'status': 'healthy' if self.tasks_service else 'disconnected',
-                'tasks': self.get_tasks(),
-                'total_count': len(self.get_tasks())
+                'tasks': tasks,
+                'total_count': len(tasks)
             },
             'last_updated': datetime.now().isoformat()
         }
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Write-behind Ingestion Queue for Leo AI Assistant
+Batches long-term memory writes so ChromaDB stays off the chat path
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.executor import run_blocking
+
+
+class IngestionQueue:
+    def __init__(self, chroma_service, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_pending: Optional[int] = None,
+                 max_retries: Optional[int] = None, retry_delay: Optional[float] = None):
+        """Initialize the ingestion queue
+        
+        Messages whose write fails are queued again after ``retry_delay``
+        seconds (doubling per attempt) up to ``max_retries`` times, then
+        dropped and counted.
+        """
+        self.chroma_service = chroma_service
+        self.batch_size = batch_size or int(os.getenv("LEO_INGEST_BATCH_SIZE", "32"))
+        self.flush_interval = flush_interval or float(os.getenv("LEO_INGEST_FLUSH_SECONDS", "0.5"))
+        self.max_pending = max_pending or int(os.getenv("LEO_INGEST_MAX_PENDING", "10000"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LEO_INGEST_MAX_RETRIES", "3"))
+        self.retry_delay = retry_delay or float(os.getenv("LEO_INGEST_RETRY_SECONDS", "1"))
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Failed messages waiting out their backoff before going back in the queue
+        self._retries = set()
+        # One flush at a time, so discard_user() can wait out a write in progress
+        self._flush_lock = asyncio.Lock()
+        # user_id -> monotonic time before which their queued messages are dropped
+        self._discarded: Dict[str, float] = {}
+        # message id -> enqueued_at of messages not yet written or dropped, oldest first
+        self._unsettled: Dict[str, float] = {}
+        
+        self.metrics = {
+            "enqueued": 0,
+            "flushed": 0,
+            "failed": 0,
+            "retried": 0,
+            "dropped": 0,
+            "discarded": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_at": None
+        }
+    
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+    
+    def start(self):
+        """Start the background flush worker (must be called from the event loop)"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker = asyncio.create_task(self._run())
+        print("✅ Chroma ingestion queue started")
+    
+    async def stop(self):
+        """Flush everything still queued (including pending retries) and stop the worker"""
+        if not self.running:
+            return
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                break
+            await asyncio.gather(*self._retries, return_exceptions=True)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        print(f"🛑 Chroma ingestion queue stopped ({self.metrics['flushed']} messages flushed)")
+    
+    async def enqueue(self, user_id: str, role: str, content: str, metadata: Optional[Dict] = None) -> str:
+        """Queue a message for long-term memory and return its ID immediately
+        
+        Waits only when ``max_pending`` messages are already queued.
+        """
+        message = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "metadata": metadata,
+            "timestamp": datetime.now().isoformat(),
+            "enqueued_at": time.monotonic()
+        }
+        self.metrics["enqueued"] += 1
+        self._unsettled[message["id"]] = message["enqueued_at"]
+        
+        if not self.running:
+            # No worker (e.g. outside the server lifecycle): write through
+            try:
+                await self._flush([message])
+            finally:
+                self._settle([message])
+        else:
+            try:
+                await self._queue.put(message)
+            except BaseException:
+                # Never queued (e.g. cancelled while waiting for room)
+                self._settle([message])
+                raise
+        return message["id"]
+    
+    async def discard_user(self, user_id: str):
+        """Drop a user's queued messages and wait for a flush already writing them
+        
+        Called before the user's long-term memory is deleted: messages are
+        stamped when queued, so one flushed after the deletion's cutoff was
+        taken would carry an older timestamp and outlive the deletion.
+        """
+        self._discarded[user_id] = time.monotonic()
+        async with self._flush_lock:
+            pass
+        self._settle([])
+    
+    def _settle(self, batch: List[Dict]):
+        """Forget written or dropped messages and the discards no unsettled message predates"""
+        for message in batch:
+            self._unsettled.pop(message["id"], None)
+        oldest = next(iter(self._unsettled.values()), float("inf"))
+        for user_id, cutoff in list(self._discarded.items()):
+            if cutoff < oldest:
+                del self._discarded[user_id]
+    
+    async def _run(self):
+        """Collect messages until the batch is full or the interval elapses, then flush"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            retrying = []
+            try:
+                # Messages queued during startup wait for the model/collection warm-up
+                await self.chroma_service.wait_ready()
+                retrying = self._retry(await self._flush(batch))
+            except Exception as e:
+                self.metrics["failed"] += len(batch)
+                print(f"Error flushing ingestion batch: {e}")
+                retrying = self._retry(batch)
+            finally:
+                # Retried messages stay unsettled, so discards still apply to them
+                retried_ids = {message["id"] for message in retrying}
+                self._settle([message for message in batch if message["id"] not in retried_ids])
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _retry(self, failed: List[Dict]) -> List[Dict]:
+        """Schedule failed messages to be queued again; returns the ones that will be"""
+        retrying = []
+        for message in failed:
+            attempts = message.get("attempts", 0) + 1
+            if attempts > self.max_retries:
+                self.metrics["dropped"] += 1
+                print(f"Dropping long-term memory write for {message['user_id']} after {attempts} attempts")
+                continue
+            message["attempts"] = attempts
+            retrying.append(message)
+        if retrying:
+            self.metrics["retried"] += len(retrying)
+            delay = self.retry_delay * 2 ** (retrying[0]["attempts"] - 1)
+            task = asyncio.ensure_future(self._requeue(retrying, delay))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+        return retrying
+    
+    async def _requeue(self, messages: List[Dict], delay: float):
+        try:
+            await asyncio.sleep(delay)
+            for message in messages:
+                await self._queue.put(message)
+        except BaseException:
+            # Never queued again (e.g. cancelled on shutdown)
+            self._settle(messages)
+            raise
+    
+    async def _flush(self, batch: List[Dict]) -> List[Dict]:
+        """Write a batch with a single encode and a single collection add; returns the messages that failed"""
+        async with self._flush_lock:
+            kept = [
+                message for message in batch
+                if message["enqueued_at"] > self._discarded.get(message["user_id"], float("-inf"))
+            ]
+            self.metrics["discarded"] += len(batch) - len(kept)
+            if not kept:
+                return []
+            return await self._write(kept)
+    
+    async def _write(self, batch: List[Dict]) -> List[Dict]:
+        started = time.monotonic()
+        ids = await run_blocking(self.chroma_service.add_messages, batch)
+        
+        failed = sum(1 for message_id in ids if message_id in ("error", "chroma_not_available"))
+        self.metrics["failed"] += failed
+        self.metrics["flushed"] += len(batch) - failed
+        self.metrics["batches"] += 1
+        self.metrics["max_batch_size"] = max(self.metrics["max_batch_size"], len(batch))
+        self.metrics["last_flush_ms"] = round((time.monotonic() - started) * 1000, 2)
+        self.metrics["last_flush_at"] = datetime.now().isoformat()
+        # Chroma unavailable for good (warm-up failed) is not worth retrying
+        self.metrics["dropped"] += sum(1 for message_id in ids if message_id == "chroma_not_available")
+        return [message for message, message_id in zip(batch, ids) if message_id == "error"]
+    
+    def get_stats(self) -> Dict:
+        """Get queue depth and flush metrics"""
+        batches = self.metrics["batches"]
+        return {
+            **self.metrics,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "avg_batch_size": round((self.metrics["flushed"] + self.metrics["failed"]) / batches, 2) if batches else 0
+        }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Memory Index for Leo AI Assistant
+SQLite side tables kept next to ChromaDB so per-user statistics and recency queries never need a collection scan
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Schema version (PRAGMA user_version). Older counts and timelines are
+# dropped on open, so every user is rebuilt once in the background
+INDEX_VERSION = 4
+
+# (document id, document type, epoch seconds)
+Entry = Tuple[str, str, float]
+
+
+class MemoryIndex:
+    def __init__(self, path: str = ":memory:"):
+        """Open (or create) the side tables
+
+        ``memory_counts`` holds document counts per (user, type) and
+        ``memory_timeline`` every document ID ordered by (user, time) and
+        ``deletion_jobs`` the progress of background deletions. A
+        user's rows are only trusted once ``indexed_users`` lists them, i.e.
+        after they were rebuilt from Chroma.
+
+        Several worker processes may open the same file: every write is one
+        ``BEGIN IMMEDIATE`` transaction, and rows are idempotent by ID.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION:
+            self._conn.executescript("""
+                DROP TABLE IF EXISTS memory_counts;
+                DROP TABLE IF EXISTS memory_timeline;
+                DROP TABLE IF EXISTS indexed_users;
+            """)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS memory_counts (
+                user_id TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, doc_type)
+            );
+            CREATE TABLE IF NOT EXISTS memory_timeline (
+                user_id TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                doc_type TEXT NOT NULL,
+                recorded REAL NOT NULL,
+                PRIMARY KEY (user_id, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS memory_timeline_by_time ON memory_timeline (user_id, ts, doc_id);
+            CREATE TABLE IF NOT EXISTS indexed_users (
+                user_id TEXT PRIMARY KEY,
+                rebuilt_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS deletion_jobs (
+                user_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                cutoff REAL NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                started_at TEXT,
+                updated_at TEXT
+            );
+            PRAGMA user_version = {INDEX_VERSION};
+        """)
+
+    def is_indexed(self, user_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM indexed_users WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def record_added(self, user_id: str, entries: List[Entry]):
+        """Count new documents and add them to the timeline (IDs already recorded only move in time)
+
+        Recorded whether or not the user is indexed yet, so a rebuild running
+        in any process keeps documents written while it scanned.
+        """
+        with self._transaction():
+            self._insert(user_id, entries)
+
+    def replace_user(self, user_id: str, entries: Iterable[Entry], scanned_at: float):
+        """Swap in a user's rows rebuilt from a Chroma scan started at ``scanned_at`` and mark them trusted
+
+        Rows recorded before the scan started are replaced by the scan;
+        rows recorded since (by any process) are kept. While a deletion is
+        running, scanned documents older than its cutoff that the job
+        already removed from the timeline are not brought back. Counts are
+        recomputed from the resulting timeline.
+        """
+        entries = list(entries)
+        with self._transaction():
+            job = self._conn.execute(
+                "SELECT cutoff FROM deletion_jobs WHERE user_id = ? AND status = 'running'", (user_id,)
+            ).fetchone()
+            if job is not None:
+                pending = {row[0] for row in self._conn.execute(
+                    "SELECT doc_id FROM memory_timeline WHERE user_id = ? AND ts < ?", (user_id, job[0])
+                )}
+                entries = [entry for entry in entries if entry[2] >= job[0] or entry[0] in pending]
+            self._conn.execute("DELETE FROM memory_timeline WHERE user_id = ? AND recorded < ?", (user_id, scanned_at))
+            self._insert(user_id, entries)
+            self._conn.execute("DELETE FROM memory_counts WHERE user_id = ?", (user_id,))
+            self._conn.execute(
+                "INSERT INTO memory_counts (user_id, doc_type, count) "
+                "SELECT user_id, doc_type, COUNT(*) FROM memory_timeline WHERE user_id = ? GROUP BY doc_type",
+                (user_id,)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexed_users (user_id, rebuilt_at) VALUES (?, datetime('now'))", (user_id,)
+            )
+
+    def remove(self, user_id: str, entries: List[Entry]) -> int:
+        """Drop deleted documents from the timeline and uncount the ones that were there
+
+        Returns how many were actually removed, so removing the same IDs
+        twice never uncounts them twice.
+        """
+        counts: Dict[str, int] = {}
+        with self._transaction():
+            for doc_id, _, _ in entries:
+                row = self._conn.execute(
+                    "SELECT doc_type FROM memory_timeline WHERE user_id = ? AND doc_id = ?", (user_id, doc_id)
+                ).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM memory_timeline WHERE user_id = ? AND doc_id = ?", (user_id, doc_id))
+                counts[row[0]] = counts.get(row[0], 0) + 1
+            for doc_type, count in counts.items():
+                self._conn.execute(
+                    "UPDATE memory_counts SET count = MAX(count - ?, 0) WHERE user_id = ? AND doc_type = ?",
+                    (count, user_id, doc_type)
+                )
+        return sum(counts.values())
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction; IMMEDIATE takes the file's write lock up front so
+        concurrent processes queue (up to the connection timeout) instead of deadlocking"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _insert(self, user_id: str, entries: List[Entry]):
+        counts: Dict[str, int] = {}
+        recorded = time.time()
+        for doc_id, doc_type, ts in entries:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO memory_timeline (user_id, doc_id, ts, doc_type, recorded) VALUES (?, ?, ?, ?, ?)",
+                (user_id, doc_id, ts, doc_type, recorded)
+            ).rowcount
+            if inserted:
+                counts[doc_type] = counts.get(doc_type, 0) + 1
+            else:
+                # Re-recorded (e.g. an upsert): keep one row and one count
+                self._conn.execute(
+                    "UPDATE memory_timeline SET ts = ? WHERE user_id = ? AND doc_id = ?", (ts, user_id, doc_id)
+                )
+        for doc_type, count in counts.items():
+            self._conn.execute(
+                "INSERT INTO memory_counts (user_id, doc_type, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id, doc_type) DO UPDATE SET count = count + excluded.count",
+                (user_id, doc_type, count)
+            )
+
+    def get_counts(self, user_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_type, count FROM memory_counts WHERE user_id = ? AND count > 0", (user_id,)
+            ).fetchall()
+        return {doc_type: count for doc_type, count in rows}
+
+    def recent(self, user_id: str, limit: int, before: Optional[Tuple[float, str]] = None,
+               since: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Newest (doc_id, ts) pairs for a user, optionally only those at or after ``since``
+
+        ``before`` is the (ts, doc_id) of the last row of the previous page,
+        so documents sharing a timestamp are neither skipped nor repeated.
+        """
+        query = "SELECT doc_id, ts FROM memory_timeline WHERE user_id = ?"
+        params: list = [user_id]
+        if before is not None:
+            query += " AND (ts, doc_id) < (?, ?)"
+            params += [before[0], before[1]]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY ts DESC, doc_id DESC LIMIT ?", params + [limit]).fetchall()
+        return rows
+
+    def oldest(self, user_id: str, limit: int, until: float) -> List[Entry]:
+        """Oldest (doc_id, doc_type, ts) entries of a user written before ``until``"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT doc_id, doc_type, ts FROM memory_timeline WHERE user_id = ? AND ts < ? "
+                "ORDER BY ts, doc_id LIMIT ?",
+                (user_id, until, limit)
+            ).fetchall()
+
+    def count_before(self, user_id: str, until: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM memory_timeline WHERE user_id = ? AND ts < ?", (user_id, until)
+            ).fetchone()[0]
+
+    # Deletion jobs
+    def start_deletion(self, user_id: str, cutoff: float, total: int) -> Dict:
+        """Record a running deletion of everything a user wrote before ``cutoff`` (replacing a finished one)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO deletion_jobs (user_id, status, cutoff, total, deleted, started_at, updated_at) "
+                "VALUES (?, 'running', ?, ?, 0, datetime('now'), datetime('now'))",
+                (user_id, cutoff, total)
+            )
+        return self.get_deletion(user_id)
+
+    def update_deletion(self, user_id: str, deleted: int = 0, status: Optional[str] = None,
+                        error: Optional[str] = None, total: Optional[int] = None):
+        """Add ``deleted`` to a job's progress, optionally setting its status, error or total"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE deletion_jobs SET deleted = deleted + ?, status = COALESCE(?, status), "
+                "error = COALESCE(?, error), total = COALESCE(?, total), updated_at = datetime('now') "
+                "WHERE user_id = ?",
+                (deleted, status, error, total, user_id)
+            )
+
+    def get_deletion(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM deletion_jobs WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def running_deletions(self) -> List[Dict]:
+        """Jobs still marked running, e.g. after a crash"""
+        with self._lock:
+            user_ids = [row[0] for row in self._conn.execute(
+                "SELECT user_id FROM deletion_jobs WHERE status = 'running'"
+            ).fetchall()]
+        return [self.get_deletion(user_id) for user_id in user_ids]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Semantic Response Cache for Leo AI Assistant
+Reuses answers to near-identical prompts asked in the same conversational context
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# State backend channel that fans invalidations out to every worker
+INVALIDATE_CHANNEL = "response_cache"
+
+class ResponseCache:
+    def __init__(self, chroma_service, enabled: Optional[bool] = None,
+                 threshold: Optional[float] = None, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, scope: Optional[str] = None,
+                 context_turns: int = 2, state_backend=None):
+        """Initialize the response cache
+        
+        Prompts are embedded with the ChromaService model and compared by
+        cosine similarity against earlier prompts that share the same
+        context fingerprint (hash of the last ``context_turns`` messages and
+        the completion's ``max_tokens``). With the "global" scope only
+        answers generated without the user's memories or summary are shared
+        across users; personalized ones always stay user-scoped. Entries
+        live per worker; with a shared ``state_backend`` (after
+        attach_bus()) invalidations reach every worker.
+        """
+        self.chroma_service = chroma_service
+        self.enabled = enabled if enabled is not None else os.getenv("LEO_RESPONSE_CACHE", "false").lower() in ("1", "true", "yes")
+        self.threshold = threshold or float(os.getenv("LEO_RESPONSE_CACHE_THRESHOLD", "0.92"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("LEO_RESPONSE_CACHE_TTL", "3600"))
+        self.max_entries = max_entries or int(os.getenv("LEO_RESPONSE_CACHE_SIZE", "2000"))
+        self.scope = (scope or os.getenv("LEO_RESPONSE_CACHE_SCOPE", "user")).lower()  # "user" or "global"
+        self.context_turns = context_turns
+        self.state_backend = state_backend if state_backend is not None and state_backend.shared else None
+        self._bus_attached = False
+        
+        # (scope key, context fingerprint) -> {entry id: entry}, entries kept in LRU order
+        self._buckets: Dict[Tuple[str, str], Dict[int, Dict]] = {}
+        self._lru: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+        self._next_id = 0
+        
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+    
+    def _fingerprint(self, history, max_tokens: int) -> str:
+        """Hash of the recent conversation and the completion length"""
+        digest = hashlib.sha1(f"max_tokens={max_tokens}\0".encode())
+        for msg in islice(history, max(len(history) - self.context_turns, 0), None):
+            digest.update(msg["role"].encode())
+            digest.update(b"\0")
+            digest.update(self._normalize(msg["content"]).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def _lookup_keys(self, probe: Dict) -> List[Tuple[str, str]]:
+        keys = [probe["user_key"]]
+        if self.scope == "global":
+            keys.append(probe["global_key"])
+        return keys
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+    
+    async def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Embed a prompt as a unit vector (None when no model is loaded)"""
+        vectors = await self.chroma_service.embeddings.encode_async([prompt])
+        if vectors is None:
+            return None
+        vector = vectors[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    async def lookup(self, user_id: str, history, prompt: str,
+                     max_tokens: int) -> Tuple[Optional[str], Optional[Dict]]:
+        """Find a cached response for the prompt
+        
+        Returns ``(response, probe)``; pass the probe to :meth:`store` on a
+        miss so the prompt is not embedded twice.
+        """
+        if not self.enabled:
+            return None, None
+        
+        fingerprint = self._fingerprint(history, max_tokens)
+        probe = {
+            "user_key": (user_id, fingerprint),
+            "global_key": ("*", fingerprint),
+            "prompt": self._normalize(prompt),
+            "embedding": await self._embed(prompt)
+        }
+        
+        best, best_key, best_score = None, None, self.threshold
+        now = time.monotonic()
+        candidates = [(key, entry_id, entry) for key in self._lookup_keys(probe)
+                      for entry_id, entry in list(self._buckets.get(key, {}).items())]
+        for key, entry_id, entry in candidates:
+            if now - entry["created"] > self.ttl_seconds:
+                self._remove(entry_id)
+                self.metrics["expirations"] += 1
+                continue
+            
+            if probe["embedding"] is None or entry["embedding"] is None:
+                score = 1.0 if entry["prompt"] == probe["prompt"] else 0.0
+            else:
+                score = float(np.dot(probe["embedding"], entry["embedding"]))
+            
+            if score >= best_score:
+                best, best_key, best_score = entry_id, key, score
+        
+        if best is None:
+            self.metrics["misses"] += 1
+            return None, probe
+        
+        self.metrics["hits"] += 1
+        self._lru.move_to_end(best)
+        return self._buckets[best_key][best]["response"], probe
+    
+    def store(self, probe: Optional[Dict], response: str, personalized: bool = True):
+        """Cache a response for a probe returned by :meth:`lookup`
+        
+        ``personalized`` says whether the user's memories or summary went
+        into the prompt; such answers are never shared with other users.
+        """
+        if not self.enabled or probe is None:
+            return
+        
+        key = probe["global_key"] if self.scope == "global" and not personalized else probe["user_key"]
+        entry_id = self._next_id
+        self._next_id += 1
+        self._buckets.setdefault(key, {})[entry_id] = {
+            "prompt": probe["prompt"],
+            "embedding": probe["embedding"],
+            "response": response,
+            "created": time.monotonic()
+        }
+        self._lru[entry_id] = key
+        self.metrics["stores"] += 1
+        
+        while len(self._lru) > self.max_entries:
+            oldest = next(iter(self._lru))
+            self._remove(oldest)
+            self.metrics["evictions"] += 1
+    
+    def _remove(self, entry_id: int):
+        key = self._lru.pop(entry_id, None)
+        if key is None:
+            return
+        bucket = self._buckets.get(key, {})
+        bucket.pop(entry_id, None)
+        if not bucket:
+            self._buckets.pop(key, None)
+    
+    async def attach_bus(self):
+        """Start receiving invalidations issued by other workers"""
+        if self.state_backend is None or self._bus_attached:
+            return
+        await self.state_backend.subscribe(INVALIDATE_CHANNEL, self._on_invalidate_message)
+        self._bus_attached = True
+    
+    async def _on_invalidate_message(self, message: Dict):
+        self._invalidate_local(message["user_id"])
+    
+    async def invalidate_user(self, user_id: str):
+        """Drop all user-scoped entries for a user on every worker"""
+        self._invalidate_local(user_id)
+        if self._bus_attached:
+            await self.state_backend.publish(INVALIDATE_CHANNEL, {"user_id": user_id})
+    
+    def _invalidate_local(self, user_id: str):
+        for key in [key for key in self._buckets if key[0] == user_id]:
+            for entry_id in list(self._buckets[key]):
+                self._remove(entry_id)
+    
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters and cache size"""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "enabled": self.enabled,
+            "scope": self.scope,
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else 0.0
+        }
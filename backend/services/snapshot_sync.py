@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Snapshot Sync for Leo AI Assistant
+Versioned api_data_updated snapshots pushed to each client as a JSON Patch against its last acknowledged version
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Fields that change on every fetch without the data itself changing
+VOLATILE_KEYS = {"last_updated"}
+
+# State backend channel that carries new snapshots to every worker
+SNAPSHOT_CHANNEL = "snapshots"
+
+
+def strip_volatile(value: Any) -> Any:
+    """Drop timestamp-only fields so unchanged data compares equal"""
+    if isinstance(value, dict):
+        return {key: strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(item) for item in value]
+    return value
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def json_diff(old: Any, new: Any, path: str = "") -> List[Dict]:
+    """RFC 6902 JSON Patch turning ``old`` into ``new``
+    
+    Objects are diffed key by key; lists and scalars are replaced whole
+    when they differ.
+    """
+    if old == new:
+        return []
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return [{"op": "replace", "path": path, "value": new}]
+    
+    patch = []
+    for key in old:
+        if key not in new:
+            patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+    for key, value in new.items():
+        child = f"{path}/{_escape(key)}"
+        if key not in old:
+            patch.append({"op": "add", "path": child, "value": value})
+        else:
+            patch.extend(json_diff(old[key], value, child))
+    return patch
+
+
+class SnapshotPublisher:
+    def __init__(self, connection_manager, message_type: str = "api_data_updated", history: int = 10,
+                 topics=("calendar", "gmail", "tasks")):
+        """Initialize the publisher
+        
+        Keeps the last ``history`` versions so clients a few versions behind
+        still get a patch; anyone older, new, or out of sync gets a full
+        snapshot.
+        """
+        self.connection_manager = connection_manager
+        self.message_type = message_type
+        # The snapshot covers several data sources; subscribers to any of them receive it
+        self.topics = list(topics)
+        self.history = history
+        
+        self.version = 0
+        self._snapshots: "OrderedDict[int, Dict]" = OrderedDict()
+        self._latest_message: Optional[Dict] = None
+        self._bus_attached = False
+        self.metrics = {"versions": 0, "unchanged": 0, "patches_sent": 0, "full_sent": 0}
+    
+    async def attach_bus(self):
+        """Receive snapshots published by any worker over the connection manager's state backend
+        
+        Versions stay per worker (they only have to match the worker's own
+        clients); identical snapshots from several workers are recorded once.
+        """
+        state_backend = self.connection_manager.state_backend
+        if state_backend is None or self._bus_attached:
+            return
+        await state_backend.subscribe(SNAPSHOT_CHANNEL, self._publish_local)
+        self._bus_attached = True
+    
+    async def publish(self, message: Dict):
+        """Push a snapshot to the clients of every worker (this one only without a shared bus)"""
+        if self._bus_attached:
+            await self.connection_manager.state_backend.publish(SNAPSHOT_CHANNEL, message)
+        else:
+            await self._publish_local(message)
+    
+    async def _publish_local(self, message: Dict):
+        """Record a new snapshot (if the data changed) and push it to this worker's clients"""
+        data = strip_volatile(message.get("data", {}))
+        if self._snapshots and data == self._snapshots[self.version]:
+            self.metrics["unchanged"] += 1
+            return
+        
+        self.version += 1
+        self._snapshots[self.version] = data
+        while len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+        self._latest_message = message
+        self.metrics["versions"] += 1
+        
+        # Group clients by acknowledged version so each distinct payload is built and serialized once
+        groups: Dict[Optional[int], List] = {}
+        active = self.connection_manager.active_connections
+        for websocket in self.connection_manager.subscribers(self.topics):
+            groups.setdefault(active[websocket].state.get("acked_version"), []).append(websocket)
+        
+        for base_version, websockets in groups.items():
+            payload = self._payload_for(base_version)
+            if payload is not None:
+                await self.connection_manager.send_group(websockets, payload)
+    
+    def _payload_for(self, base_version: Optional[int]) -> Optional[Dict]:
+        if base_version == self.version:
+            return None
+        
+        message = self._latest_message
+        envelope = {
+            "type": self.message_type,
+            "message": message.get("message"),
+            "timestamp": message.get("timestamp"),
+            "version": self.version
+        }
+        if base_version in self._snapshots:
+            self.metrics["patches_sent"] += 1
+            return {**envelope, "base_version": base_version,
+                    "patch": json_diff(self._snapshots[base_version], self._snapshots[self.version])}
+        
+        self.metrics["full_sent"] += 1
+        return {**envelope, "full": True, "data": message.get("data", {})}
+    
+    async def resync(self, websocket):
+        """Send the latest full snapshot to one client (on connect or version mismatch)"""
+        connection = self.connection_manager.active_connections.get(websocket)
+        if connection is None or self._latest_message is None or not connection.topics.intersection(self.topics):
+            return
+        connection.state.pop("acked_version", None)
+        await self.connection_manager.send_personal(websocket, self._payload_for(None))
+    
+    def acknowledge(self, websocket, version: Any):
+        """Record the version a client has applied"""
+        connection = self.connection_manager.active_connections.get(websocket)
+        if connection is not None and isinstance(version, int):
+            connection.state["acked_version"] = version
+    
+    def get_stats(self) -> Dict:
+        return {**self.metrics, "version": self.version, "retained_versions": len(self._snapshots)}
@@ -6,22 +6,36 @@ Provides RESTful APIs and WebSocket connections for the React frontend
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import asyncio
 import uvicorn
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import os
-from typing import List, Dict, Optional
+import time
+from typing import AsyncIterator, List, Dict, Optional
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # Import our modules
 from agents.smart_assistant import SmartAssistant
+from agents.conversation_summarizer import ConversationSummarizer
 from utils.memory_manager import MemoryManager
 from utils.mode_manager import ModeManager
+from utils.session_manager import SessionManager
+from utils.state_backend import create_state_backend
 from backend.services.google_services import GoogleServices
+from backend.services.async_google_services import AsyncGoogleServices
+from backend.services.google_cache import GoogleDataCache
 from backend.services.chroma_service import ChromaService
+from backend.services.ingestion_queue import IngestionQueue
+from backend.services.response_cache import ResponseCache
+from backend.services.agent_publisher import AgentPublisher
+from backend.services.connection_manager import ConnectionManager
+from backend.services.snapshot_sync import SnapshotPublisher
+from utils.executor import run_background, run_blocking, shutdown_executor
+from utils.process_lock import ProcessLock, ProcessLockError
 
 load_dotenv()
 
@@ -44,35 +58,92 @@ app.add_middleware(
 security = HTTPBearer()
 
 # Initialize services
+# Memory, mode, WebSocket fan-out and the Google caches use a shared backend when
+# LEO_STATE_BACKEND is sqlite/redis, and long-term memory a Chroma server when
+# LEO_CHROMA_HOST is set, so several workers can serve the same users
+state_backend = create_state_backend()
+# The first worker to take the lock is the primary (see utils/process_lock.py)
+process_lock = ProcessLock()
 assistant = SmartAssistant()
-memory_manager = MemoryManager()
-mode_manager = ModeManager()
-google_services = GoogleServices()
-chroma_service = ChromaService()
+memory_manager = MemoryManager(state_backend=state_backend)
+session_manager = SessionManager(memory_manager)
+summarizer = ConversationSummarizer(assistant, memory_manager)
+mode_manager = ModeManager(state_backend=state_backend)
+# Google credentials and clients are initialized off-loop at startup
+google_services = AsyncGoogleServices(GoogleServices(auto_initialize=False, state_backend=state_backend))
+google_cache = GoogleDataCache(google_services, state_backend=state_backend)
+# The embedding model and collection load on a background thread after startup
+chroma_service = ChromaService(lazy=True)
+ingestion_queue = IngestionQueue(chroma_service)
+response_cache = ResponseCache(chroma_service, state_backend=state_backend)
 
 # WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"WebSocket connected. Total: {len(self.active_connections)}")
+manager = ConnectionManager(state_backend=state_backend)
+
+# Keep references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine in the background, holding a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background workers; slow initialization is warmed up in the background"""
+    if not process_lock.try_acquire() and not (chroma_service.shared_store and state_backend.shared):
+        # Another process runs on this directory: a persistent Chroma store and
+        # in-process state (memory_persistence.json) can only have one owner
+        raise ProcessLockError(
+            f"{process_lock.path} is held by another Leo process - set LEO_CHROMA_HOST and "
+            "LEO_STATE_BACKEND=sqlite|redis to run several workers"
+        )
+    ingestion_queue.start()
+    await manager.attach_bus()
+    await snapshot_publisher.attach_bus()
+    await mode_manager.attach_bus()
+    await response_cache.attach_bus()
+    spawn_background(warm_up_services())
+
+# Readiness of the background warm-up (liveness is /api/health)
+warm_up_state = {"google_ready": False, "google_seconds": None}
+
+async def warm_up_services():
+    """Load the embedding model/collection, OpenAI and Google clients without blocking startup
     
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            print(f"WebSocket disconnected. Total: {len(self.active_connections)}")
+    Until this finishes, memory search returns nothing, the response cache
+    misses, ingestion holds its queue and Google endpoints serve mock data.
+    """
+    async def warm_google():
+        started = time.perf_counter()
+        try:
+            await google_services.start()
+        except Exception as e:
+            print(f"⚠️ Google services warm-up failed: {e}")
+        warm_up_state["google_ready"] = True
+        warm_up_state["google_seconds"] = round(time.perf_counter() - started, 2)
     
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections[:]:
-            try:
-                await connection.send_json(message)
-            except:
-                self.disconnect(connection)
+    await asyncio.gather(run_blocking(chroma_service.warm_up), run_blocking(assistant.warm_up), warm_google())
+    # Deletions interrupted by a crash or restart pick up where they stopped (on the primary worker)
+    if process_lock.held:
+        for user_id in await run_blocking(chroma_service.pending_deletions):
+            spawn_background(run_background(chroma_service.run_user_deletion, user_id))
+    print("✅ Background warm-up complete")
 
-manager = ConnectionManager()
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending writes and release background resources on shutdown"""
+    await agent_publisher.stop()
+    await manager.close_all()
+    await google_services.stop()
+    await summarizer.stop()
+    await ingestion_queue.stop()
+    chroma_service.close()
+    await state_backend.close()
+    shutdown_executor(wait=True)
+    process_lock.release()
 
 # Pydantic models
 class ChatMessage(BaseModel):
@@ -85,6 +156,8 @@ class ModeSwitch(BaseModel):
 class MemoryQuery(BaseModel):
     query: str
     limit: int = 10
+    since: Optional[float] = None  # epoch seconds
+    until: Optional[float] = None
 
 # Health check endpoint
 @app.get("/")
@@ -105,6 +178,8 @@ async def health_check():
             "memory": memory_manager.health_check(),
             "chroma": chroma_service.health_check(),
             "google_services": google_services.health_check(),
+            "sessions": session_manager.get_stats(),
+            "ingestion_queue": ingestion_queue.get_stats(),
             "websocket_connections": len(manager.active_connections)
         }
         
@@ -116,20 +191,57 @@ async def health_check():
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Health check failed: {str(e)}")
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness: 200 once the embedding model, collection and Google clients are loaded"""
+    components = {
+        "chroma": chroma_service.get_readiness(),
+        "google_services": {
+            "ready": warm_up_state["google_ready"],
+            "warm_up_seconds": warm_up_state["google_seconds"]
+        }
+    }
+    ready = all(component["ready"] for component in components.values())
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": "ready" if ready else "warming_up",
+        "timestamp": datetime.now().isoformat(),
+        "components": components
+    })
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get runtime metrics for background pipelines"""
+    return {
+        "sessions": session_manager.get_stats(),
+        "ingestion_queue": ingestion_queue.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "embeddings": chroma_service.embeddings.get_stats(),
+        "summarizer": summarizer.get_stats(),
+        "google_cache": google_cache.get_stats(),
+        "google_api": google_services.get_stats(),
+        "agent_publisher": agent_publisher.get_stats(),
+        "websockets": manager.get_stats(),
+        "snapshots": snapshot_publisher.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 # Mode management endpoints
 @app.get("/api/mode/current")
 async def get_current_mode():
     """Get current mode (agent/assistant)"""
+    await run_blocking(mode_manager.refresh_shared_mode)
     return {"mode": mode_manager.get_current_mode()}
 
 @app.post("/api/mode/switch")
 async def switch_mode(mode_data: ModeSwitch):
     """Switch between agent and assistant modes"""
     try:
-        success = mode_manager.switch_mode(mode_data.mode)
+        success = await run_blocking(mode_manager.switch_mode, mode_data.mode)
         if success:
-            # Broadcast mode change to all connected clients
-            await manager.broadcast({
+            # Other workers adopt the new mode
+            await mode_manager.announce_mode()
+            # Notify clients subscribed to mode changes
+            await manager.publish("mode", {
                 "type": "mode_changed",
                 "mode": mode_data.mode,
                 "timestamp": datetime.now().isoformat()
@@ -140,43 +252,123 @@ async def switch_mode(mode_data: ModeSwitch):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Chat pipeline helpers
+RAG_TOP_K = int(os.getenv("LEO_RAG_TOP_K", "5"))
+
+async def retrieve_memories(user_id: str, query: str) -> List[Dict]:
+    """Fetch the top-k long-term memories relevant to a message"""
+    if RAG_TOP_K <= 0:
+        return []
+    try:
+        return await run_blocking(chroma_service.search_similar, user_id, query, RAG_TOP_K)
+    except Exception as e:
+        print(f"Error retrieving memories: {e}")
+        return []
+
+async def persist_exchange(user_id: str, user_message: str, response: str):
+    """Store a finished chat turn in short-term and long-term memory"""
+    version = None
+    session_manager.begin_write(user_id)
+    try:
+        await run_blocking(memory_manager.add_message, user_id, "user", user_message)
+        version = await run_blocking(memory_manager.add_message, user_id, "assistant", response)
+        await ingestion_queue.enqueue(user_id, "user", user_message)
+        await ingestion_queue.enqueue(user_id, "assistant", response)
+    except Exception as e:
+        print(f"Error persisting chat exchange: {e}")
+    finally:
+        session_manager.end_write(user_id, version)
+
+async def stream_chat(user_id: str, user_message: str) -> AsyncIterator[Dict]:
+    """Stream a chat turn as token events, persisting once the stream finishes"""
+    session = await session_manager.get_session(user_id)
+    
+    # Turns for the same user run in order; other users are not blocked
+    async with session.lock:
+        response, probe = await response_cache.lookup(
+            user_id, session.history, user_message, assistant.stream_max_tokens
+        )
+        if response is not None:
+            yield {"type": "chat_token", "content": response}
+        else:
+            memories = await retrieve_memories(user_id, user_message)
+            parts = []
+            async for token in assistant.stream_response(
+                user_message, session.history, memories, session.summary, session.unsummarized_count
+            ):
+                parts.append(token)
+                yield {"type": "chat_token", "content": token}
+            
+            response = "".join(parts)
+            if not assistant.is_fallback_response(user_message, response):
+                response_cache.store(probe, response, personalized=bool(memories or session.summary))
+        
+        session.add_turn(user_message, response)
+        summarizer.record_turn(session)
+    
+    timestamp = datetime.now()
+    try:
+        yield {
+            "type": "chat_complete",
+            "message_id": f"msg_{timestamp.timestamp()}",
+            "response": response,
+            "timestamp": timestamp.isoformat(),
+            "user_id": user_id
+        }
+    finally:
+        # Persistence and fan-out happen after the user already has the full
+        # answer, and also when the client goes away or the stream is closed
+        spawn_background(persist_exchange(user_id, user_message, response))
+        spawn_background(manager.publish("chat", {
+            "type": "chat_message",
+            "user_message": user_message,
+            "assistant_response": response,
+            "timestamp": timestamp.isoformat()
+        }, user_id=user_id))
+
 # Chat endpoints
 @app.post("/api/chat/send")
 async def send_message(message_data: ChatMessage):
     """Send message to AI assistant"""
     try:
-        # Get recent conversation context from memory
-        recent_context = memory_manager.get_conversation_context(message_data.user_id, include_metadata=False)
-        
-        # Load conversation context into assistant
-        assistant.chat_history = []
-        for msg in recent_context:
-            assistant.chat_history.append({
-                "role": msg["role"],
-                "content": msg["content"],
-                "timestamp": datetime.now()
-            })
-        
-        # Store current message in memory
-        memory_manager.add_message(message_data.user_id, "user", message_data.message)
-        
-        # Store in long-term memory (ChromaDB)
-        chroma_service.add_message(message_data.user_id, "user", message_data.message)
+        session = await session_manager.get_session(message_data.user_id)
         
-        # Get AI response with context
-        response = assistant.handle_message(message_data.message)
-        
-        # Store response in memory
-        memory_manager.add_message(message_data.user_id, "assistant", response)
-        chroma_service.add_message(message_data.user_id, "assistant", response)
+        # Turns for the same user run in order; other users are not blocked
+        async with session.lock:
+            # Store current message in memory (file persistence runs off-loop)
+            await run_blocking(memory_manager.add_message, message_data.user_id, "user", message_data.message)
+            
+            # Queue for long-term memory (ChromaDB); batched writes happen off the chat path
+            await ingestion_queue.enqueue(message_data.user_id, "user", message_data.message)
+            
+            # Get AI response with the session's conversation context (cached when possible)
+            response, probe = await response_cache.lookup(
+                message_data.user_id, session.history, message_data.message, assistant.max_tokens
+            )
+            if response is None:
+                memories = await retrieve_memories(message_data.user_id, message_data.message)
+                response = await assistant.handle_message_async(
+                    message_data.message, session.history, memories, session.summary,
+                    session.unsummarized_count
+                )
+                if not assistant.is_fallback_response(message_data.message, response):
+                    response_cache.store(probe, response, personalized=bool(memories or session.summary))
+            session.add_turn(message_data.message, response)
+            summarizer.record_turn(session)
+            
+            # Store response in memory; the session already holds this version
+            version = await run_blocking(memory_manager.add_message, message_data.user_id, "assistant", response)
+            if version is not None:
+                session.version = version
+            await ingestion_queue.enqueue(message_data.user_id, "assistant", response)
         
-        # Broadcast to WebSocket clients
-        await manager.broadcast({
+        # Send to this user's WebSocket clients subscribed to chat
+        await manager.publish("chat", {
             "type": "chat_message",
             "user_message": message_data.message,
             "assistant_response": response,
             "timestamp": datetime.now().isoformat()
-        })
+        }, user_id=message_data.user_id)
         
         return {
             "message_id": f"msg_{datetime.now().timestamp()}",
@@ -187,11 +379,27 @@ async def send_message(message_data: ChatMessage):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def stream_message(message_data: ChatMessage):
+    """Send message to AI assistant and stream the response as Server-Sent Events"""
+    async def event_source():
+        try:
+            async for event in stream_chat(message_data.user_id, message_data.message):
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'chat_error', 'error': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/chat/history")
 async def get_chat_history(user_id: str = "default_user", limit: int = 20):
     """Get chat history"""
     try:
-        messages = memory_manager.get_recent_messages(user_id, limit)
+        messages = await run_blocking(memory_manager.get_recent_messages, user_id, limit)
         return {
             "messages": messages,
             "total": len(messages),
@@ -201,19 +409,36 @@ async def get_chat_history(user_id: str = "default_user", limit: int = 20):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/chat/memory/clear")
-async def clear_memory(user_id: str = "default_user"):
-    """Clear chat memory"""
+async def clear_memory(user_id: str = "default_user", long_term: bool = False):
+    """Clear chat memory; with long_term=true also start deleting the user's long-term memory"""
     try:
-        memory_manager.clear_memory(user_id)
-        return {"status": "cleared", "timestamp": datetime.now().isoformat()}
+        await run_blocking(memory_manager.clear_memory, user_id)
+        session_manager.drop(user_id)
+        await response_cache.invalidate_user(user_id)
+        result = {"status": "cleared", "timestamp": datetime.now().isoformat()}
+        if long_term:
+            result["long_term_deletion"] = await start_memory_deletion(user_id)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def start_memory_deletion(user_id: str) -> Dict:
+    """Record a long-term deletion job and run it in the background"""
+    job = await run_blocking(chroma_service.start_user_deletion, user_id)
+    # Messages queued before this point are stamped before the cutoff: drop
+    # them (and wait out a flush writing them) before the job runs
+    await ingestion_queue.discard_user(user_id)
+    if job.get("status") == "running":
+        spawn_background(run_background(chroma_service.run_user_deletion, user_id))
+    return job
+
 @app.get("/api/chat/memory/stats")
 async def get_memory_stats(user_id: str = "default_user"):
     """Get memory statistics"""
     try:
-        stats = memory_manager.get_memory_stats(user_id)
+        stats = await run_blocking(memory_manager.get_memory_stats, user_id)
+        # Long-term counts come from the side table, not a collection scan
+        stats["long_term"] = await run_blocking(chroma_service.get_memory_stats, user_id)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -222,7 +447,10 @@ async def get_memory_stats(user_id: str = "default_user"):
 async def get_context(query_data: MemoryQuery, user_id: str = "default_user"):
     """Get relevant context from long-term memory"""
     try:
-        context = chroma_service.search_similar(user_id, query_data.query, query_data.limit)
+        context = await run_blocking(
+            chroma_service.search_similar, user_id, query_data.query, query_data.limit,
+            query_data.since, query_data.until
+        )
         return {
             "context": context,
             "query": query_data.query,
@@ -232,11 +460,66 @@ async def get_context(query_data: MemoryQuery, user_id: str = "default_user"):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/memory/recent")
+async def get_recent_memories(user_id: str = "default_user", limit: int = 20,
+                              before_ts: Optional[float] = None, before_id: Optional[str] = None):
+    """Most recent long-term memories, newest first; pass next_cursor back for the following page"""
+    try:
+        before = (before_ts, before_id or "") if before_ts is not None else None
+        page = await run_blocking(chroma_service.get_recent_page, user_id, limit, before)
+        next_cursor = None
+        if page["next_cursor"] is not None:
+            next_cursor = {"before_ts": page["next_cursor"][0], "before_id": page["next_cursor"][1]}
+        return {"memories": page["memories"], "next_cursor": next_cursor, "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/memory/delete")
+async def delete_long_term_memory(user_id: str = "default_user"):
+    """Start deleting a user's long-term memory in the background; poll GET for progress"""
+    if not chroma_service.collection:
+        raise HTTPException(status_code=503, detail="ChromaDB not available")
+    await response_cache.invalidate_user(user_id)
+    return await start_memory_deletion(user_id)
+
+@app.get("/api/memory/delete")
+async def get_memory_deletion(user_id: str = "default_user"):
+    """Progress of a user's long-term memory deletion"""
+    return await run_blocking(chroma_service.get_deletion_job, user_id)
+
+@app.post("/api/memory/index/rebuild")
+async def rebuild_memory_index(user_id: str = "default_user"):
+    """Rebuild a user's long-term memory counts and timeline from ChromaDB"""
+    if not chroma_service.collection:
+        raise HTTPException(status_code=503, detail="ChromaDB not available")
+    counts = await run_blocking(chroma_service.rebuild_memory_index, user_id)
+    return {"user_id": user_id, "type_breakdown": counts, "timestamp": datetime.now().isoformat()}
+
+@app.post("/api/memory/migrate")
+async def migrate_memory_partitions(batch_size: int = 256):
+    """Move long-term memory from the shared collection into per-user collections in the background"""
+    if not chroma_service.collection:
+        raise HTTPException(status_code=503, detail="ChromaDB not available")
+    if chroma_service.partition_mode == "none":
+        raise HTTPException(status_code=400, detail="LEO_CHROMA_PARTITION=none - nothing to migrate")
+    # Claimed before spawning, so a second request (here or in another worker) sees it running
+    progress = await run_blocking(chroma_service.begin_migration)
+    if progress is None:
+        return {"status": "running", "progress": chroma_service.migration}
+    spawn_background(run_background(chroma_service.migrate_legacy_collection, batch_size, progress=progress))
+    return {"status": "started", "legacy_pending": chroma_service.legacy_pending}
+
+@app.get("/api/memory/migrate")
+async def get_migration_status():
+    """Progress of the legacy collection migration"""
+    return {"legacy_pending": chroma_service.legacy_pending, "progress": chroma_service.migration}
+
 # Agent mode endpoints
 @app.get("/api/agent/status")
 async def get_agent_status():
     """Get agent status and metrics"""
     try:
+        await run_blocking(mode_manager.refresh_shared_mode)
         status = mode_manager.get_agent_status()
         return {
             "is_active": mode_manager.get_current_mode() == "agent",
@@ -253,11 +536,12 @@ async def get_agent_status():
 async def trigger_agent_update():
     """Manually trigger agent update"""
     try:
-        # Get latest data from Google services
-        google_data = google_services.get_all_data()
+        # Get latest data from Google services, bypassing the cache TTLs
+        google_cache.invalidate()
+        google_data = await google_cache.get_all_data()
         
-        # Broadcast update to connected clients
-        await manager.broadcast({
+        # Send update to clients subscribed to agent status
+        await manager.publish("agent", {
             "type": "agent_status",
             "message": "Manual update triggered",
             "timestamp": datetime.now().isoformat(),
@@ -281,8 +565,8 @@ async def generate_insight():
             "insight_generation"
         )
         
-        # Broadcast insight to connected clients
-        await manager.broadcast({
+        # Send insight to clients subscribed to insights
+        await manager.publish("insights", {
             "type": "insight_generated",
             "insight": insight,
             "confidence": 85,
@@ -308,11 +592,33 @@ async def get_agent_metrics():
 
 # Google Services endpoints
 @app.get("/api/google/calendar")
-async def get_calendar_events():
-    """Get Google Calendar events"""
+async def get_calendar_events(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Get Google Calendar events (upcoming, or overlapping start/end when given)"""
     try:
-        events = google_services.get_calendar_events()
+        # Reading through the cache keeps the local event index in sync
+        events = await google_cache.get_calendar_events()
+        if start or end:
+            await run_blocking(google_services.hydrate_calendar_index, events)
+            # Naive bounds are local time; make both aware so they compare
+            range_start = (start or datetime.now()).astimezone()
+            range_end = end.astimezone() if end else range_start + timedelta(days=1)
+            if range_end <= range_start:
+                raise HTTPException(status_code=400, detail="end must be after start")
+            events = google_services.get_calendar_range(range_start, range_end)
         return {"events": events, "status": "success"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/google/calendar/next-free-slot")
+async def get_next_free_slot(duration_minutes: int = 30, horizon_days: int = 7):
+    """Find the next free calendar slot from the local event index"""
+    try:
+        events = await google_cache.get_calendar_events()
+        await run_blocking(google_services.hydrate_calendar_index, events)
+        slot = google_services.get_next_free_slot(duration_minutes, horizon_days)
+        return {"slot": slot, "duration_minutes": duration_minutes, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -320,7 +626,7 @@ async def get_calendar_events():
 async def get_gmail_data():
     """Get Gmail data"""
     try:
-        gmail_data = google_services.get_gmail_data()
+        gmail_data = await google_cache.get_gmail_data()
         return {"gmail": gmail_data, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -329,7 +635,7 @@ async def get_gmail_data():
 async def get_tasks():
     """Get Google Tasks"""
     try:
-        tasks = google_services.get_tasks()
+        tasks = await google_cache.get_tasks()
         return {"tasks": tasks, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -338,59 +644,116 @@ async def get_tasks():
 async def get_all_google_data():
     """Get all Google services data"""
     try:
-        all_data = google_services.get_all_data()
+        all_data = await google_cache.get_all_data()
         return all_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # WebSocket endpoint
+async def build_agent_update() -> Dict:
+    """Build the periodic api_data_updated payload for agent mode"""
+    try:
+        # Get fresh data from Google services
+        google_data = await google_cache.get_all_data()
+        
+        return {
+            "type": "api_data_updated",
+            "message": "API data refreshed",
+            "timestamp": datetime.now().isoformat(),
+            "data": google_data
+        }
+    except Exception as e:
+        print(f"Error getting Google data: {e}")
+        # Report the failure instead of made-up numbers
+        return {
+            "type": "api_data_updated",
+            "message": "API data unavailable",
+            "timestamp": datetime.now().isoformat(),
+            "data": {
+                source: {"status": "error", "error": str(e)}
+                for source in ("calendar", "gmail", "tasks")
+            }
+        }
+
+# Versioned snapshots: clients get a patch against their acknowledged version
+snapshot_publisher = SnapshotPublisher(manager)
+
+# One refresh loop for the whole server, fanned out to every socket
+agent_publisher = AgentPublisher(
+    build_agent_update,
+    snapshot_publisher.publish,
+    lambda: mode_manager.get_current_mode() == "agent"
+)
+
+async def handle_ws_chat(websocket: WebSocket, data: Dict):
+    """Stream a chat_request received over the socket back as chat_token events"""
+    request_id = data.get("request_id")
+    connection = manager.active_connections.get(websocket)
+    if connection is None:
+        return
+    # Always the identity bound at connect time, never one from the payload
+    user_id = connection.user_id
+    try:
+        async for event in stream_chat(user_id, data["message"]):
+            await manager.send_personal(websocket, {**event, "request_id": request_id})
+    except Exception as e:
+        print(f"WebSocket chat error: {e}")
+        await manager.send_personal(websocket, {"type": "chat_error", "request_id": request_id, "error": str(e)})
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    
-    # Send initial connection message
-    await websocket.send_json({
-        "type": "connection",
-        "message": "Connected to Leo Assistant",
-        "timestamp": datetime.now().isoformat()
-    })
+async def websocket_endpoint(websocket: WebSocket, user_id: str = "default_user"):
+    # The user comes from the connect URL (?user_id=..., like the HTTP routes);
+    # user_id fields in later messages are ignored
+    await manager.connect(websocket, user_id)
+    chats = set()
     
     try:
-        # Start periodic updates for agent mode
+        # Subscribe to the shared agent-mode publisher first, so the finally
+        # below always balances it, even if the greeting fails to send
+        agent_publisher.subscribe()
+        
+        # Send initial connection message
+        await manager.send_personal(websocket, {
+            "type": "connection",
+            "message": "Connected to Leo Assistant",
+            "timestamp": datetime.now().isoformat()
+        })
+        
+        # Start from a full snapshot
+        await snapshot_publisher.resync(websocket)
+        
         while True:
-            await asyncio.sleep(30)  # Update every 30 seconds
+            text = await websocket.receive_text()
+            manager.touch(websocket)
+            
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError:
+                continue
             
-            # Only send updates if in agent mode
-            if mode_manager.get_current_mode() == "agent":
-                try:
-                    # Get fresh data from Google services
-                    google_data = google_services.get_all_data()
-                    
-                    await websocket.send_json({
-                        "type": "api_data_updated",
-                        "message": "API data refreshed",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": google_data
-                    })
-                except Exception as e:
-                    print(f"Error getting Google data: {e}")
-                    # Send mock data as fallback
-                    await websocket.send_json({
-                        "type": "api_data_updated",
-                        "message": "API data refreshed (mock)",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": {
-                            "calendar": {"status": "healthy", "total_count": 5},
-                            "gmail": {"status": "healthy", "unread_count": 8},
-                            "tasks": {"status": "healthy", "total_count": 12}
-                        }
-                    })
+            if data.get("type") == "subscribe":
+                topics = manager.subscribe(websocket, data.get("topics", []), replace=data.get("replace", True))
+                await manager.send_personal(websocket, {"type": "subscribed", "topics": sorted(topics)})
+            elif data.get("type") == "unsubscribe":
+                manager.unsubscribe(websocket, data.get("topics", []))
+            elif data.get("type") == "ack":
+                snapshot_publisher.acknowledge(websocket, data.get("version"))
+            elif data.get("type") == "resync":
+                await snapshot_publisher.resync(websocket)
+            elif data.get("type") == "chat_request" and data.get("message"):
+                chat = asyncio.create_task(handle_ws_chat(websocket, data))
+                chats.add(chat)
+                chat.add_done_callback(chats.discard)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
+    finally:
+        agent_publisher.unsubscribe()
+        for chat in chats:
+            chat.cancel()
 
 if __name__ == "__main__":
     print("🧠 Starting Leo AI Assistant Backend...")
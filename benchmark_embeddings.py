@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Leo AI Assistant - Embedding Backend Benchmark
+Compares the PyTorch and quantized ONNX embedding backends for throughput, memory and retrieval recall
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Queries first, then the corpus they are searched against
+SAMPLE_QUERIES = [
+    "When is my next meeting?",
+    "Remind me to call mom tomorrow",
+    "What did I say about the marketing budget?",
+    "Help me plan a workout routine",
+    "Any important emails today?",
+    "How far along is the website redesign?",
+    "Suggest something healthy for dinner",
+    "What are my goals for this quarter?",
+]
+
+SAMPLE_CORPUS = [
+    "Team standup moved to 9:30 tomorrow morning",
+    "Quarterly planning meeting with the leadership team on Friday",
+    "Dentist appointment next Tuesday at 3pm",
+    "Call mom about the birthday party this weekend",
+    "Pick up groceries: spinach, salmon, brown rice",
+    "The marketing budget for Q3 is capped at 40k",
+    "We should shift more of the marketing spend to social ads",
+    "Finance asked for a revised budget forecast by Monday",
+    "Start running three times a week and add two strength sessions",
+    "Stretch for ten minutes after every workout",
+    "Inbox: contract renewal from Acme needs a signature today",
+    "Newsletter: ten productivity tips for remote teams",
+    "Urgent email from the client about the launch date",
+    "Website redesign: homepage mockups approved, checkout flow in progress",
+    "The new site navigation needs another round of user testing",
+    "Deploy the redesigned landing page after QA sign-off",
+    "Grilled salmon with roasted vegetables is a quick healthy dinner",
+    "Try a lentil soup recipe for meal prep this week",
+    "Goal: ship the mobile app beta by the end of the quarter",
+    "Goal: read two books a month and journal daily",
+    "Goal: grow the newsletter to 5,000 subscribers",
+    "Book flights for the conference in Berlin",
+    "Renew the car insurance before the 15th",
+    "The printer on the third floor is out of toner",
+    "Water the plants on Wednesday and Saturday",
+    "Prepare slides for the investor update",
+    "Review pull requests before the release branch is cut",
+    "Schedule a one-on-one with the new designer",
+    "Cancel the unused streaming subscription",
+    "Weekly review: what went well, what to improve",
+    "Sleep goal: in bed by 11pm on weeknights",
+    "Ask IT to reset the VPN password",
+]
+
+
+def rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def run_worker(kind: str, texts: int, batch_size: int, output: str):
+    """Measure one backend in this (fresh) process and save its sample vectors"""
+    from backend.services.embedding_backends import load_embedding_backend
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    backend = load_embedding_backend(kind)
+    load_seconds = time.perf_counter() - started
+    if kind == "onnx" and not backend.name.startswith("onnx"):
+        raise SystemExit("ONNX backend failed to load")
+
+    sample = SAMPLE_QUERIES + SAMPLE_CORPUS
+    vectors = np.asarray(backend.encode(sample), dtype=np.float32)
+    np.save(output, vectors)
+
+    workload = [SAMPLE_CORPUS[i % len(SAMPLE_CORPUS)] + f" #{i}" for i in range(texts)]
+
+    # Batch-of-one, as individual chat messages arrive
+    started = time.perf_counter()
+    for text in workload[:100]:
+        backend.encode([text])
+    single_ms = (time.perf_counter() - started) / min(len(workload), 100) * 1000
+
+    started = time.perf_counter()
+    backend.encode(workload, batch_size=batch_size)
+    batched_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "backend": backend.name,
+        "load_seconds": round(load_seconds, 2),
+        "single_text_ms": round(single_ms, 2),
+        "batched_texts_per_second": round(len(workload) / batched_seconds, 1),
+        "peak_rss_mb": rss_mb(),
+        "rss_added_mb": round(rss_mb() - baseline_rss, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", default="torch,onnx", help="comma-separated: torch, onnx")
+    parser.add_argument("--texts", type=int, default=1000, help="texts in the throughput run")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=5, help="neighbours compared in the recall check")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.texts, args.batch_size, args.output)
+        return
+
+    from backend.services.embedding_backends import recall_at_k
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for kind in args.backends.split(","):
+            output = os.path.join(temp_dir, f"{kind}.npy")
+            # Separate processes so RSS reflects one backend only
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", kind, "--texts", str(args.texts),
+                 "--batch-size", str(args.batch_size), "--output", output],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"❌ {kind}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.stdout}")
+                continue
+            results[kind] = json.loads(proc.stdout.strip().splitlines()[-1])
+            results[kind]["vectors"] = np.load(output)
+
+    if not results:
+        return
+
+    reference = results.get("torch")
+    print(f"{'backend':<48} {'load s':>7} {'1-text ms':>10} {'texts/s':>9} {'peak MB':>8} {'recall@' + str(args.k):>9} {'cosine':>7}")
+    for kind, result in results.items():
+        recall, cosine = "-", "-"
+        if reference is not None:
+            ref_vectors, vectors = reference["vectors"], result["vectors"]
+            recall = f"{recall_at_k(ref_vectors, vectors, len(SAMPLE_QUERIES), args.k):.3f}"
+            cosine = f"{float(np.mean(np.sum(ref_vectors * vectors, axis=1))):.4f}"
+        print(f"{result['backend']:<48} {result['load_seconds']:>7} {result['single_text_ms']:>10} "
+              f"{result['batched_texts_per_second']:>9} {result['peak_rss_mb']:>8} {recall:>9} {cosine:>7}")
+
+
+if __name__ == "__main__":
+    main()
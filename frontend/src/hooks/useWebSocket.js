@@ -6,6 +6,30 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 
 const WS_URL = process.env.REACT_APP_WS_URL || 'ws://localhost:8000/ws';
+const WS_USER_ID = process.env.REACT_APP_USER_ID || 'default_user';
+const WS_TOPICS = ['chat', 'calendar', 'gmail', 'tasks', 'insights', 'mode', 'agent'];
+
+/**
+ * Apply an RFC 6902 JSON Patch (add/replace/remove) to a copy of a document
+ */
+const applyPatch = (document, patch) => {
+  let result = JSON.parse(JSON.stringify(document ?? {}));
+  for (const { op, path, value } of patch) {
+    if (path === '') {
+      result = value;
+      continue;
+    }
+    const keys = path.split('/').slice(1).map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+    const last = keys.pop();
+    const parent = keys.reduce((node, key) => node[key], result);
+    if (op === 'remove') {
+      delete parent[last];
+    } else {
+      parent[last] = value;
+    }
+  }
+  return result;
+};
 
 export const useWebSocket = () => {
   const [isConnected, setIsConnected] = useState(false);
@@ -14,6 +38,7 @@ export const useWebSocket = () => {
   const [messages, setMessages] = useState([]);
   
   const ws = useRef(null);
+  const snapshot = useRef({ version: null, data: null });
   const reconnectTimeout = useRef(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
@@ -22,18 +47,45 @@ export const useWebSocket = () => {
   const connect = useCallback(() => {
     try {
       console.log('Attempting to connect to WebSocket:', WS_URL);
-      ws.current = new WebSocket(WS_URL);
+      // The server binds the connection to this user for its whole lifetime
+      ws.current = new WebSocket(`${WS_URL}?user_id=${encodeURIComponent(WS_USER_ID)}`);
       
       ws.current.onopen = () => {
         console.log('WebSocket connected');
         setIsConnected(true);
         setConnectionError(null);
         reconnectAttempts.current = 0;
+        snapshot.current = { version: null, data: null };
+
+        // Choose which server messages to receive
+        ws.current.send(JSON.stringify({ type: 'subscribe', topics: WS_TOPICS }));
       };
       
       ws.current.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          let data = JSON.parse(event.data);
+
+          // Answer keepalive pings so the server doesn't reap this connection
+          if (data.type === 'ping') {
+            ws.current?.send(JSON.stringify({ type: 'pong' }));
+            return;
+          }
+
+          // Versioned agent data: rebuild the full snapshot from patches and acknowledge it
+          if (data.type === 'api_data_updated' && data.version !== undefined) {
+            if (data.full) {
+              snapshot.current = { version: data.version, data: data.data };
+            } else if (data.base_version === snapshot.current.version) {
+              snapshot.current = { version: data.version, data: applyPatch(snapshot.current.data, data.patch) };
+            } else {
+              ws.current?.send(JSON.stringify({ type: 'resync' }));
+              return;
+            }
+            ws.current?.send(JSON.stringify({ type: 'ack', version: data.version }));
+            const { patch, ...rest } = data;
+            data = { ...rest, data: snapshot.current.data };
+          }
+
           console.log('WebSocket message received:', data);
           
           setLastMessage(data);
@@ -56,6 +56,50 @@ export const chatAPI = {
     return response.data;
   },
 
+  /**
+   * Send a message and stream the response token by token (Server-Sent Events)
+   * @param {string} message - User message
+   * @param {Function} onToken - Called with each token as it arrives
+   * @param {string} userId - User ID (optional)
+   * @returns {Promise<Object>} Final chat_complete event with the full response
+   */
+  streamMessage: async (message, onToken, userId = 'default_user') => {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ message, user_id: userId }),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Streaming request failed: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        if (!raw.startsWith('data: ')) continue;
+        const event = JSON.parse(raw.slice(6));
+        if (event.type === 'chat_token') {
+          onToken?.(event.content);
+        } else if (event.type === 'chat_complete') {
+          result = event;
+        } else if (event.type === 'chat_error') {
+          throw new Error(event.error);
+        }
+      }
+    }
+    return result;
+  },
+
   /**
    * Get conversation history
    * @param {number} limit - Maximum number of messages
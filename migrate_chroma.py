@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Leo AI Assistant - Memory Partition Migration
+Moves long-term memories from the shared leo_memory collection into per-user collections
+"""
+
+import argparse
+import os
+
+from backend.services.chroma_service import ChromaService
+from utils.process_lock import ProcessLock, ProcessLockError
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--keep-source", action="store_true",
+                        help="copy without deleting from leo_memory (reads keep checking it)")
+    args = parser.parse_args()
+
+    # Chroma's persistent client is single-process: stop the backend first, or
+    # use POST /api/memory/migrate to migrate while it is serving. A Chroma
+    # server (LEO_CHROMA_HOST) can be migrated alongside running workers
+    lock = ProcessLock()
+    if not os.getenv("LEO_CHROMA_HOST"):
+        try:
+            lock.acquire()
+        except ProcessLockError as e:
+            print(f"❌ {e} - stop the backend first")
+            return
+    service = ChromaService(args.persist_directory, lazy=True)
+    service.warm_up(load_model=False)
+    if service.collection is None:
+        print("❌ Could not open ChromaDB")
+        return
+    if service.partition_mode == "none":
+        print("⚠️ LEO_CHROMA_PARTITION=none - nothing to migrate")
+        return
+
+    print(f"📚 {service.collection.count()} memories in the shared collection")
+    progress = service.migrate_legacy_collection(args.batch_size, delete_source=not args.keep_source)
+    print(f"✅ {progress['migrated']} migrated in {progress['batches']} batches, {progress['remaining']} left in leo_memory")
+
+if __name__ == "__main__":
+    main()
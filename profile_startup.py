@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Leo AI Assistant - Startup Profiler
+Measures how long importing backend_main takes and which imports dominate it
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+def profile_imports(top: int = 15):
+    """Import backend_main in a fresh interpreter with -X importtime and summarize"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend_main"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    wall_seconds = time.perf_counter() - started
+
+    if result.returncode != 0:
+        print("❌ Importing backend_main failed:")
+        print(result.stderr.splitlines()[-1] if result.stderr else result.stdout)
+        return
+
+    # Lines look like "import time:       123 |       4567 |   package.module",
+    # with two extra spaces of indentation per level of nesting
+    entries = []
+    top_level_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            entries.append((int(cumulative_us), int(self_us), name.strip()))
+        except ValueError:
+            continue
+        if not name[1:].startswith(" "):
+            top_level_us += int(cumulative_us)
+    total_ms = top_level_us / 1000
+
+    print(f"⚡ Interpreter + import of backend_main: {wall_seconds:.2f}s wall, {total_ms:.0f}ms in imports")
+    print("📚 Slowest imports (cumulative):")
+    for cumulative_us, self_us, name in sorted(entries, reverse=True)[:top]:
+        print(f"   {cumulative_us / 1000:8.1f}ms  {name}")
+
+def profile_warm_up():
+    """Time the background warm-up steps that no longer block startup"""
+    from backend.services.chroma_service import ChromaService
+
+    service = ChromaService(lazy=True)
+    service.warm_up()
+    print(f"🧠 Chroma warm-up (model + collection): {service.warm_up_seconds}s - {service.get_readiness()}")
+
+if __name__ == "__main__":
+    profile_imports()
+    if "--warm-up" in sys.argv:
+        profile_warm_up()
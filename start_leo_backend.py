@@ -62,7 +62,19 @@ def start_backend():
     try:
         # Start the server using the backend_main.py file
         import uvicorn
-        uvicorn.run("backend_main:app", host="0.0.0.0", port=port, reload=True)
+        workers = int(os.getenv("LEO_WORKERS", "1"))
+        if workers > 1:
+            # Workers share memory, mode, broadcasts and the Google caches via
+            # LEO_STATE_BACKEND=sqlite|redis and long-term memory via a Chroma server
+            if os.getenv("LEO_STATE_BACKEND", "memory").lower() == "memory":
+                print("❌ LEO_WORKERS > 1 needs LEO_STATE_BACKEND=sqlite or redis")
+                return
+            if not os.getenv("LEO_CHROMA_HOST"):
+                print("❌ LEO_WORKERS > 1 needs a Chroma server (LEO_CHROMA_HOST): the persistent client is single-process")
+                return
+            uvicorn.run("backend_main:app", host="0.0.0.0", port=port, workers=workers)
+        else:
+            uvicorn.run("backend_main:app", host="0.0.0.0", port=port, reload=True)
     except KeyboardInterrupt:
         print("\n🛑 Backend server stopped")
     except Exception as e:
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Calendar index tests for Leo AI Assistant
+Range queries and free-slot search must respect interval edges, overlaps and all-day events; syncs must not keep dead events
+"""
+
+from datetime import datetime, timedelta
+
+from backend.services.calendar_sync import CalendarSync, EventIndex, _with_timestamps, find_free_slot
+
+DAY = datetime(2026, 1, 5)
+
+
+def at(hour: float) -> datetime:
+    return DAY + timedelta(hours=hour)
+
+
+def event(event_id: str, start: float, end: float) -> dict:
+    return {'id': event_id, 'start_ts': at(start).timestamp(), 'end_ts': at(end).timestamp()}
+
+
+def all_day(event_id: str) -> dict:
+    return _with_timestamps({'id': event_id, 'start': '2026-01-05', 'end': '2026-01-06', 'all_day': True})
+
+
+def ids(events) -> list:
+    return [item['id'] for item in events]
+
+
+def slot(index: EventIndex, minutes: int, after: float, horizon_hours: float):
+    return find_free_slot(index, timedelta(minutes=minutes), at(after), timedelta(hours=horizon_hours))
+
+
+def test_back_to_back_events_do_not_overlap_each_other():
+    index = EventIndex([event('b', 10, 11), event('a', 9, 10)])
+    assert ids(index.overlapping(at(10).timestamp(), at(10.5).timestamp())) == ['b']
+    assert ids(index.overlapping(at(9.5).timestamp(), at(10).timestamp())) == ['a']
+    assert ids(index.overlapping(at(11).timestamp(), at(12).timestamp())) == []
+    # No gap between them, so the first free slot starts when the second ends
+    assert slot(index, 30, 9, 8)['start'] == at(11).isoformat()
+
+
+def test_overlapping_events_are_merged_for_free_slots():
+    index = EventIndex([event('long', 8, 12), event('inner', 10, 11), event('late', 11.5, 13)])
+    # The long event starts well before the query but still overlaps it
+    assert ids(index.overlapping(at(11.25).timestamp(), at(11.4).timestamp())) == ['long']
+    assert ids(index.overlapping(at(11.75).timestamp(), at(12.5).timestamp())) == ['long', 'late']
+    assert slot(index, 30, 9, 8)['start'] == at(13).isoformat()
+
+    staggered = EventIndex([event('a', 9, 10.5), event('b', 10, 11), event('c', 11.5, 12)])
+    assert slot(staggered, 30, 9, 8) == {'start': at(11).isoformat(), 'end': at(11.5).isoformat()}
+    assert slot(staggered, 45, 9, 8)['start'] == at(12).isoformat()
+
+
+def test_slot_ending_exactly_at_the_horizon_is_found():
+    index = EventIndex([event('a', 9, 10.5)])
+    assert slot(index, 30, 9, 2) == {'start': at(10.5).isoformat(), 'end': at(11).isoformat()}
+    assert slot(index, 31, 9, 2) is None
+    assert slot(EventIndex([]), 120, 9, 2) == {'start': at(9).isoformat(), 'end': at(11).isoformat()}
+
+
+def test_all_day_events_are_listed_but_do_not_block_slots():
+    index = EventIndex([all_day('holiday'), event('meeting', 9, 10)])
+    assert ids(index.overlapping(at(13).timestamp(), at(14).timestamp())) == ['holiday']
+    assert ids(index.overlapping(at(9).timestamp(), at(9.5).timestamp())) == ['holiday', 'meeting']
+    assert slot(index, 30, 8, 8)['start'] == at(8).isoformat()
+    assert slot(index, 90, 8, 8)['start'] == at(10).isoformat()
+
+
+class FakeCalendar:
+    """events().list(...).execute() returning one page of items"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        return self
+
+    def execute(self):
+        return {'items': self.items, 'nextSyncToken': 'next'}
+
+
+def api_event(event_id: str, start: datetime, hours: float = 1, status: str = 'confirmed') -> dict:
+    return {
+        'id': event_id, 'status': status,
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(hours=hours)).isoformat()}
+    }
+
+
+def test_incremental_sync_drops_cancelled_and_expired_events():
+    sync = CalendarSync(None, lookback_days=30, state_file=None)
+    now = datetime.now()
+    sync._fetch(FakeCalendar([
+        api_event('old', now - timedelta(days=40)),
+        api_event('recent', now - timedelta(days=2)),
+        api_event('soon', now + timedelta(days=1)),
+        api_event('later', now + timedelta(days=3))
+    ]), {})
+    assert sorted(sync._events) == ['later', 'recent', 'soon']
+
+    sync._fetch(FakeCalendar([api_event('soon', now + timedelta(days=1), status='cancelled')]), sync._events)
+    assert sorted(ids(sync.index.events)) == ['later', 'recent']
+    assert sync.metrics['pruned'] == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Concurrency tests for Leo AI Assistant
+Simultaneous chats must overlap instead of queueing behind each other
+"""
+
+import asyncio
+import json
+import time
+from typing import List
+
+import httpx
+
+from utils.executor import run_blocking, shutdown_executor
+from utils.memory_manager import MemoryManager
+
+COMPLETION_SECONDS = 0.2
+CONCURRENT_CHATS = 10
+
+
+class SlowCompletions:
+    """Stand-in for AsyncOpenAI whose completions take a fixed time"""
+
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+        self.calls = 0
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(COMPLETION_SECONDS)
+        message = type("Message", (), {"content": f"echo: {messages[-1]['content']}"})
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})]})
+
+
+async def send_all(client, messages) -> List[str]:
+    """POST messages to /api/chat/send concurrently, one user each"""
+    responses = await asyncio.gather(*(
+        client.post("/api/chat/send", json={"message": text, "user_id": f"user{i}"})
+        for i, text in enumerate(messages)
+    ))
+    assert all(response.status_code == 200 for response in responses), [r.text for r in responses]
+    return [response.json()["response"] for response in responses]
+
+
+def test_simultaneous_chats_take_about_as_long_as_one(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    import backend_main
+
+    completions = SlowCompletions()
+    monkeypatch.setattr(backend_main.assistant, "api_available", True)
+    monkeypatch.setattr(backend_main.assistant, "_async_client", completions)
+
+    async def run():
+        transport = httpx.ASGITransport(app=backend_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://leo") as client:
+            started = time.perf_counter()
+            await send_all(client, ["hello"])
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            responses = await send_all(client, [f"message {i}" for i in range(CONCURRENT_CHATS)])
+            together = time.perf_counter() - started
+        return single, together, responses
+
+    try:
+        single, together, responses = asyncio.run(run())
+    finally:
+        shutdown_executor()
+
+    assert responses == [f"echo: message {i}" for i in range(CONCURRENT_CHATS)]
+    assert completions.calls == CONCURRENT_CHATS + 1
+    # Serialized chats would take CONCURRENT_CHATS times as long
+    assert together < single * 2, f"{CONCURRENT_CHATS} chats took {together:.2f}s, one took {single:.2f}s"
+
+
+def test_concurrent_saves_leave_valid_persistence_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    memory = MemoryManager()
+
+    async def run():
+        # Every 10th message of a user triggers a save, so these overlap
+        await asyncio.gather(*(
+            run_blocking(memory.add_message, f"user{i % 8}", "user", f"message {i}") for i in range(400)
+        ))
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_executor()
+
+    with open(tmp_path / "memory_persistence.json") as f:
+        data = json.load(f)
+    assert sorted(data["recent_messages"]) == [f"user{i}" for i in range(8)]
+    assert not (tmp_path / "memory_persistence.json.tmp").exists()
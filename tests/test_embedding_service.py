@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Embedding service tests for Leo AI Assistant
+A waiter that gives up must not stop the batcher from answering everyone else
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+
+from backend.services.embedding_service import EmbeddingService
+
+
+class BlockingModel:
+    """Stand-in for a sentence-transformers model that encodes once released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self, texts, batch_size=None):
+        self.started.set()
+        self.release.wait(5)
+        return np.array([[float(len(text))] for text in texts])
+
+
+class DictCache:
+    """Stand-in for EmbeddingCache"""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def get(self, text):
+        return self.vectors.get(text)
+
+    def put(self, text, vector):
+        self.vectors[text] = vector
+
+    def close(self):
+        pass
+
+
+def test_cancelled_waiter_during_encode_leaves_others_resolved():
+    model = BlockingModel()
+    service = EmbeddingService(model, batch_window_ms=50)
+
+    async def run():
+        tasks = [asyncio.ensure_future(service.encode_async([text])) for text in ("a", "bb", "ccc")]
+        await asyncio.get_running_loop().run_in_executor(None, model.started.wait, 5)
+        tasks[1].cancel()
+        model.release.set()
+        first, third = await asyncio.wait_for(asyncio.gather(tasks[0], tasks[2]), 5)
+        later = await asyncio.wait_for(service.encode_async(["dddd"]), 5)
+        return tasks[1], first, third, later
+
+    try:
+        cancelled, first, third, later = asyncio.run(run())
+    finally:
+        service.close()
+
+    assert cancelled.cancelled()
+    assert first.tolist() == [[1.0]]
+    assert third.tolist() == [[3.0]]
+    # The batching thread survived the cancelled waiter
+    assert later.tolist() == [[4.0]]
+
+
+def test_cancelled_waiter_in_batch_window_is_skipped():
+    model = BlockingModel()
+    model.release.set()
+    service = EmbeddingService(model, batch_window_ms=200, cache=DictCache())
+
+    async def run():
+        tasks = [asyncio.ensure_future(service.encode_async([text])) for text in ("a", "bb")]
+        await asyncio.sleep(0.05)
+        tasks[0].cancel()
+        second = await asyncio.wait_for(tasks[1], 5)
+        return tasks[0], second
+
+    try:
+        cancelled, second = asyncio.run(run())
+    finally:
+        service.close()
+
+    assert cancelled.cancelled()
+    assert second.tolist() == [[2.0]]
+    assert service.metrics["texts"] == 1
+    assert service.metrics["errors"] == 0
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Snapshot sync tests for Leo AI Assistant
+Clients applying the published patches must end up with exactly the published data
+"""
+
+import asyncio
+import copy
+import json
+
+from backend.services.connection_manager import ConnectionManager
+from backend.services.snapshot_sync import SnapshotPublisher, json_diff, strip_volatile
+
+
+def apply_patch(document, patch):
+    """Python port of applyPatch in frontend/src/hooks/useWebSocket.js"""
+    result = copy.deepcopy(document if document is not None else {})
+    for operation in patch:
+        if operation["path"] == "":
+            result = operation["value"]
+            continue
+        keys = [key.replace("~1", "/").replace("~0", "~") for key in operation["path"].split("/")[1:]]
+        parent = result
+        for key in keys[:-1]:
+            parent = parent[key]
+        if operation["op"] == "remove":
+            del parent[keys[-1]]
+        else:
+            parent[keys[-1]] = operation["value"]
+    return result
+
+
+def assert_round_trip(old, new):
+    assert apply_patch(old, json_diff(old, new)) == new
+
+
+def test_round_trip_array_resizing():
+    old = {"calendar": {"events": [{"id": 1}, {"id": 2}, {"id": 3}], "total_count": 3}}
+    assert_round_trip(old, {"calendar": {"events": [{"id": 1}], "total_count": 1}})
+    assert_round_trip(old, {"calendar": {"events": [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}], "total_count": 4}})
+    assert_round_trip(old, {"calendar": {"events": [], "total_count": 0}})
+    assert_round_trip({"tasks": []}, {"tasks": [{"title": "a"}, {"title": "b"}]})
+
+
+def test_round_trip_key_removal_and_addition():
+    old = {"gmail": {"status": "healthy", "unread_count": 3, "error": "x"}, "tasks": {"total_count": 1}}
+    new = {"gmail": {"status": "healthy", "unread_count": 4}, "calendar": {"total_count": 0}}
+    assert_round_trip(old, new)
+    assert_round_trip(new, old)
+    assert_round_trip(old, {})
+
+
+def test_round_trip_escaped_keys_and_type_changes():
+    assert_round_trip({"a/b": 1, "c~d": {"e": 1}}, {"a/b": 2, "c~d": {"e": 2, "f/g~": 3}})
+    assert_round_trip({"calendar": {"events": [1]}}, {"calendar": [1, 2]})
+    assert_round_trip({"calendar": None}, {"calendar": {"status": "error"}})
+    assert_round_trip({"a": 1}, [1, 2])
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+class Client:
+    """The snapshot handling of useWebSocket: apply patches, acknowledge, resync on mismatch"""
+
+    def __init__(self, publisher, websocket):
+        self.publisher = publisher
+        self.websocket = websocket
+        self.version = None
+        self.data = None
+        self.resyncs = 0
+
+    async def receive(self):
+        await asyncio.sleep(0.01)
+        messages, self.websocket.sent = self.websocket.sent, []
+        for message in messages:
+            if message.get("type") != "api_data_updated":
+                continue
+            if message.get("full"):
+                self.version, self.data = message["version"], message["data"]
+            elif message["base_version"] == self.version:
+                self.version, self.data = message["version"], apply_patch(self.data, message["patch"])
+            else:
+                self.resyncs += 1
+                await self.publisher.resync(self.websocket)
+                await self.receive()
+                continue
+            self.publisher.acknowledge(self.websocket, self.version)
+
+
+def snapshot(events, unread):
+    return {
+        "type": "api_data_updated",
+        "message": "API data refreshed",
+        "data": {
+            "calendar": {"status": "healthy", "events": events, "total_count": len(events)},
+            "gmail": {"status": "healthy", "unread_count": unread},
+            "last_updated": f"t{len(events)}{unread}"
+        }
+    }
+
+
+def test_clients_track_published_snapshots_through_patches_and_resyncs():
+    async def run():
+        manager = ConnectionManager()
+        publisher = SnapshotPublisher(manager, history=3)
+        websocket = FakeSocket()
+        await manager.connect(websocket)
+        client = Client(publisher, websocket)
+
+        history = [
+            snapshot([{"id": 1}], 2),
+            snapshot([{"id": 1}, {"id": 2}, {"id": 3}], 2),
+            snapshot([{"id": 3}], 0),
+            snapshot([], 5)
+        ]
+        await publisher.publish(history[0])
+        await publisher.resync(websocket)
+        await client.receive()
+        assert client.data == history[0]["data"]
+
+        for message in history[1:]:
+            await publisher.publish(message)
+            await client.receive()
+            assert strip_volatile(client.data) == strip_volatile(message["data"])
+        assert publisher.metrics["patches_sent"] == len(history) - 1
+
+        # The client lost track of its version: the patch does not apply, so it resyncs
+        client.version = 999
+        await publisher.publish(snapshot([{"id": 9}], 1))
+        await client.receive()
+        assert client.resyncs == 1
+        assert client.version == publisher.version
+        assert client.data == snapshot([{"id": 9}], 1)["data"]
+
+        # Acknowledged a version the publisher no longer keeps: it gets a full snapshot
+        publisher.acknowledge(websocket, 1)
+        await publisher.publish(snapshot([{"id": 10}], 1))
+        await client.receive()
+        assert client.resyncs == 1
+        assert client.data == snapshot([{"id": 10}], 1)["data"]
+
+        manager.disconnect(websocket)
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Blocking Work Executor for Leo AI Assistant
+Runs embeddings, ChromaDB calls and file I/O off the event loop
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+# Pool name -> (worker count env var, default worker count). Short request-path
+# calls share "blocking"; jobs that run for minutes get "background" and
+# Google API calls (which may hang until their socket timeout) get "google",
+# so neither can occupy every thread chat requests need
+POOLS = {
+    "blocking": ("LEO_BLOCKING_WORKERS", "4"),
+    "background": ("LEO_BACKGROUND_WORKERS", "1"),
+    "google": ("LEO_GOOGLE_WORKERS", "4"),
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(pool: str = "blocking") -> ThreadPoolExecutor:
+    """Get a bounded thread pool (the shared "blocking" one by default)"""
+    if pool not in _executors:
+        env_var, default = POOLS[pool]
+        _executors[pool] = ThreadPoolExecutor(
+            max_workers=int(os.getenv(env_var, default)),
+            thread_name_prefix=f"leo-{pool}"
+        )
+    return _executors[pool]
+
+
+async def run_in_pool(pool: str, func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking callable in a named pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(pool), partial(func, *args, **kwargs))
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a short blocking callable in the shared executor and await its result"""
+    return await run_in_pool("blocking", func, *args, **kwargs)
+
+
+async def run_background(func: Callable, *args, **kwargs) -> Any:
+    """Run a long job (deletion, migration) in its own pool, away from request-path work"""
+    return await run_in_pool("background", func, *args, **kwargs)
+
+
+def shutdown_executor(wait: bool = True):
+    """Shut down every pool (called on application shutdown)
+
+    Queued background jobs are cancelled: deletions resume at the next
+    start, a migration can simply be started again.
+    """
+    for pool, executor in list(_executors.items()):
+        executor.shutdown(wait=wait, cancel_futures=pool == "background")
+    _executors.clear()
@@ -8,12 +8,22 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import json
 import os
+import threading
 from collections import defaultdict, deque
 
 class MemoryManager:
-    def __init__(self, max_session_messages: int = 100):
-        """Initialize memory manager"""
+    def __init__(self, max_session_messages: int = 100, state_backend=None):
+        """Initialize memory manager
+        
+        With a shared ``state_backend`` (SQLite/Redis) messages and session
+        info live in the backend so every worker sees the same memory;
+        otherwise they stay in-process and are persisted to a JSON file.
+        In the backend the rolling summary has its own key: session info is
+        rewritten on every message without a cross-process lock.
+        """
         self.max_session_messages = max_session_messages
+        self.state_backend = state_backend if state_backend is not None and state_backend.shared else None
+        self._local_version = 0
         
         # Short-term memory (in-memory, per session)
         self.session_memory = defaultdict(lambda: deque(maxlen=max_session_messages))
@@ -24,8 +34,14 @@ class MemoryManager:
         # Memory persistence file
         self.memory_file = "memory_persistence.json"
         
-        # Load persistent memory if exists
-        self._load_persistent_memory()
+        # Guards session state when called from executor threads
+        self._lock = threading.RLock()
+        # Serializes saves so snapshots reach the file in the order they were taken
+        self._save_lock = threading.Lock()
+        
+        # Load persistent memory if exists (the shared backend persists itself)
+        if not self.shared:
+            self._load_persistent_memory()
         
         print("✅ Memory Manager initialized")
     
@@ -51,22 +67,73 @@ class MemoryManager:
         except Exception as e:
             print(f"⚠️ Error loading persistent memory: {e}")
     
+    @property
+    def shared(self) -> bool:
+        return self.state_backend is not None
+    
+    # Storage helpers: in-process structures or the shared state backend
+    def _messages(self, user_id: str) -> List[Dict]:
+        if self.shared:
+            return self.state_backend.list_range(f"memory:{user_id}")
+        with self._lock:
+            return list(self.session_memory[user_id])
+    
+    def _session_info(self, user_id: str) -> Dict:
+        if self.shared:
+            return self.state_backend.get(f"session:{user_id}", {})
+        with self._lock:
+            return dict(self.user_sessions.get(user_id, {}))
+    
+    def _set_session_info(self, user_id: str, info: Dict):
+        if self.shared:
+            self.state_backend.set(f"session:{user_id}", info)
+        else:
+            with self._lock:
+                self.user_sessions[user_id] = info
+    
+    def _user_ids(self) -> List[str]:
+        if self.shared:
+            return [key[len("session:"):] for key in self.state_backend.keys("session:")]
+        with self._lock:
+            return list(set(self.user_sessions) | set(self.session_memory))
+    
+    def _bump_version(self, user_id: str) -> int:
+        """Increment the user's memory version so other workers' sessions know to reload"""
+        if self.shared:
+            return self.state_backend.incr(f"memory_version:{user_id}")
+        with self._lock:
+            self._local_version += 1
+            return self._local_version
+    
+    def get_version(self, user_id: str) -> int:
+        """Current memory version for a user (changes whenever messages change)"""
+        if self.shared:
+            return self.state_backend.get(f"memory_version:{user_id}", 0)
+        return self._local_version
+    
     def _save_persistent_memory(self):
         """Save important memory to file"""
+        if self.shared:
+            return
         try:
-            # Prepare data for persistence
-            data = {
-                'user_sessions': dict(self.user_sessions),
-                'recent_messages': {},
-                'last_saved': datetime.now().isoformat()
-            }
-            
-            # Save only recent messages to avoid large files
-            for user_id, messages in self.session_memory.items():
-                data['recent_messages'][user_id] = list(messages)[-10:]  # Last 10 messages
-            
-            with open(self.memory_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._save_lock:
+                with self._lock:
+                    # Prepare data for persistence
+                    data = {
+                        'user_sessions': {uid: dict(info) for uid, info in self.user_sessions.items()},
+                        'recent_messages': {},
+                        'last_saved': datetime.now().isoformat()
+                    }
+                    
+                    # Save only recent messages to avoid large files
+                    for user_id, messages in self.session_memory.items():
+                        data['recent_messages'][user_id] = list(messages)[-10:]  # Last 10 messages
+                
+                # Write a temp file and swap it in so a crash never leaves a truncated file
+                temp_file = f"{self.memory_file}.tmp"
+                with open(temp_file, 'w') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(temp_file, self.memory_file)
                 
         except Exception as e:
             print(f"⚠️ Error saving persistent memory: {e}")
@@ -93,15 +160,25 @@ class MemoryManager:
                 'metadata': metadata or {}
             }
             
-            # Add to session memory
-            self.session_memory[user_id].append(message)
+            if self.shared:
+                self.state_backend.list_append(f"memory:{user_id}", message, self.max_session_messages)
+                self._update_user_session(user_id)
+                return self._bump_version(user_id)
             
-            # Update user session info
-            self._update_user_session(user_id)
+            with self._lock:
+                # Add to session memory
+                self.session_memory[user_id].append(message)
+                
+                # Update user session info
+                self._update_user_session(user_id)
+                
+                should_save = len(self.session_memory[user_id]) % 10 == 0
             
             # Periodically save to persistence
-            if len(self.session_memory[user_id]) % 10 == 0:
+            if should_save:
                 self._save_persistent_memory()
+            
+            return self._bump_version(user_id)
                 
         except Exception as e:
             print(f"Error adding message to memory: {e}")
@@ -109,7 +186,7 @@ class MemoryManager:
     def get_recent_messages(self, user_id: str, limit: int = 20) -> List[Dict]:
         """Get recent messages for a user"""
         try:
-            messages = list(self.session_memory[user_id])
+            messages = self._messages(user_id)
             return messages[-limit:] if limit > 0 else messages
         except Exception as e:
             print(f"Error getting recent messages: {e}")
@@ -118,7 +195,7 @@ class MemoryManager:
     def get_conversation_context(self, user_id: str, include_metadata: bool = False) -> List[Dict]:
         """Get conversation context for AI processing"""
         try:
-            messages = list(self.session_memory[user_id])
+            messages = self._messages(user_id)
             
             if include_metadata:
                 return messages
@@ -135,26 +212,61 @@ class MemoryManager:
     def clear_memory(self, user_id: str):
         """Clear memory for a user"""
         try:
-            if user_id in self.session_memory:
-                self.session_memory[user_id].clear()
+            with self._lock:
+                if user_id in self.session_memory:
+                    self.session_memory[user_id].clear()
+            if self.shared:
+                self.state_backend.delete(f"memory:{user_id}")
+                self.state_backend.delete(f"summary:{user_id}")
             
-            if user_id in self.user_sessions:
-                self.user_sessions[user_id] = {
+            if self._session_info(user_id):
+                self._set_session_info(user_id, {
                     'last_activity': datetime.now().isoformat(),
                     'session_start': datetime.now().isoformat(),
                     'messages_count': 0
-                }
+                })
             
+            self._bump_version(user_id)
             self._save_persistent_memory()
             
         except Exception as e:
             print(f"Error clearing memory: {e}")
     
+    def get_summary(self, user_id: str) -> str:
+        """Get the rolling conversation summary for a user"""
+        if self.shared:
+            stored = self.state_backend.get(f"summary:{user_id}")
+            if stored is not None:
+                return stored.get('summary', '')
+        # Also where older shared deployments kept it
+        return self._session_info(user_id).get('summary', '')
+    
+    def set_summary(self, user_id: str, summary: str):
+        """Store the rolling conversation summary for a user and persist it"""
+        try:
+            if self.shared:
+                self.state_backend.set(f"summary:{user_id}", {
+                    'summary': summary,
+                    'summary_updated': datetime.now().isoformat()
+                })
+                return
+            
+            with self._lock:
+                info = self._session_info(user_id)
+                info['summary'] = summary
+                info['summary_updated'] = datetime.now().isoformat()
+                self._set_session_info(user_id, info)
+            
+            self._save_persistent_memory()
+            
+        except Exception as e:
+            print(f"Error saving conversation summary: {e}")
+    
     def get_memory_stats(self, user_id: str) -> Dict:
         """Get memory statistics for a user"""
         try:
-            messages = list(self.session_memory[user_id])
-            session_info = self.user_sessions.get(user_id, {})
+            messages = self._messages(user_id)
+            session_info = self._session_info(user_id)
             
             # Calculate session duration
             session_start = session_info.get('session_start')
@@ -173,7 +285,7 @@ class MemoryManager:
                 'memory_usage_percent': round(memory_percent, 1),
                 'last_activity': session_info.get('last_activity', ''),
                 'session_start': session_info.get('session_start', ''),
-                'messages_today': self._count_messages_today(user_id)
+                'messages_today': self._count_messages_today(messages)
             }
             
         except Exception as e:
@@ -191,13 +303,13 @@ class MemoryManager:
         """Get recent context summary across all users or specific user"""
         try:
             if user_id:
-                messages = list(self.session_memory[user_id])
+                messages = self._messages(user_id)
                 recent_messages = messages[-5:]  # Last 5 messages
             else:
                 # Get recent activity across all users
                 all_recent = []
-                for uid, messages in self.session_memory.items():
-                    recent = list(messages)[-3:]  # Last 3 per user
+                for uid in self._user_ids():
+                    recent = self._messages(uid)[-3:]  # Last 3 per user
                     all_recent.extend(recent)
                 
                 # Sort by timestamp
@@ -222,27 +334,27 @@ class MemoryManager:
         try:
             now = datetime.now().isoformat()
             
-            if user_id not in self.user_sessions:
-                self.user_sessions[user_id] = {
-                    'session_start': now,
-                    'first_seen': now
-                }
+            info = self._session_info(user_id) or {
+                'session_start': now,
+                'first_seen': now
+            }
             
-            self.user_sessions[user_id].update({
+            info.update({
                 'last_activity': now,
-                'messages_count': len(self.session_memory[user_id])
+                'messages_count': len(self._messages(user_id))
             })
+            self._set_session_info(user_id, info)
             
         except Exception as e:
             print(f"Error updating user session: {e}")
     
-    def _count_messages_today(self, user_id: str) -> int:
-        """Count messages sent today by user"""
+    def _count_messages_today(self, messages: List[Dict]) -> int:
+        """Count messages sent today in a user's message list"""
         try:
             today = datetime.now().date()
             count = 0
             
-            for message in self.session_memory[user_id]:
+            for message in messages:
                 msg_time = datetime.fromisoformat(message['timestamp'].replace('Z', '+00:00'))
                 if msg_time.date() == today:
                     count += 1
@@ -259,7 +371,8 @@ class MemoryManager:
             cutoff_date = datetime.now() - timedelta(days=max_age_days)
             users_to_remove = []
             
-            for user_id, session_info in self.user_sessions.items():
+            for user_id in self._user_ids():
+                session_info = self._session_info(user_id)
                 last_activity = session_info.get('last_activity')
                 if last_activity:
                     activity_time = datetime.fromisoformat(last_activity.replace('Z', '+00:00'))
@@ -268,10 +381,14 @@ class MemoryManager:
             
             # Remove old sessions
             for user_id in users_to_remove:
-                if user_id in self.session_memory:
-                    del self.session_memory[user_id]
-                if user_id in self.user_sessions:
-                    del self.user_sessions[user_id]
+                if self.shared:
+                    self.state_backend.delete(f"memory:{user_id}")
+                    self.state_backend.delete(f"session:{user_id}")
+                    self.state_backend.delete(f"summary:{user_id}")
+                    continue
+                with self._lock:
+                    self.session_memory.pop(user_id, None)
+                    self.user_sessions.pop(user_id, None)
             
             if users_to_remove:
                 print(f"🧹 Cleaned up {len(users_to_remove)} old sessions")
@@ -283,14 +400,16 @@ class MemoryManager:
     def get_all_users_summary(self) -> Dict:
         """Get summary of all user activity"""
         try:
-            total_users = len(self.user_sessions)
-            total_messages = sum(len(messages) for messages in self.session_memory.values())
+            user_ids = self._user_ids()
+            sessions = [self._session_info(uid) for uid in user_ids]
+            total_users = len([info for info in sessions if info])
+            total_messages = sum(len(self._messages(uid)) for uid in user_ids)
             
             # Active users (activity in last 24 hours)
             active_users = 0
             yesterday = datetime.now() - timedelta(days=1)
             
-            for session_info in self.user_sessions.values():
+            for session_info in sessions:
                 last_activity = session_info.get('last_activity')
                 if last_activity:
                     activity_time = datetime.fromisoformat(last_activity.replace('Z', '+00:00'))
@@ -10,14 +10,26 @@ import json
 import os
 from enum import Enum
 
+# State backend channel that tells every worker about a mode switch
+MODE_CHANNEL = "mode"
+
 class OperationMode(Enum):
     AGENT = "agent"
     ASSISTANT = "assistant"
 
 class ModeManager:
-    def __init__(self):
-        """Initialize mode manager"""
+    def __init__(self, state_backend=None):
+        """Initialize mode manager
+        
+        With a shared ``state_backend`` the current mode is persisted there.
+        get_current_mode() never touches the backend (it is called on the
+        event loop); refresh_shared_mode() and switch_mode() do and run
+        off-loop. After attach_bus() a switch on any worker updates the
+        cached mode of every worker.
+        """
+        self.state_backend = state_backend if state_backend is not None and state_backend.shared else None
         self.current_mode = OperationMode.AGENT
+        self._bus_attached = False
         self.mode_history = []
         self.agent_metrics = {
             "tasks_processed": 0,
@@ -33,6 +45,8 @@ class ModeManager:
         
         # Load persistent state
         self._load_mode_state()
+        if self.state_backend:
+            self._sync_shared_mode()
         
         print(f"✅ Mode Manager initialized in {self.current_mode.value} mode")
     
@@ -88,12 +102,46 @@ class ModeManager:
         except Exception as e:
             print(f"⚠️ Error saving mode state: {e}")
     
+    def refresh_shared_mode(self):
+        """Re-read the mode from the shared backend (blocking; call via run_blocking)"""
+        if self.state_backend:
+            self._sync_shared_mode()
+    
+    def _sync_shared_mode(self):
+        """Adopt the mode stored in the shared backend"""
+        try:
+            mode_str = self.state_backend.get("mode:current")
+            if mode_str is None:
+                self.state_backend.set("mode:current", self.current_mode.value)
+            else:
+                self.current_mode = OperationMode(mode_str)
+        except Exception as e:
+            print(f"⚠️ Error reading shared mode: {e}")
+    
+    async def attach_bus(self):
+        """Start receiving mode switches made by other workers"""
+        if self.state_backend is None or self._bus_attached:
+            return
+        await self.state_backend.subscribe(MODE_CHANNEL, self._on_mode_message)
+        self._bus_attached = True
+    
+    async def announce_mode(self):
+        """Tell the other workers about this worker's current mode"""
+        if self._bus_attached:
+            await self.state_backend.publish(MODE_CHANNEL, {"mode": self.current_mode.value})
+    
+    async def _on_mode_message(self, message: Dict):
+        try:
+            self.current_mode = OperationMode(message["mode"])
+        except (KeyError, ValueError):
+            print(f"⚠️ Ignoring invalid mode message: {message}")
+    
     def get_current_mode(self) -> str:
-        """Get current operation mode"""
+        """Get current operation mode (cached, no backend round-trip)"""
         return self.current_mode.value
     
     def switch_mode(self, new_mode: str) -> bool:
-        """Switch to a new operation mode"""
+        """Switch to a new operation mode (blocking: writes the state file and shared backend)"""
         try:
             # Validate new mode
             try:
@@ -102,6 +150,9 @@ class ModeManager:
                 print(f"❌ Invalid mode: {new_mode}")
                 return False
             
+            if self.state_backend:
+                self._sync_shared_mode()
+            
             # Check if already in target mode
             if self.current_mode == target_mode:
                 print(f"ℹ️ Already in {target_mode.value} mode")
@@ -127,6 +178,8 @@ class ModeManager:
             
             # Save state
             self._save_mode_state()
+            if self.state_backend:
+                self.state_backend.set("mode:current", target_mode.value)
             
             print(f"🔄 Switched from {old_mode} to {target_mode.value} mode")
             return True
@@ -157,9 +210,10 @@ class ModeManager:
         try:
             uptime_minutes = (datetime.now() - self.agent_metrics['uptime_start']).total_seconds() / 60
             
+            current_mode = self.get_current_mode()
             status = {
-                'is_active': self.current_mode == OperationMode.AGENT,
-                'current_mode': self.current_mode.value,
+                'is_active': current_mode == OperationMode.AGENT.value,
+                'current_mode': current_mode,
                 'uptime_minutes': round(uptime_minutes, 1),
                 'last_activity': self.agent_metrics['last_activity'].isoformat(),
                 'tasks_processed': self.agent_metrics['tasks_processed'],
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Process Lock for Leo AI Assistant
+Non-blocking file locks that give one process ownership of a local resource (primary worker, embedding cache slot)
+"""
+
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_LOCK_FILE = "leo_backend.lock"
+
+
+class ProcessLockError(RuntimeError):
+    """Another process already owns the resource"""
+
+
+class ProcessLock:
+    def __init__(self, path: Optional[str] = None):
+        """Exclusive, non-blocking lock on ``path`` (LEO_LOCK_FILE by default)
+
+        The backend's lock elects the primary worker, which resumes
+        interrupted background jobs. With a local (persistent) Chroma store
+        it also keeps a second process from opening the same directory.
+        """
+        self.path = path or os.getenv("LEO_LOCK_FILE", DEFAULT_LOCK_FILE)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free; False when another process holds it"""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            print("⚠️ File locking unavailable - make sure only one Leo backend process runs")
+            return True
+        handle = open(self.path, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._file = handle
+        return True
+
+    def acquire(self):
+        if not self.try_acquire():
+            raise ProcessLockError(f"{self.path} is held by another Leo process")
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
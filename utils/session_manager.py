@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Session Manager for Leo AI Assistant
+Keeps per-user assistant sessions with LRU and idle eviction
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from utils.executor import run_blocking
+
+
+class UserSession:
+    """Conversation state for a single user
+    
+    Requests for the same user serialize on ``lock`` while different users
+    run in parallel.
+    """
+
+    def __init__(self, user_id: str, history, max_history: int, summary: str = ""):
+        self.user_id = user_id
+        self.history = deque(history, maxlen=max_history)
+        self.lock = asyncio.Lock()
+        
+        # Rolling summary plus the messages not yet folded into it
+        self.summary = summary
+        self.unsummarized = []
+        # Memory version the history was loaded at and writes of this
+        # session still in flight (shared backends only)
+        self.version = 0
+        self.pending_writes = 0
+        self.summarizing = False
+        # Messages taken out of unsummarized by a refresh still in flight
+        self.folding = 0
+        # Consecutive failed refreshes and when the next one may start
+        self.summary_failures = 0
+        self.summary_retry_at = 0.0
+        self.closed = False
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+
+    @property
+    def unsummarized_count(self) -> int:
+        """Messages the summary does not cover yet, including ones being folded in right now"""
+        return len(self.unsummarized) + self.folding
+
+    def touch(self):
+        """Mark the session as recently used"""
+        self.last_active = time.monotonic()
+
+    def add_turn(self, user_message: str, response: str):
+        """Append a completed user/assistant exchange to the session history"""
+        turn = [{"role": "user", "content": user_message}, {"role": "assistant", "content": response}]
+        self.history.extend(turn)
+        self.unsummarized.extend(turn)
+        self.touch()
+
+    def clear(self):
+        """Forget the conversation history"""
+        self.history.clear()
+        self.summary = ""
+        self.unsummarized = []
+
+
+class SessionManager:
+    def __init__(self, memory_manager, max_sessions: Optional[int] = None,
+                 idle_timeout: Optional[float] = None, max_history: int = 20):
+        """Initialize session manager"""
+        self.memory_manager = memory_manager
+        self.max_sessions = max_sessions or int(os.getenv("LEO_MAX_SESSIONS", "1000"))
+        self.idle_timeout = idle_timeout or float(os.getenv("LEO_SESSION_IDLE_SECONDS", "1800"))
+        self.max_history = max_history
+        
+        # Ordered from least to most recently used
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self.evictions = 0
+        self.reloads = 0
+        
+        print("✅ Session Manager initialized")
+
+    async def get_session(self, user_id: str) -> UserSession:
+        """Get or create the session for a user, hydrating it from short-term memory once
+        
+        With a shared memory backend the stored memory may have changed
+        outside this session (e.g. a clear from a maintenance script), so an
+        idle session is reloaded when the stored memory version has moved on.
+        Backend reads run off the event loop; hydration holds the session lock
+        so concurrent callers wait for it instead of seeing an empty history.
+        """
+        shared = getattr(self.memory_manager, "shared", False)
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = UserSession(user_id, (), self.max_history)
+            self._sessions[user_id] = session
+            stale = True
+        else:
+            self._sessions.move_to_end(user_id)
+            stale = (shared and not session.lock.locked() and not session.pending_writes
+                     and session.version != await run_blocking(self.memory_manager.get_version, user_id))
+            if stale:
+                self.reloads += 1
+        
+        session.touch()
+        self._evict()
+        if stale:
+            async with session.lock:
+                await run_blocking(self._hydrate, session)
+        return session
+
+    def _hydrate(self, session: UserSession):
+        """Load history and summary for a session from the memory manager (blocking)"""
+        session.version = self.memory_manager.get_version(session.user_id)
+        context = self.memory_manager.get_conversation_context(session.user_id, include_metadata=False)
+        session.history = deque(context[-self.max_history:], maxlen=self.max_history)
+        session.summary = self.memory_manager.get_summary(session.user_id)
+
+    def begin_write(self, user_id: str):
+        """Mark that this worker is persisting a turn the session already holds"""
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.pending_writes += 1
+
+    def end_write(self, user_id: str, version: Optional[int]):
+        """Record the memory version produced by this worker's own write"""
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.pending_writes = max(session.pending_writes - 1, 0)
+            if version is not None:
+                session.version = version
+
+    def drop(self, user_id: str):
+        """Discard a user's session (e.g. after memory is cleared)"""
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            session.closed = True
+            session.clear()
+
+    def _evict(self):
+        """Evict idle sessions and least recently used ones over capacity
+        
+        Sessions with a request in flight are never evicted, otherwise a new
+        session (and lock) could be created for the same user mid-request.
+        """
+        now = time.monotonic()
+        for user_id in list(self._sessions):
+            session = self._sessions[user_id]
+            over_capacity = len(self._sessions) > self.max_sessions
+            idle = now - session.last_active > self.idle_timeout
+            if not (over_capacity or idle):
+                # Remaining sessions are more recently used
+                break
+            if session.lock.locked() or session.summarizing:
+                continue
+            del self._sessions[user_id]
+            session.closed = True
+            self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        """Get session registry statistics"""
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout_seconds": self.idle_timeout,
+            "evictions": self.evictions,
+            "reloads": self.reloads
+        }
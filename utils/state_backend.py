@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+State Backend for Leo AI Assistant
+Pluggable key/value, list and pub/sub storage so several uvicorn workers share memory, mode and broadcasts
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.executor import run_blocking
+
+Handler = Callable[[Dict], Awaitable[None]]
+
+
+class StateBackend:
+    """In-process backend (single worker); the default
+    
+    Values must be JSON-serializable so every backend behaves the same.
+    """
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._lists: Dict[str, deque] = defaultdict(deque)
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._lock = threading.RLock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+            self._lists.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._values[key] = int(self._values.get(key, 0)) + 1
+            return self._values[key]
+
+    def list_append(self, key: str, item: Any, max_len: int):
+        with self._lock:
+            items = self._lists[key]
+            items.append(item)
+            while len(items) > max_len:
+                items.popleft()
+
+    def list_range(self, key: str, limit: Optional[int] = None) -> List[Any]:
+        """Items in insertion order; the last ``limit`` ones when given"""
+        with self._lock:
+            items = list(self._lists.get(key, ()))
+        return items[-limit:] if limit else items
+
+    def keys(self, prefix: str) -> List[str]:
+        with self._lock:
+            return [key for key in set(self._values) | set(self._lists) if key.startswith(prefix)]
+
+    async def publish(self, channel: str, message: Dict):
+        for handler in list(self._handlers.get(channel, ())):
+            await handler(message)
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+
+    async def close(self):
+        self._handlers.clear()
+
+
+class SQLiteStateBackend(StateBackend):
+    """File-based backend shared by workers on one host
+    
+    Pub/sub is an append-only events table that every worker polls.
+    """
+    shared = True
+
+    def __init__(self, path: str, poll_interval: float = 0.1, retention_seconds: float = 60):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS lists (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, value TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS lists_key ON lists (key, id);
+            CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,
+                                               payload TEXT NOT NULL, created REAL NOT NULL);
+        """)
+        self._poller: Optional[asyncio.Task] = None
+        self._last_event_id = 0
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        rows = self._execute("SELECT value FROM kv WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set(self, key: str, value: Any):
+        self._execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM lists WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchall()
+                value = (json.loads(rows[0][0]) if rows else 0) + 1
+                self._conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return value
+
+    def list_append(self, key: str, item: Any, max_len: int):
+        with self._lock:
+            self._conn.execute("INSERT INTO lists (key, value) VALUES (?, ?)", (key, json.dumps(item)))
+            self._conn.execute(
+                "DELETE FROM lists WHERE key = ? AND id NOT IN "
+                "(SELECT id FROM lists WHERE key = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, max_len)
+            )
+
+    def list_range(self, key: str, limit: Optional[int] = None) -> List[Any]:
+        rows = self._execute(
+            "SELECT value FROM (SELECT id, value FROM lists WHERE key = ? ORDER BY id DESC LIMIT ?) ORDER BY id",
+            (key, limit if limit else -1)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def keys(self, prefix: str) -> List[str]:
+        pattern = prefix.replace("%", r"\%").replace("_", r"\_") + "%"
+        rows = self._execute(
+            "SELECT key FROM kv WHERE key LIKE ? ESCAPE '\\' UNION SELECT DISTINCT key FROM lists WHERE key LIKE ? ESCAPE '\\'",
+            (pattern, pattern)
+        )
+        return [row[0] for row in rows]
+
+    async def publish(self, channel: str, message: Dict):
+        await run_blocking(
+            self._execute, "INSERT INTO events (channel, payload, created) VALUES (?, ?, ?)",
+            (channel, json.dumps(message), time.time())
+        )
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+        if self._poller is None:
+            # Only deliver events published after this worker started listening
+            rows = await run_blocking(self._execute, "SELECT COALESCE(MAX(id), 0) FROM events")
+            self._last_event_id = rows[0][0]
+            self._poller = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await run_blocking(
+                    self._execute, "SELECT id, channel, payload FROM events WHERE id > ? ORDER BY id",
+                    (self._last_event_id,)
+                )
+                for event_id, channel, payload in rows:
+                    self._last_event_id = event_id
+                    for handler in list(self._handlers.get(channel, ())):
+                        await handler(json.loads(payload))
+                
+                if time.monotonic() - last_prune > self.retention_seconds:
+                    last_prune = time.monotonic()
+                    await run_blocking(
+                        self._execute, "DELETE FROM events WHERE created < ?",
+                        (time.time() - self.retention_seconds,)
+                    )
+            except Exception as e:
+                print(f"State backend event poll error: {e}")
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        await super().close()
+
+
+class RedisStateBackend(StateBackend):
+    """Redis-compatible backend shared by workers across hosts (requires the redis package)"""
+    shared = True
+
+    def __init__(self, url: str, namespace: str = "leo:"):
+        super().__init__()
+        import redis
+        import redis.asyncio as redis_async
+        self.namespace = namespace
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._async_redis = redis_async.Redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._redis.get(self._key(key))
+        return json.loads(value) if value is not None else default
+
+    def set(self, key: str, value: Any):
+        self._redis.set(self._key(key), json.dumps(value))
+
+    def delete(self, key: str):
+        self._redis.delete(self._key(key), self._key(f"list:{key}"))
+
+    def incr(self, key: str) -> int:
+        return int(self._redis.incr(self._key(key)))
+
+    def list_append(self, key: str, item: Any, max_len: int):
+        pipe = self._redis.pipeline()
+        pipe.rpush(self._key(f"list:{key}"), json.dumps(item))
+        pipe.ltrim(self._key(f"list:{key}"), -max_len, -1)
+        pipe.execute()
+
+    def list_range(self, key: str, limit: Optional[int] = None) -> List[Any]:
+        start = -limit if limit else 0
+        return [json.loads(value) for value in self._redis.lrange(self._key(f"list:{key}"), start, -1)]
+
+    def keys(self, prefix: str) -> List[str]:
+        found = set()
+        for pattern, strip in ((f"{prefix}*", 0), (f"list:{prefix}*", len("list:"))):
+            for key in self._redis.scan_iter(match=self._key(pattern)):
+                found.add(key[len(self.namespace) + strip:])
+        return list(found)
+
+    async def publish(self, channel: str, message: Dict):
+        await self._async_redis.publish(self._key(channel), json.dumps(message))
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+        if self._pubsub is None:
+            self._pubsub = self._async_redis.pubsub()
+        await self._pubsub.subscribe(self._key(channel))
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            if item.get("type") != "message":
+                continue
+            channel = item["channel"][len(self.namespace):]
+            try:
+                payload = json.loads(item["data"])
+                for handler in list(self._handlers.get(channel, ())):
+                    await handler(payload)
+            except Exception as e:
+                print(f"State backend message error: {e}")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._async_redis.close()
+        self._redis.close()
+        await super().close()
+
+
+class PersistedState:
+    """One JSON document that survives restarts
+    
+    Kept under ``key`` in a shared state backend, so every worker reads and
+    writes the same copy; with per-process state it is a local file
+    (``path``) replaced atomically on save.
+    """
+
+    def __init__(self, key: str, path: Optional[str], state_backend: Optional[StateBackend] = None):
+        self.key = key
+        self.path = path
+        self.state_backend = state_backend if state_backend is not None and state_backend.shared else None
+
+    @property
+    def shared(self) -> bool:
+        return self.state_backend is not None
+
+    def load(self, default: Any = None) -> Any:
+        """Blocking read of the stored document (``default`` when there is none)"""
+        if self.shared:
+            return self.state_backend.get(self.key, default)
+        if not self.path or not os.path.exists(self.path):
+            return default
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, value: Any):
+        """Blocking write of the whole document"""
+        if self.shared:
+            self.state_backend.set(self.key, value)
+            return
+        if not self.path:
+            return
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_file, self.path)
+
+
+def create_state_backend() -> StateBackend:
+    """Create the backend selected by LEO_STATE_BACKEND (memory, sqlite or redis)"""
+    kind = os.getenv("LEO_STATE_BACKEND", "memory").lower()
+    try:
+        if kind == "sqlite":
+            backend = SQLiteStateBackend(os.getenv("LEO_STATE_PATH", "leo_state.db"))
+            print(f"✅ SQLite state backend at {backend.path}")
+            return backend
+        if kind == "redis":
+            backend = RedisStateBackend(os.getenv("LEO_REDIS_URL", "redis://localhost:6379/0"))
+            print("✅ Redis state backend connected")
+            return backend
+    except Exception as e:
+        print(f"⚠️ {kind} state backend unavailable ({e}) - using in-process state")
+    return StateBackend()